@@ -1,8 +1,11 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from .models import (
     Moviedata,
     Genre,
+    MovieCredit,
+    Person,
     Review,
 )
 from django.utils.translation import gettext_lazy as _
@@ -18,6 +21,19 @@ class GenreInline(admin.TabularInline):
     verbose_name_plural = "Genre Assignments"
 
 
+class CreditInline(admin.TabularInline):
+    """Cast list kept in step with the actors field; only roles are editable"""
+
+    model = MovieCredit
+    extra = 0
+    can_delete = False
+    fields = ("billing_order", "person", "role")
+    readonly_fields = ("billing_order", "person")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class ReviewInline(admin.TabularInline):
     """Enhanced review inline with more controls"""
 
@@ -46,12 +62,13 @@ class MoviedataAdmin(admin.ModelAdmin):
     list_filter = ("genres", "year", "average_rating")
     search_fields = ("title", "director", "actors", "genres__name")
     filter_horizontal = ("genres",)
-    inlines = [ReviewInline]
+    inlines = [CreditInline, ReviewInline]
     readonly_fields = (
         "poster_preview",
         "year",
         "formatted_duration_readonly",
         "average_rating",
+        "rating_count",
     )
     list_per_page = 20
     list_select_related = True
@@ -69,6 +86,7 @@ class MoviedataAdmin(admin.ModelAdmin):
                     "formatted_duration_readonly",
                     "release_date",
                     "average_rating",
+                    "rating_count",
                 ),
                 "classes": ("collapse",),
             },
@@ -121,13 +139,13 @@ class GenreAdmin(admin.ModelAdmin):
     ordering = ["name"]
 
     def movie_count(self, obj):
-        return obj.movies.count()
+        return obj.movie_count
 
     movie_count.short_description = "Movies"
-    movie_count.admin_order_field = "moviedata__count"  # Enable sorting
+    movie_count.admin_order_field = "movie_count"  # Enable sorting
 
     def popularity_indicator(self, obj):
-        count = obj.movies.count()
+        count = obj.movie_count
         return format_html(
             '<div style="width:{}px; height:10px; background-color:{}"></div>',
             min(count, 20),
@@ -137,6 +155,22 @@ class GenreAdmin(admin.ModelAdmin):
     popularity_indicator.short_description = "Popularity"
 
 
+@admin.register(Person)
+class PersonAdmin(admin.ModelAdmin):
+    list_display = ("name", "credit_count")
+    search_fields = ("name",)
+    list_per_page = 20
+
+    def credit_count(self, obj):
+        return obj.credit_count
+
+    credit_count.short_description = "Movies"
+    credit_count.admin_order_field = "credit_count"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(credit_count=Count("credits"))
+
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ("movie", "user", "rating_stars", "created_at", "short_comment")
@@ -6,5 +6,6 @@ class MoviesConfig(AppConfig):
     name = "movies"
 
     def ready(self):
-        # Don't import models here to avoid double registration
-        pass
+        # Don't import models here to avoid double registration; the signals
+        # module is imported for its receivers only.
+        from . import signals  # noqa: F401
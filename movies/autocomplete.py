@@ -0,0 +1,351 @@
+"""Search-as-you-type suggestions served from in-memory prefix indexes.
+
+There is one sorted-array index per suggestion category (titles, actors,
+directors and genres), holding every label under its full text and under each
+later word so that "kumar" finds "Ajith Kumar". Entries are ranked by the
+highest ``average_rating`` among the movies they belong to. As with the search
+indexes, these live in each worker process, are built on first use and kept in
+sync by ``movies.signals``. After ``MOVIES_SEARCH_INDEX_TTL`` seconds a
+background thread builds new ones while the old ones keep serving.
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+
+CATEGORIES = ("titles", "actors", "directors", "genres")
+
+# Suggestions kept per prefix, and so the most a lookup can return
+SUGGESTION_LIMIT = 10
+
+
+def normalize(text):
+    return " ".join(WORD_RE.findall(str(text).lower()))
+
+
+def word_suffixes(key):
+    """``"ajith kumar"`` -> ``["ajith kumar", "kumar"]``, so later words match"""
+    words = key.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def movie_labels(movie):
+    """Category -> labels suggested for a movie (uses prefetched genres)"""
+    from .models import split_names
+
+    return {
+        "titles": [movie.title],
+        # Parsed from the text column: credits are rewritten after post_save
+        "actors": split_names(movie.actors),
+        "directors": [movie.director] if movie.director else [],
+        "genres": [genre.name for genre in movie.genres.all()],
+    }
+
+
+class SuggestionIndex:
+    """Sorted array of ``(term, key)`` pairs ranked by entry score.
+
+    A lookup bisects the range of terms starting with the prefix and keeps the
+    best entries in that range. Results are memoized per prefix and patched
+    in place by writes.
+    """
+
+    # Memoized prefixes kept before the memo is reset
+    max_cached_prefixes = 50000
+
+    def __init__(self, size=SUGGESTION_LIMIT):
+        self.size = size
+        self._terms = []
+        self._entries = {}  # key -> (score, label, payload)
+        self._top = {}  # prefix -> best keys
+
+    def _rank(self, key):
+        score, label, _ = self._entries[key]
+        return (-score, label)
+
+    def _update_memo(self, key, old_rank):
+        """Patch the memoized prefixes of ``key`` after it was set or removed.
+
+        An entry that improved (or is new) is merged into each memoized list;
+        one that got worse or was removed drops the lists it was part of,
+        since an entry outside them may now qualify.
+        """
+        new_rank = self._rank(key) if key in self._entries else None
+        improved = new_rank is not None and (old_rank is None or new_rank <= old_rank)
+        prefixes = {
+            term[:end] for term in word_suffixes(key) for end in range(1, len(term) + 1)
+        }
+        for prefix in prefixes:
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+            if key in top and not improved:
+                del self._top[prefix]
+            elif key in top or (
+                new_rank is not None
+                and (len(top) < self.size or new_rank < self._rank(top[-1]))
+            ):
+                candidates = set(top) | {key}
+                self._top[prefix] = sorted(candidates, key=self._rank)[: self.size]
+
+    def set(self, key, label, score, payload=None, refresh=True):
+        """Add or re-rank an entry.
+
+        Bulk loads pass ``refresh=False`` and call ``refresh_all()`` once at
+        the end.
+        """
+        old_rank = None
+        if key in self._entries:
+            old_rank = self._rank(key)
+        else:
+            for term in word_suffixes(key):
+                if refresh:
+                    insort(self._terms, (term, key))
+                else:
+                    self._terms.append((term, key))
+        self._entries[key] = (score, label, payload)
+        if refresh:
+            self._update_memo(key, old_rank)
+
+    def discard(self, key, refresh=True):
+        if key not in self._entries:
+            return
+        old_rank = self._rank(key)
+        for term in word_suffixes(key):
+            position = bisect_left(self._terms, (term, key))
+            if position < len(self._terms) and self._terms[position] == (term, key):
+                del self._terms[position]
+        del self._entries[key]
+        if refresh:
+            self._update_memo(key, old_rank)
+
+    def refresh_all(self):
+        """Sort the terms and warm the single-character prefixes, the
+        slowest ones to compute"""
+        self._terms.sort()
+        self._top = {}
+        for first in {term[0] for term, _ in self._terms}:
+            self._best(first)
+
+    def _best(self, prefix):
+        top = self._top.get(prefix)
+        if top is None:
+            successor = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            start = bisect_left(self._terms, (prefix,))
+            end = bisect_left(self._terms, (successor,), start)
+            keys = {key for _, key in self._terms[start:end]}
+            top = heapq.nsmallest(self.size, keys, key=self._rank)
+            if len(self._top) >= self.max_cached_prefixes:
+                self._top = {}
+            self._top[prefix] = top
+        return top
+
+    def complete(self, prefix, limit=SUGGESTION_LIMIT):
+        """``(label, payload)`` pairs for the best entries matching ``prefix``"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        return [self._entries[key][1:] for key in self._best(prefix)[:limit]]
+
+
+class Autocomplete:
+    """Keeps one ``SuggestionIndex`` per category in step with the movies"""
+
+    def __init__(self):
+        self._indexes = None
+        self._ratings = None  # category -> key -> {movie_id: rating}
+        self._labels = None  # category -> key -> label
+        self._movie_keys = None  # movie_id -> category -> keys
+        self._built_at = 0.0
+        self._pending = None  # Writes made while a build runs, replayed after it
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # Held by the one running build
+
+    def _is_stale(self):
+        ttl = getattr(settings, "MOVIES_SEARCH_INDEX_TTL", 300)
+        return self._indexes is None or (
+            ttl and time.monotonic() - self._built_at > ttl
+        )
+
+    def _update_entry(self, category, key, refresh=True):
+        ratings = self._ratings[category].get(key)
+        index = self._indexes[category]
+        if not ratings:
+            self._ratings[category].pop(key, None)
+            self._labels[category].pop(key, None)
+            index.discard(key, refresh)
+            return
+        # The best-rated movie ranks the entry and is linked from title hits
+        movie_id = max(ratings, key=lambda pk: (ratings[pk], -pk))
+        label = self._labels[category][key]
+        index.set(key, label, ratings[movie_id], movie_id, refresh)
+
+    def _add(self, movie_id, rating, labels, refresh=True):
+        changed = self._unlink(movie_id)
+        movie_keys = self._movie_keys[movie_id] = {}
+        for category, names in labels.items():
+            keys = movie_keys[category] = set()
+            for name in names:
+                key = normalize(name)
+                if not key:
+                    continue
+                keys.add(key)
+                self._labels[category].setdefault(key, name.strip())
+                self._ratings[category].setdefault(key, {})[movie_id] = rating
+                changed.add((category, key))
+        for category, key in changed:
+            self._update_entry(category, key, refresh)
+
+    def _rate(self, movie_id, rating):
+        for category, keys in self._movie_keys.get(movie_id, {}).items():
+            for key in keys:
+                self._ratings[category][key][movie_id] = rating
+                self._update_entry(category, key)
+
+    def _unlink(self, movie_id):
+        """Detach a movie from its entries; returns the entries to update"""
+        changed = set()
+        for category, keys in self._movie_keys.pop(movie_id, {}).items():
+            for key in keys:
+                self._ratings[category].get(key, {}).pop(movie_id, None)
+                changed.add((category, key))
+        return changed
+
+    def _remove(self, movie_id):
+        for category, key in self._unlink(movie_id):
+            self._update_entry(category, key)
+
+    def _apply(self, method, *args):
+        """Run a write on the live indexes, and on the ones being built"""
+        with self._lock:
+            if self._indexes is not None:
+                getattr(self, method)(*args)
+            if self._pending is not None:
+                self._pending.append((method, args))
+
+    def _build(self):
+        """Build new indexes without holding the lock, then swap them in.
+
+        Suggestions keep coming from the old indexes until the swap, and
+        writes made meanwhile are replayed onto the new ones first. Call with
+        ``_build_lock`` held.
+        """
+        from .models import Moviedata
+
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = Autocomplete()
+            fresh._indexes = {category: SuggestionIndex() for category in CATEGORIES}
+            fresh._ratings = {category: {} for category in CATEGORIES}
+            fresh._labels = {category: {} for category in CATEGORIES}
+            fresh._movie_keys = {}
+            movies = Moviedata.objects.only(
+                "id", "title", "actors", "director", "average_rating"
+            ).prefetch_related("genres")
+            for movie in movies.iterator(chunk_size=2000):
+                rating = float(movie.average_rating)
+                fresh._add(movie.pk, rating, movie_labels(movie), refresh=False)
+            for index in fresh._indexes.values():
+                index.refresh_all()
+            with self._lock:
+                for method, args in self._pending:
+                    getattr(fresh, method)(*args)
+                self._indexes = fresh._indexes
+                self._ratings = fresh._ratings
+                self._labels = fresh._labels
+                self._movie_keys = fresh._movie_keys
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _build_in_background(self):
+        try:
+            self._build()
+        except Exception:
+            logger.exception("Autocomplete rebuild failed")
+        finally:
+            self._build_lock.release()
+            connection.close()  # This thread's own connection
+
+    def rebuild(self):
+        with self._build_lock:
+            self._build()
+
+    def refresh(self):
+        """Build the indexes if there are none, blocking, or start a
+        background rebuild once they are older than the TTL"""
+        if self._indexes is None:
+            with self._build_lock:
+                if self._indexes is None:
+                    self._build()
+        elif self._is_stale() and self._build_lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._build_in_background,
+                name="autocomplete-rebuild",
+                daemon=True,
+            ).start()
+
+    def index_movie(self, movie):
+        labels = movie_labels(movie)  # May query genres, so outside the lock
+        self._apply("_add", movie.pk, float(movie.average_rating), labels)
+
+    def remove_movie(self, movie_id):
+        self._apply("_remove", movie_id)
+
+    def rate_movies(self, ratings):
+        """Re-rank movies by their new ``{movie_id: average_rating}``"""
+        for movie_id, rating in ratings.items():
+            self._apply("_rate", movie_id, float(rating))
+
+    def is_loaded(self):
+        return self._indexes is not None or self._pending is not None
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        """Category -> ``(label, best movie id)`` pairs for ``prefix``"""
+        self.refresh()
+        with self._lock:
+            return {
+                category: self._indexes[category].complete(prefix, limit)
+                for category in CATEGORIES
+            }
+
+
+autocomplete = Autocomplete()
+
+
+def index_movie(movie):
+    autocomplete.index_movie(movie)
+
+
+def remove_movie(movie_id):
+    autocomplete.remove_movie(movie_id)
+
+
+def rerank_movies(movie_ids):
+    """Re-rank movies whose rating changed without a save, e.g. by reviews"""
+    from .models import Moviedata
+
+    if autocomplete.is_loaded():
+        autocomplete.rate_movies(
+            dict(
+                Moviedata.objects.filter(pk__in=movie_ids).values_list(
+                    "pk", "average_rating"
+                )
+            )
+        )
+
+
+def suggest(prefix, limit=SUGGESTION_LIMIT):
+    return autocomplete.suggest(prefix, min(limit, SUGGESTION_LIMIT))
@@ -0,0 +1,244 @@
+"""Cached snapshots, rendered pages and fragments.
+
+Snapshots of data shown on many pages are stored in the default cache through
+``single_flight()`` and expired by ``movies.signals`` when the rows they were
+built from change.
+
+Rendered pages and fragments are keyed by the versions of the tags they
+depend on (``"catalog"``, ``"movie:<id>"``, ``"genre:<name>"``). Signals bump
+a tag's version when its data changes, so every entry built from the old
+version stops being read without having to find and delete it.
+"""
+
+import hashlib
+import math
+import random
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Genre, Moviedata
+
+GENRE_FACETS_KEY = "movies:genre-facets"
+RELEASE_YEARS_KEY = "movies:release-years"
+TAG_VERSION_KEY = "movies:tag-version:{}"
+FRAGMENT_KEY = "movies:fragment:{}:{}:{}"
+LOCK_KEY = "{}:lock"
+
+# Polling interval while waiting for another process to fill a missing key
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _single_flight_config(name, default):
+    return getattr(settings, "MOVIES_SINGLE_FLIGHT", {}).get(name, default)
+
+
+def _store(key, compute, ttl):
+    started = time.monotonic()
+    value = compute()
+    cost = time.monotonic() - started
+    stale_ttl = _single_flight_config("stale_ttl", 60)
+    cache.set(key, (value, time.time() + ttl, cost), ttl + stale_ttl)
+    return value
+
+
+def single_flight(key, compute, ttl):
+    """``compute()``'s value, cached for ``ttl`` seconds without stampedes.
+
+    - Only the process holding a short lock recomputes a key. The lock is
+      taken with ``cache.add``, so it coalesces requests across processes on
+      a shared cache backend.
+    - Entries are kept ``stale_ttl`` seconds past ``ttl``. Meanwhile other
+      processes serve the stale value instead of waiting for the refresh.
+    - Each read may refresh early, more likely as expiry nears and the
+      longer ``compute`` took ("XFetch", Vattani et al.). Hot keys are then
+      usually refreshed before they expire.
+
+    On a miss the other processes wait up to ``lock_timeout`` for the value,
+    then compute it themselves. ``expire()`` makes the next read refresh the
+    value without making anyone wait.
+    """
+    lock_key = LOCK_KEY.format(key)
+    lock_timeout = _single_flight_config("lock_timeout", 10)
+    token = uuid.uuid4().hex
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, cost = entry
+        beta = _single_flight_config("beta", 1.0)
+        early = -cost * beta * math.log(1 - random.random())
+        if time.time() + early < expires_at:
+            return value
+        if not cache.add(lock_key, token, lock_timeout):
+            return value  # Another process is refreshing it
+    elif not cache.add(lock_key, token, lock_timeout):
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        # The lock holder died or is too slow; don't make this request wait
+        return _store(key, compute, ttl)
+    try:
+        return _store(key, compute, ttl)
+    finally:
+        # Once lock_timeout has passed, the lock may be another process's
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def expire(key):
+    """Make a ``single_flight()`` entry due for a refresh.
+
+    The entry is kept, so while one process recomputes it the others serve
+    the old value, for up to ``stale_ttl`` seconds.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, _, cost = entry
+        cache.set(key, (value, 0, cost), _single_flight_config("stale_ttl", 60))
+
+
+def genre_facets():
+    """Genres that have movies, by name, each with a ``movie_count``"""
+    return single_flight(
+        GENRE_FACETS_KEY,
+        lambda: list(Genre.objects.filter(movie_count__gt=0).order_by("name")),
+        getattr(settings, "MOVIES_SNAPSHOT_CACHE_TTL", 300),
+    )
+
+
+def invalidate_genre_facets():
+    expire(GENRE_FACETS_KEY)
+
+
+def release_years():
+    """Distinct release years, newest first"""
+    return single_flight(
+        RELEASE_YEARS_KEY,
+        lambda: list(
+            Moviedata.objects.values_list("year", flat=True)
+            .distinct()
+            .order_by("-year")
+        ),
+        getattr(settings, "MOVIES_SNAPSHOT_CACHE_TTL", 300),
+    )
+
+
+def invalidate_release_years():
+    expire(RELEASE_YEARS_KEY)
+
+
+def genre_release_years(genre):
+    """Distinct release years of a genre's movies, newest first"""
+    return single_flight(
+        versioned_key("genre-years", ["catalog", genre_tag(genre.name)], genre.pk),
+        lambda: list(
+            Moviedata.objects.filter(genres=genre)
+            .values_list("year", flat=True)
+            .distinct()
+            .order_by("-year")
+        ),
+        getattr(settings, "MOVIES_SNAPSHOT_CACHE_TTL", 300),
+    )
+
+
+def genre_tag(name):
+    return f"genre:{name.casefold()}"
+
+
+def tag_versions(tags):
+    """A string identifying the current version of every tag in ``tags``"""
+    keys = [TAG_VERSION_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh version, never a reset one, so evicted versions can't
+            # bring back entries built before the eviction
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return ".".join(str(versions[key]) for key in keys)
+
+
+def versioned_key(name, tags, *parts):
+    """A cache key for ``name`` and ``parts`` at the current tag versions"""
+    raw = ":".join([*map(str, parts), tag_versions(tags)])
+    return f"movies:{name}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def bump(*tags):
+    """Invalidate every page and fragment depending on ``tags``"""
+    version = time.time_ns()
+    cache.set_many({TAG_VERSION_KEY.format(tag): version for tag in tags}, None)
+
+
+def normalized_query(query_dict):
+    """The query string with sorted parameters and empty values dropped"""
+    return urlencode(
+        sorted(
+            (key, value)
+            for key in query_dict
+            for value in query_dict.getlist(key)
+            if value != ""
+        )
+    )
+
+
+def cache_anonymous_page(tags):
+    """Cache a view's responses for anonymous GET requests.
+
+    ``tags(request, *args, **kwargs)`` lists the tags the page depends on.
+    Signed-in users, and requests with pending messages, bypass the cache.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+                or len(messages.get_messages(request))
+            ):
+                return view(request, *args, **kwargs)
+            key = versioned_key(
+                "page",
+                tags(request, *args, **kwargs),
+                request.path,
+                normalized_query(request.GET),
+            )
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if (
+                    response.status_code == 200
+                    and not response.streaming
+                    and not response.cookies
+                ):
+                    cache.set(
+                        key, response, getattr(settings, "MOVIES_PAGE_CACHE_TTL", 60)
+                    )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def render_movie_fragment(template_name, movie):
+    """Render a per-movie template, reusing the cached copy when current.
+
+    Fragments don't depend on the user, so signed-in users share them too.
+    """
+    versions = tag_versions(["catalog", f"movie:{movie.pk}"])
+    key = FRAGMENT_KEY.format(template_name, movie.pk, versions)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(template_name, {"movie": movie})
+        cache.set(key, html, getattr(settings, "MOVIES_FRAGMENT_CACHE_TTL", 3600))
+    return html
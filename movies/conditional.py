@@ -0,0 +1,69 @@
+"""HTTP conditional GET for movie pages and API resources.
+
+Validators come from ``Moviedata.updated_at``, which every write shown on a
+movie's page or in its API representation moves forward. They cost one
+indexed query, so a matching ``If-None-Match`` or ``If-Modified-Since``
+gets a 304 without loading or rendering anything else.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def _max_age():
+    return getattr(settings, "MOVIES_HTTP_MAX_AGE", 60)
+
+
+def conditional_response(request, last_modified, render, *variant):
+    """``render()``'s response, or a 304 if the client's copy is current.
+
+    ``last_modified`` is when the resource last changed, or None to skip
+    validation (e.g. it doesn't exist). ``variant`` lists anything else
+    the body depends on, such as the API's output format.
+    """
+    if last_modified is None or request.method not in ("GET", "HEAD"):
+        return render()
+    raw = ":".join([last_modified.isoformat(), *map(str, variant)])
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(timestamp)
+    # Shared caches may serve it for max-age, then revalidate with the above
+    patch_cache_control(response, public=True, max_age=_max_age())
+    return response
+
+
+def conditional_page(last_modified):
+    """Answer anonymous GETs of a page with a 304 when nothing has changed.
+
+    ``last_modified(request, *args, **kwargs)`` returns the validator time.
+    Signed-in users see per-user content, so their pages are marked private
+    and always rendered, as are requests with pending messages.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated or len(messages.get_messages(request)):
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+            return conditional_response(
+                request,
+                last_modified(request, *args, **kwargs),
+                lambda: view(request, *args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,12 +1,9 @@
 # movies/context_processors.py
-from .models import Genre
-from django.db.models import Count
+from django.utils.functional import SimpleLazyObject
+
+from .cache import genre_facets
 
 
 def genres_context(request):
-    genres = (
-        Genre.objects.annotate(movie_count=Count("movies"))
-        .filter(movie_count__gt=0)
-        .order_by("name")
-    )
-    return {"all_genres": genres}
+    # Lazy, so pages that never show the genre list don't touch the cache
+    return {"all_genres": SimpleLazyObject(genre_facets)}
@@ -0,0 +1,227 @@
+"""Character-trigram index for typo-tolerant title, actor and director lookups.
+
+Names are split into trigrams the way PostgreSQL's pg_trgm does it (each word
+padded with two leading spaces and one trailing space), and a query matches a
+name when enough of their trigrams overlap. Like the in-memory search index,
+the indexes live in each worker process, are built on first use, kept in sync
+by ``movies.signals`` and rebuilt after ``MOVIES_SEARCH_INDEX_TTL`` seconds.
+"""
+
+import re
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+WORD_RE = re.compile(r"\w+")
+
+FIELDS = ("title", "actor", "director")
+
+
+def normalize(text):
+    """The key names are indexed by; for actors, ``Person.normalized_name``"""
+    from .models import Person
+
+    return Person.normalize(text)
+
+
+def trigrams(text):
+    grams = set()
+    for word in WORD_RE.findall(str(text).lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def movie_names(movie):
+    """Field -> names indexed for a movie"""
+    from .models import split_names
+
+    return {
+        "title": [movie.title],
+        # Parsed from the text column: credits are rewritten after post_save
+        "actor": split_names(movie.actors),
+        "director": [movie.director] if movie.director else [],
+    }
+
+
+class TrigramIndex:
+    """Maps distinct names to their trigrams and to the movies using them"""
+
+    def __init__(self):
+        self._keys = {}  # normalized name -> entry id
+        self._names = []  # entry id -> display name
+        self._grams = []  # entry id -> trigram set
+        self._movies = []  # entry id -> movie id set
+        self._postings = defaultdict(set)  # trigram -> entry ids
+        self._movie_entries = defaultdict(set)  # movie id -> entry ids
+        # NumPy copies of the above for lookups, refreshed lazily after writes
+        self._posting_arrays = {}
+        self._gram_counts = None
+        self._lock = threading.RLock()
+
+    def _index_entry(self, entry):
+        for gram in self._grams[entry]:
+            self._postings[gram].add(entry)
+            self._posting_arrays.pop(gram, None)
+
+    def _unindex_entry(self, entry):
+        for gram in self._grams[entry]:
+            self._postings[gram].discard(entry)
+            self._posting_arrays.pop(gram, None)
+
+    def add(self, movie_id, names):
+        with self._lock:
+            self.remove(movie_id)
+            for name in names:
+                key = normalize(name)
+                if not key:
+                    continue
+                entry = self._keys.get(key)
+                if entry is None:
+                    entry = self._keys[key] = len(self._names)
+                    self._names.append(name.strip())
+                    self._grams.append(trigrams(key))
+                    self._movies.append(set())
+                    self._gram_counts = None
+                if not self._movies[entry]:
+                    self._index_entry(entry)
+                self._movies[entry].add(movie_id)
+                self._movie_entries[movie_id].add(entry)
+
+    def remove(self, movie_id):
+        with self._lock:
+            for entry in self._movie_entries.pop(movie_id, ()):
+                movies = self._movies[entry]
+                movies.discard(movie_id)
+                if not movies:
+                    # Keep the entry id reserved but stop matching it
+                    self._unindex_entry(entry)
+
+    def _posting_array(self, gram):
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            array = np.fromiter(self._postings[gram], dtype=np.int64)
+            self._posting_arrays[gram] = array
+        return array
+
+    def lookup(self, text, threshold, limit=None):
+        """``(name, similarity, movie ids)`` for names similar to ``text``.
+
+        Similarity averages the trigram Jaccard index with the share of the
+        query's trigrams found in the name, so "ajth" still finds
+        "Ajith Kumar" while full-name matches rank first.
+        """
+        all_grams = trigrams(text)
+        query_size = len(all_grams)
+
+        with self._lock:
+            # Writers replace and drop postings, so read them under the lock too
+            postings = self._postings
+            query_grams = [gram for gram in all_grams if gram in postings]
+            if not query_grams:
+                return []
+            if self._gram_counts is None:
+                self._gram_counts = np.array(
+                    [len(grams) for grams in self._grams], dtype=np.int64
+                )
+            # Shared trigram count for every entry, counted in one pass
+            overlap = np.bincount(
+                np.concatenate([self._posting_array(gram) for gram in query_grams]),
+                minlength=len(self._names),
+            )
+            # The score can't exceed overlap / query_size, so entries sharing
+            # fewer trigrams than this are skipped without being scored.
+            candidates = np.flatnonzero(overlap >= max(1, threshold * query_size))
+            shared = overlap[candidates]
+            union = query_size + self._gram_counts[candidates] - shared
+            scores = (shared / union + shared / query_size) / 2
+            keep = scores >= threshold
+            matches = [
+                (self._names[entry], float(score), frozenset(self._movies[entry]))
+                for entry, score in zip(candidates[keep], scores[keep])
+            ]
+
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit] if limit else matches
+
+
+class FuzzyCatalog:
+    """One ``TrigramIndex`` per searchable field"""
+
+    def __init__(self):
+        self._indexes = None
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()
+
+    def _is_stale(self):
+        ttl = getattr(settings, "MOVIES_SEARCH_INDEX_TTL", 300)
+        return self._indexes is None or (
+            ttl and time.monotonic() - self._built_at > ttl
+        )
+
+    def get_index(self, field):
+        if self._is_stale():
+            with self._build_lock:
+                if self._is_stale():
+                    self.rebuild()
+        return self._indexes[field]
+
+    def rebuild(self):
+        from .models import Moviedata
+
+        indexes = {field: TrigramIndex() for field in FIELDS}
+        movies = Moviedata.objects.only("id", "title", "actors", "director")
+        for movie in movies.iterator(chunk_size=2000):
+            for field, names in movie_names(movie).items():
+                indexes[field].add(movie.pk, names)
+        self._indexes = indexes
+        self._built_at = time.monotonic()
+
+    def index_movie(self, movie):
+        indexes = self._indexes  # rebuild() may swap in new ones meanwhile
+        if indexes is not None:
+            for field, names in movie_names(movie).items():
+                indexes[field].add(movie.pk, names)
+
+    def remove_movie(self, movie_id):
+        indexes = self._indexes
+        if indexes is not None:
+            for index in indexes.values():
+                index.remove(movie_id)
+
+
+catalog = FuzzyCatalog()
+
+
+def index_movie(movie):
+    catalog.index_movie(movie)
+
+
+def remove_movie(movie_id):
+    catalog.remove_movie(movie_id)
+
+
+def lookup(field, text, threshold=None, limit=None):
+    """Names in ``field`` similar to ``text``, best match first"""
+    if threshold is None:
+        threshold = getattr(settings, "MOVIES_FUZZY_THRESHOLD", 0.3)
+    return catalog.get_index(field).lookup(text, threshold, limit)
+
+
+def match_movie_ids(field, text, threshold=None, limit=None):
+    """Ids of movies with a ``field`` value similar to ``text``, best first.
+
+    At most ``limit`` ids (default ``MOVIES_FUZZY_MAX_MATCHES``) are returned,
+    so a common name can't turn into an oversized ``pk__in`` filter.
+    """
+    if limit is None:
+        limit = getattr(settings, "MOVIES_FUZZY_MAX_MATCHES", 500)
+    movie_ids = {}
+    for _, _, ids in lookup(field, text, threshold):
+        movie_ids.update(dict.fromkeys(sorted(ids)))
+        if len(movie_ids) >= limit:
+            break
+    return list(movie_ids)[:limit]
@@ -0,0 +1,298 @@
+"""Bulk loaders for partner feeds and catalog dumps.
+
+Rows are read as a stream, validated and written in batches with
+``bulk_create``, and derived data is refreshed once per batch or once per
+movie at the end instead of once per row.
+"""
+
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import (
+    Activity,
+    Genre,
+    ImageJob,
+    MovieCredit,
+    Moviedata,
+    Person,
+    Recommendation,
+    Review,
+    UserStats,
+    split_names,
+)
+from .serializers import MovieImportSerializer, ReviewImportSerializer
+
+# Sent with ``movie_ids`` after each batch of imported movies is committed;
+# bulk_create skips post_save, so derived indexes listen for this instead
+movies_imported = Signal()
+# Sent with ``movie_ids`` once imported reviews have been counted into the
+# movies' ratings, which bulk_create and recompute_ratings() do without signals
+reviews_imported = Signal()
+
+
+def read_records(stream, fmt="ndjson"):
+    """Yield dicts from an NDJSON stream or, with ``fmt="json"``, a JSON array.
+
+    NDJSON is read line by line, so feeds of any size use constant memory; a
+    JSON array has to be loaded whole.
+    """
+    if fmt == "json":
+        yield from json.load(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    """Yield a dict per CSV row, keyed by the header row.
+
+    Empty cells are left out, so optional columns fall back to their defaults.
+    """
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value != ""}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class IngestResult:
+    """Counts and per-row errors of a bulk load"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []  # {"row": index, "errors": {...}}
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+def _validate(serializer_class, batch, offset, result):
+    """Validated rows of ``batch``; invalid rows are added to ``result``"""
+    serializer = serializer_class(data=batch, many=True)
+    if serializer.is_valid():
+        return serializer.validated_data
+
+    # Keep the valid rows; ListSerializer reports errors aligned by position
+    valid = []
+    for index, (row, errors) in enumerate(zip(batch, serializer.errors)):
+        if errors:
+            result.errors.append({"row": offset + index, "errors": errors})
+        else:
+            valid.append(serializer_class().run_validation(row))
+    return valid
+
+
+def ingest_reviews(records, batch_size=1000, update_existing=False):
+    """Insert reviews from ``{"movie", "user", "rating", "comment"}`` dicts.
+
+    ``user`` is a username. A review for a (movie, user) pair that already
+    exists is skipped, or overwritten when ``update_existing`` is set. Each
+    affected movie's rating totals are recomputed once, after the last batch.
+    """
+    result = IngestResult()
+    affected = set()
+    authors = set()
+    offset = 0
+    for batch in batched(records, batch_size):
+        rows = _validate(ReviewImportSerializer, batch, offset, result)
+        offset += len(batch)
+
+        # Resolve movies and authors with one query each
+        movie_ids = set(
+            Moviedata.objects.filter(pk__in={row["movie"] for row in rows}).values_list(
+                "pk", flat=True
+            )
+        )
+        user_ids = dict(
+            User.objects.filter(username__in={row["user"] for row in rows}).values_list(
+                "username", "pk"
+            )
+        )
+
+        reviews = {}
+        for row in rows:
+            if row["movie"] not in movie_ids or row["user"] not in user_ids:
+                result.skipped += 1
+                continue
+            key = (row["movie"], user_ids[row["user"]])
+            if key in reviews:
+                result.skipped += 1  # Later duplicates in a feed win
+            reviews[key] = Review(
+                movie_id=key[0],
+                user_id=key[1],
+                rating=row["rating"],
+                comment=row["comment"],
+            )
+        if not reviews:
+            continue
+
+        existing = set(
+            Review.objects.filter(
+                movie_id__in={movie_id for movie_id, _ in reviews},
+                user_id__in={user_id for _, user_id in reviews},
+            ).values_list("movie_id", "user_id")
+        )
+        existing &= reviews.keys()
+
+        with transaction.atomic():
+            if update_existing:
+                Review.objects.bulk_create(
+                    reviews.values(),
+                    update_conflicts=True,
+                    unique_fields=["movie", "user"],
+                    update_fields=["rating", "comment"],
+                )
+                result.updated += len(existing)
+            else:
+                # A review written since the SELECT above is kept, not an error
+                Review.objects.bulk_create(
+                    [review for key, review in reviews.items() if key not in existing],
+                    ignore_conflicts=True,
+                )
+                result.skipped += len(existing)
+            result.created += len(reviews) - len(existing)
+            # bulk_create skips post_save, which drops recommendations of
+            # movies the user has now reviewed
+            seen = Q()
+            for movie_id, user_id in reviews.keys() - existing:
+                seen |= Q(movie_id=movie_id, user_id=user_id)
+            if seen:
+                Recommendation.objects.filter(seen).delete()
+            Activity.objects.bulk_create(
+                Activity(
+                    user_id=user_id,
+                    movie_id=movie_id,
+                    kind="review",
+                    rating=review.rating,
+                    created_at=review.created_at,
+                )
+                for (movie_id, user_id), review in reviews.items()
+                if (movie_id, user_id) not in existing
+            )
+        affected.update(movie_id for movie_id, _ in reviews)
+        authors.update(user_id for _, user_id in reviews)
+
+    # bulk_create bypasses Review.save(), so recount each movie once instead
+    for movie_ids in batched(sorted(affected), batch_size):
+        Moviedata.recompute_ratings(movie_ids)
+        Moviedata.objects.filter(pk__in=movie_ids).update(
+            similarity_stale=True, updated_at=timezone.now()
+        )
+    for user_ids in batched(sorted(authors), batch_size):
+        UserStats.recompute(user_ids)
+    if affected:
+        reviews_imported.send(sender=Review, movie_ids=sorted(affected))
+    return result
+
+
+class GenreCache:
+    """Genre ids by case-folded name, loaded once and filled in as needed"""
+
+    def __init__(self):
+        self._ids = {
+            name.casefold(): pk for pk, name in Genre.objects.values_list("pk", "name")
+        }
+
+    def resolve(self, names):
+        """Map each name to a genre id, creating the missing genres together"""
+        missing = {}
+        for name in names:
+            if name.casefold() not in self._ids:
+                missing.setdefault(name.casefold(), name)
+        if missing:
+            Genre.objects.bulk_create(
+                [Genre(name=name) for name in missing.values()],
+                ignore_conflicts=True,
+            )
+            created = Genre.objects.filter(name__in=missing.values())
+            for pk, name in created.values_list("pk", "name"):
+                self._ids[name.casefold()] = pk
+        return {name: self._ids[name.casefold()] for name in names}
+
+
+def ingest_movies(records, batch_size=1000, on_batch=None):
+    """Insert movies from dicts of Moviedata fields plus a ``genres`` list.
+
+    Each batch of movies, with its genre links and cast credits, is written
+    in one transaction. ``on_batch(result)`` is called after every batch.
+    """
+    result = IngestResult()
+    genres = GenreCache()
+    offset = 0
+    for batch in batched(records, batch_size):
+        rows = _validate(MovieImportSerializer, batch, offset, result)
+        offset += len(batch)
+        if rows:
+            with transaction.atomic():
+                movie_ids = _create_movies(rows, genres)
+            result.created += len(movie_ids)
+            movies_imported.send(sender=Moviedata, movie_ids=movie_ids)
+        if on_batch:
+            on_batch(result)
+    return result
+
+
+def _create_movies(rows, genres):
+    movies = []
+    for row in rows:
+        row = dict(row)
+        genre_names = row.pop("genres")
+        movie = Moviedata(**row)
+        # bulk_create skips save(), which derives these
+        movie.year = movie.release_date.year
+        movie._loaded_actors = movie.actors
+        movie._genre_names = genre_names
+        movies.append(movie)
+    Moviedata.objects.bulk_create(movies)
+    # bulk_create skips save(), which queues posters for resizing
+    ImageJob.enqueue_many(
+        "poster",
+        [(movie.pk, movie.poster_url.name) for movie in movies if movie.has_poster()],
+    )
+
+    genre_ids = genres.resolve(
+        {name for movie in movies for name in movie._genre_names}
+    )
+    links = [
+        Moviedata.genres.through(moviedata_id=movie.pk, genre_id=genre_id)
+        for movie in movies
+        for genre_id in {genre_ids[name] for name in movie._genre_names}
+    ]
+    Moviedata.genres.through.objects.bulk_create(links)
+    # bulk_create skips m2m_changed, which keeps these counts
+    Genre.adjust_counts(Counter(link.genre_id for link in links))
+
+    cast = {movie.pk: split_names(movie.actors) for movie in movies}
+    people = Person.resolve({name for names in cast.values() for name in names})
+    credits = []
+    for movie_id, names in cast.items():
+        credited = set()
+        for order, name in enumerate(names):
+            person = people[Person.normalize(name)]
+            if person.pk not in credited:
+                credited.add(person.pk)
+                credits.append(
+                    MovieCredit(movie_id=movie_id, person=person, billing_order=order)
+                )
+    MovieCredit.objects.bulk_create(credits)
+    return [movie.pk for movie in movies]
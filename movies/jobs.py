@@ -0,0 +1,124 @@
+"""The image worker: runs the ImageJobs queued by uploads.
+
+``process_images`` calls ``work()`` in a loop. Several workers can share the
+queue: a worker claims a job by moving its ``run_after`` forward by the lease
+time, so a worker that dies mid-job leaves it to be retried once the lease
+ends. A job whose image was replaced while it ran is re-queued by the new
+upload and runs again for the new image.
+"""
+
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from . import posters
+from .cache import bump
+from .models import ImageJob, Moviedata, Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZE = (300, 300)
+
+
+def _config():
+    return {
+        "lease": 300,
+        "max_attempts": 5,
+        "retry_delay": 60,
+        **getattr(settings, "MOVIES_IMAGE_JOBS", {}),
+    }
+
+
+def shrink_avatar(job):
+    """Replace a profile's avatar with a copy that fits ``AVATAR_SIZE``"""
+    profile = Profile.objects.filter(pk=job.object_id).first()
+    if profile is None or profile.avatar.name != job.name:
+        return  # Deleted or replaced since it was queued
+    with profile.avatar.open("rb") as source:
+        image = Image.open(source)
+        if image.width <= AVATAR_SIZE[0] and image.height <= AVATAR_SIZE[1]:
+            return
+        image_format = image.format
+        image.thumbnail(AVATAR_SIZE)  # Decodes JPEGs at a reduced scale
+        output = BytesIO()
+        image.save(output, format=image_format)
+    # As a new upload, so it's stored under upload_to like the original
+    field = profile.avatar.field
+    name = field.storage.save(
+        field.generate_filename(profile, os.path.basename(job.name)),
+        ContentFile(output.getvalue()),
+    )
+    Profile.objects.filter(pk=profile.pk, avatar=job.name).update(avatar=name)
+
+
+def make_poster_copies(job):
+    """Write a movie poster's resized copies and record them on the movie"""
+    movie = Moviedata.objects.filter(pk=job.object_id).only("poster_url").first()
+    if movie is None or movie.poster_url.name != job.name:
+        return
+    widths = posters.generate(job.name, movie.poster_url.storage)
+    updated = Moviedata.objects.filter(pk=movie.pk, poster_url=job.name).update(
+        poster_widths=widths, updated_at=timezone.now()
+    )
+    if updated:
+        bump(f"movie:{movie.pk}")  # Cached cards still list no copies
+
+
+HANDLERS = {
+    "avatar": shrink_avatar,
+    "poster": make_poster_copies,
+}
+
+
+def claim(limit):
+    """Up to ``limit`` due jobs, leased to this worker"""
+    now = timezone.now()
+    lease = now + timedelta(seconds=_config()["lease"])
+    claimed = []
+    due = ImageJob.objects.filter(run_after__lte=now).order_by("run_after")
+    for job in due[:limit]:
+        # Only one worker can move run_after on from the value it read
+        if ImageJob.objects.filter(pk=job.pk, run_after=job.run_after).update(
+            run_after=lease, attempts=F("attempts") + 1
+        ):
+            job.run_after = lease
+            job.attempts += 1
+            claimed.append(job)
+    return claimed
+
+
+def run(job):
+    """Run a claimed job; returns whether it succeeded"""
+    config = _config()
+    # Filtering on the lease leaves jobs alone that were re-queued meanwhile
+    leased = ImageJob.objects.filter(pk=job.pk, run_after=job.run_after)
+    try:
+        HANDLERS[job.kind](job)
+    except Exception as exc:
+        logger.exception("Image job %s failed", job)
+        retry_at = None
+        if job.attempts < config["max_attempts"]:
+            delay = config["retry_delay"] * 2 ** (job.attempts - 1)
+            retry_at = timezone.now() + timedelta(seconds=delay)
+        leased.update(run_after=retry_at, last_error=repr(exc))
+        return False
+    leased.delete()
+    return True
+
+
+def work(limit=20):
+    """Run up to ``limit`` due jobs; returns ``(succeeded, failed)`` counts"""
+    succeeded = failed = 0
+    for job in claim(limit):
+        if run(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
@@ -0,0 +1,132 @@
+"""Materialized home-page leaderboards.
+
+``trending`` scores movies by recent reviews and watchlist additions, each
+worth less the older it is (halving every ``half_life_days``). ``top_rated``
+ranks by a Bayesian average that pulls movies with few reviews towards the
+site-wide mean, so a single 5-star review doesn't top the chart.
+
+Boards are stored as ``LeaderboardEntry`` rows by ``refresh()``, which the
+refresh_leaderboards command runs on a schedule, and read through the default
+cache so the home page costs one cache hit. A board with no stored rows yet is
+ranked on read instead.
+"""
+
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .cache import bump, expire, single_flight
+from .models import LeaderboardEntry, Moviedata, Review, Watchlist
+
+BOARDS = ("trending", "top_rated")
+
+CACHE_KEY = "movies:leaderboard:{}"
+
+
+def _config(name, default):
+    return getattr(settings, "MOVIES_LEADERBOARDS", {}).get(name, default)
+
+
+def trending_scores(now=None):
+    """Movie id -> time-decayed activity score over the recent window"""
+    now = now or timezone.now()
+    half_life = timedelta(days=_config("half_life_days", 7))
+    since = now - half_life * _config("window_half_lives", 4)
+    weights = _config("activity_weights", {"review": 1.0, "watchlist": 0.5})
+    reviews = Review.objects.filter(created_at__gte=since).values_list(
+        "movie_id", "created_at"
+    )
+    added = Watchlist.objects.filter(added_on__gte=since).values_list(
+        "movie_id", "added_on"
+    )
+    scores = {}
+    for weight, rows in ((weights["review"], reviews), (weights["watchlist"], added)):
+        for movie_id, at in rows.iterator():
+            age = max((now - at) / half_life, 0)
+            scores[movie_id] = scores.get(movie_id, 0) + weight * math.pow(0.5, age)
+    return scores
+
+
+def trending(size):
+    scores = trending_scores()
+    ranked = sorted(scores, key=lambda movie_id: (-scores[movie_id], movie_id))
+    board = [(movie_id, scores[movie_id]) for movie_id in ranked[:size]]
+    if len(board) < size:
+        # A quiet site still shows a full row: newest releases fill the rest
+        newest = (
+            Moviedata.objects.exclude(pk__in=ranked[:size])
+            .order_by("-release_date")
+            .values_list("pk", flat=True)[: size - len(board)]
+        )
+        board += [(movie_id, 0.0) for movie_id in newest]
+    return board
+
+
+def top_rated(size):
+    totals = Moviedata.objects.aggregate(
+        ratings=Sum("rating_sum"), reviews=Sum("rating_count")
+    )
+    mean = (totals["ratings"] or 0) / (totals["reviews"] or 1)
+    prior = _config("prior_reviews", 5)
+    # (prior * mean + sum of ratings) / (prior + number of ratings)
+    score = (Value(prior * mean) + Cast("rating_sum", FloatField())) / (
+        Value(float(prior)) + F("rating_count")
+    )
+    movies = (
+        Moviedata.objects.filter(rating_count__gt=0)
+        .annotate(score=score)
+        .order_by("-score", "-rating_count", "pk")
+        .values_list("pk", "score")
+    )
+    return list(movies[:size])
+
+
+BUILDERS = {"trending": trending, "top_rated": top_rated}
+
+
+def refresh(boards=BOARDS):
+    """Recompute ``boards`` into the table and drop their cached copies"""
+    size = _config("size", 8)
+    for board in boards:
+        entries = [
+            LeaderboardEntry(board=board, rank=rank, movie_id=movie_id, score=score)
+            for rank, (movie_id, score) in enumerate(BUILDERS[board](size))
+        ]
+        with transaction.atomic():
+            LeaderboardEntry.objects.filter(board=board).delete()
+            LeaderboardEntry.objects.bulk_create(entries)
+        invalidate(board)
+    bump("leaderboards")
+
+
+def invalidate(board=None):
+    for name in [board] if board else BOARDS:
+        expire(CACHE_KEY.format(name))
+
+
+def _load(board):
+    entries = LeaderboardEntry.objects.filter(board=board)
+    movies = [
+        entry.movie
+        for entry in entries.select_related("movie").prefetch_related("movie__genres")
+    ]
+    if movies:
+        return movies
+    # Until refresh_leaderboards first runs (e.g. right after migrate) the
+    # board is ranked here. Only the cached copy keeps the result: writing the
+    # table is left to the command, so concurrent cold workers don't race
+    ranked = [movie_id for movie_id, _ in BUILDERS[board](_config("size", 8))]
+    found = Moviedata.objects.prefetch_related("genres").in_bulk(ranked)
+    return [found[movie_id] for movie_id in ranked if movie_id in found]
+
+
+def get(board):
+    """The board's movies in rank order, with genres prefetched"""
+    return single_flight(
+        CACHE_KEY.format(board), lambda: _load(board), _config("cache_ttl", 600)
+    )
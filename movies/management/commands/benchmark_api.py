@@ -0,0 +1,121 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from movies.models import Genre, Moviedata
+from movies.pagination import paginate, sort_columns
+from movies.serializers import MovieListSerializer, MovieSerializer
+
+SORT = "-release_date"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many movies per second the API list serializes, comparing "
+        "model instances with the .values() fast path. Synthetic movies are "
+        "added to reach --movies and rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--movies", type=int, default=10000)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Runs per strategy; the best counts"
+        )
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get("/api/movies/"))
+        context = {"request": request}
+        lean = MovieListSerializer(context=context)
+        strategies = {
+            # The list before lean serializers: every field, genres per movie
+            "instances": (
+                Moviedata.objects.all(),
+                lambda page: MovieSerializer(page, many=True, context=context).data,
+            ),
+            "instances+prefetch": (
+                Moviedata.objects.prefetch_related("genres"),
+                lambda page: MovieListSerializer(page, many=True, context=context).data,
+            ),
+            "values": (
+                Moviedata.objects.values(*{*lean.value_columns(), *sort_columns()}),
+                lean.serialize_rows,
+            ),
+        }
+        with transaction.atomic():
+            added = self.seed(options["movies"])
+            total = Moviedata.objects.count()
+            self.stdout.write(
+                f"{total} movies ({added} synthetic), "
+                f"{options['page_size']} per page, best of {options['repeat']}"
+            )
+            for name, (queryset, serialize) in strategies.items():
+                runs = [
+                    self.run(queryset, serialize, options["page_size"])
+                    for _ in range(options["repeat"])
+                ]
+                elapsed, queries = min(runs)
+                self.stdout.write(
+                    f"{name:<20} {total / elapsed:>10,.0f} movies/s "
+                    f"{elapsed:>7.2f}s {queries:>6} queries"
+                )
+            transaction.set_rollback(True)
+
+    def run(self, queryset, serialize, page_size):
+        """Serialize every page; returns the time taken and queries made"""
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            cursor = None
+            while True:
+                page = paginate(queryset, SORT, cursor, page_size)
+                serialize(page.object_list)
+                if not page.has_next:
+                    break
+                cursor = page.next_cursor
+        return time.perf_counter() - started, queries
+
+    def seed(self, target):
+        """Add synthetic movies, with genres, until there are ``target``"""
+        missing = target - Moviedata.objects.count()
+        if missing <= 0:
+            return 0
+        genres = list(Genre.objects.all()[:10]) or Genre.objects.bulk_create(
+            [Genre(name=name) for name in ("Action", "Comedy", "Drama")]
+        )
+        movies = Moviedata.objects.bulk_create(
+            [
+                Moviedata(
+                    title=f"Benchmark movie {i}",
+                    description="A synthetic movie for benchmarking. " * 20,
+                    release_date=date(1990, 1, 1) + timedelta(days=i % 12000),
+                    year=(date(1990, 1, 1) + timedelta(days=i % 12000)).year,
+                    actors="Actor One, Actor Two, Actor Three",
+                    director=f"Director {i % 500}",
+                    average_rating=i % 5,
+                )
+                for i in range(missing)
+            ],
+            batch_size=1000,
+        )
+        Moviedata.genres.through.objects.bulk_create(
+            [
+                Moviedata.genres.through(
+                    moviedata_id=movie.pk, genre_id=genres[(i + k) % len(genres)].pk
+                )
+                for i, movie in enumerate(movies)
+                for k in range(min(3, len(genres)))
+            ],
+            batch_size=1000,
+        )
+        return missing
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from movies import posters
+from movies.cache import bump
+from movies.ingest import batched
+from movies.models import Moviedata
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized poster copies served to browsers, for movies that "
+        "don't have them yet"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "movie_ids", nargs="*", type=int, help="Limit to these movies"
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Remake every movie's copies, e.g. after changing MOVIES_POSTERS",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        default = Moviedata._meta.get_field("poster_url").default
+        movies = (
+            Moviedata.objects.exclude(poster_url__in=["", default])
+            .only("pk", "poster_url", "poster_widths")
+            .order_by("pk")
+        )
+        if options["movie_ids"]:
+            movies = movies.filter(pk__in=options["movie_ids"])
+        if not options["full"]:
+            movies = movies.filter(poster_widths=[])
+
+        # Imported movies can share a poster file, so resize each file once
+        made = {}
+        updated = failed = 0
+        movie_ids = list(movies.values_list("pk", flat=True))
+        for batch in batched(movie_ids, options["batch_size"]):
+            batch = list(movies.filter(pk__in=batch))
+            for movie in batch:
+                name = movie.poster_url.name
+                if name not in made:
+                    made[name] = posters.generate(name, force=options["full"])
+                    failed += not made[name]
+                movie.poster_widths = made[name]
+                movie.updated_at = timezone.now()
+            # bulk_update skips the save signals, so refresh cached cards here
+            Moviedata.objects.bulk_update(batch, ["poster_widths", "updated_at"])
+            bump(*(f"movie:{movie.pk}" for movie in batch))
+            updated += len(batch)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Resized {len(made) - failed} poster(s) for {updated} movie(s) "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+        if failed:
+            self.stderr.write(f"{failed} poster(s) couldn't be read; see the log")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies import recommender
+
+
+class Command(BaseCommand):
+    help = (
+        "Retrain the recommender on reviews and watchlists and store each "
+        "user's recommended movies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--factors", type=int, help="Latent factors")
+        parser.add_argument("--iterations", type=int, help="ALS sweeps")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = recommender.build(options["factors"], options["iterations"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored recommendations for {count} user(s) in "
+                f"{time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the similar movies shown on detail pages, for movies whose "
+        "reviews changed since the last run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="Recompute every movie's list"
+        )
+        parser.add_argument("--top-k", type=int, help="Neighbours kept per movie")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = similarity.build(full=options["full"], k=options["top_k"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {count} movie(s) in {time.monotonic() - started:.1f}s"
+            )
+        )
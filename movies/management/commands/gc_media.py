@@ -0,0 +1,121 @@
+import posixpath
+import re
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from movies.ingest import batched
+from movies.storage import ContentAddressedStorage, is_hashed
+
+# Files made from another, such as poster copies: "<original stem>.400w.webp"
+DERIVED_NAME = re.compile(r"^(?P<stem>.+)\.\d+w\.\w+$")
+
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def stored_names(model, field):
+    return (
+        model._default_manager.exclude(**{field.name: ""})
+        .values_list(field.name, flat=True)
+        .distinct()
+    )
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete media files that no FileField or ImageField refers to, such as "
+        "replaced uploads and their resized copies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="List the files, don't delete"
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Keep files younger than this many seconds, e.g. uploads whose "
+            "row isn't saved yet (default: 3600)",
+        )
+        parser.add_argument(
+            "--rehash",
+            action="store_true",
+            help="First move files saved under their upload names to "
+            "content-addressed names, so duplicates collapse into one",
+        )
+
+    def handle(self, *args, **options):
+        if options["rehash"] and not options["dry_run"]:
+            self.rehash()
+
+        referenced = set()
+        directories = set()
+        for model, field in file_fields():
+            referenced.update(stored_names(model, field))
+            if isinstance(field.get_default(), str):
+                referenced.add(field.get_default())
+            # Only scan where models upload to; anything else in MEDIA_ROOT
+            # wasn't put there by them
+            if isinstance(field.upload_to, str) and field.upload_to:
+                directories.add(field.upload_to.split("/", 1)[0])
+        stems = {posixpath.splitext(name)[0] for name in referenced}
+
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        deleted = 0
+        for directory in sorted(directories):
+            if not default_storage.exists(directory):
+                continue
+            for name in walk(default_storage, directory):
+                derived = DERIVED_NAME.match(name)
+                if name in referenced or (derived and derived["stem"] in stems):
+                    continue
+                if default_storage.get_modified_time(name) > cutoff:
+                    continue
+                self.stdout.write(name)
+                if not options["dry_run"]:
+                    default_storage.delete(name)
+                deleted += 1
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} file(s)"))
+
+    def rehash(self):
+        """Re-save each stored file under its content-addressed name"""
+        moved = 0
+        for model, field in file_fields():
+            if not isinstance(field.storage, ContentAddressedStorage):
+                continue
+            default = field.get_default()
+            rows = model._default_manager.exclude(
+                **{f"{field.name}__in": ["", default]}
+            ).order_by("pk")
+            for pks in batched(list(rows.values_list("pk", flat=True)), 100):
+                for instance in model._default_manager.filter(pk__in=pks):
+                    stored = getattr(instance, field.attname)
+                    if is_hashed(stored.name) or not stored.storage.exists(stored.name):
+                        continue
+                    with stored.storage.open(stored.name, "rb") as content:
+                        # A full save, so the row's signals refresh caches
+                        stored.save(
+                            posixpath.basename(stored.name), File(content), save=True
+                        )
+                    moved += 1
+        self.stdout.write(f"Moved {moved} file(s) to content-addressed names")
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.ingest import ingest_movies, read_csv, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream movies from a CSV or NDJSON file into the catalog in batches. "
+        "Columns are Moviedata fields plus genres, a | or comma separated list"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to read, or "-" for stdin')
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            dest="fmt",
+            help="Defaults to the file extension, or ndjson",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["fmt"] or ("csv" if path.endswith(".csv") else "ndjson")
+        if path == "-":
+            stream = sys.stdin
+        else:
+            stream = open(path, encoding="utf-8", newline="")
+        records = read_csv(stream) if fmt == "csv" else read_records(stream)
+
+        started = time.monotonic()
+
+        def report(result):
+            rows = result.created + len(result.errors)
+            rate = rows / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f"{rows} rows ({rate:.0f} rows/s)")
+
+        with stream:
+            result = ingest_movies(
+                records, batch_size=options["batch_size"], on_batch=report
+            )
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        elapsed = time.monotonic() - started
+        total = result.created + len(result.errors)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.created} movies imported, {len(result.errors)} invalid "
+                f"in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)"
+            )
+        )
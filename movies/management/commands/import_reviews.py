@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from movies.ingest import ingest_reviews, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import reviews from a JSON array or NDJSON file of "
+        '{"movie": id, "user": username, "rating": 1-5, "comment": text} rows'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to read, or "-" for stdin')
+        parser.add_argument(
+            "--format", choices=["ndjson", "json"], default="ndjson", dest="fmt"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Overwrite existing reviews by the same user instead of skipping",
+        )
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            stream = sys.stdin
+        else:
+            stream = open(options["path"], encoding="utf-8")
+        with stream:
+            result = ingest_reviews(
+                read_records(stream, options["fmt"]),
+                batch_size=options["batch_size"],
+                update_existing=options["update"],
+            )
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.created} created, {result.updated} updated, "
+                f"{result.skipped} skipped, {len(result.errors)} invalid"
+            )
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the image jobs queued by uploads: avatar thumbnails and resized "
+        "poster copies. Keeps polling the queue unless --once is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no jobs are due"
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait when the queue is empty (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        total = failed_total = 0
+        while True:
+            succeeded, failed = jobs.work(options["batch_size"])
+            total += succeeded
+            failed_total += failed
+            if succeeded or failed:
+                self.stdout.write(f"{succeeded} job(s) done, {failed} failed")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["interval"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{total} job(s) done, {failed_total} failed")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movies import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of the configured search backend"
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt search index ({type(backend).__name__})")
+        )
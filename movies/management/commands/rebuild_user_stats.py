@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from movies.models import UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild each user's review count, average rating and favorite genre "
+        "from their reviews, e.g. after movies' genres were edited"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "user_ids", nargs="*", type=int, help="Limit to these users"
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = UserStats.recompute(options["user_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Stats rebuilt for {rebuilt} user(s)"))
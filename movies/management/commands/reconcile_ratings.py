@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from movies.models import Moviedata
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount each movie's rating totals, per-star counts and average_rating "
+        "from its reviews and fix any drift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "movie_ids", nargs="*", type=int, help="Limit to these movies"
+        )
+
+    def handle(self, *args, **options):
+        fixed = Moviedata.recompute_ratings(options["movie_ids"] or None)
+        for movie in fixed:
+            self.stdout.write(
+                f"Fixed {movie.title}: {movie.rating_count} reviews, "
+                f"average {movie.average_rating}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(fixed)} movie(s) reconciled"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies import leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the trending and top-rated home page leaderboards. "
+        "Schedule it (e.g. every 15 minutes from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "boards", nargs="*", help=f"Any of {', '.join(leaderboards.BOARDS)}"
+        )
+
+    def handle(self, *args, **options):
+        boards = options["boards"] or leaderboards.BOARDS
+        unknown = set(boards) - set(leaderboards.BOARDS)
+        if unknown:
+            raise CommandError(f"Unknown leaderboard: {', '.join(sorted(unknown))}")
+        leaderboards.refresh(boards)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {', '.join(boards)}"))
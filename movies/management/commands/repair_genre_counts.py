@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from movies.cache import invalidate_genre_facets
+from movies.models import Genre
+
+
+class Command(BaseCommand):
+    help = "Recount each genre's movie_count from the genre links and fix any drift"
+
+    def handle(self, *args, **options):
+        fixed = Genre.recount()
+        for genre in fixed:
+            self.stdout.write(f"Fixed {genre.name}: {genre.movie_count} movies")
+        if fixed:
+            invalidate_genre_facets()
+        self.stdout.write(self.style.SUCCESS(f"{len(fixed)} genre(s) repaired"))
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+SQLITE_TABLE = "movies_moviedata_fts"
+POSTGRES_TABLE = "movies_moviedata_search"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    Moviedata = apps.get_model("movies", "Moviedata")
+
+    if connection.vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+            "title, description, actors, director, genres, year, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        insert = (
+            f"INSERT INTO {SQLITE_TABLE} "
+            "(rowid, title, description, actors, director, genres, year) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+            "movie_id bigint PRIMARY KEY "
+            "REFERENCES movies_moviedata (id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_gin "
+            f"ON {POSTGRES_TABLE} USING gin (document)"
+        )
+        insert = (
+            f"INSERT INTO {POSTGRES_TABLE} (movie_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'D') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'C'))"
+        )
+    else:
+        # Other databases use the in-memory index
+        return
+
+    with connection.cursor() as cursor:
+        for movie in Moviedata.objects.prefetch_related("genres").iterator(
+            chunk_size=2000
+        ):
+            cursor.execute(
+                insert,
+                [
+                    movie.pk,
+                    movie.title,
+                    movie.description,
+                    movie.actors,
+                    movie.director,
+                    " ".join(genre.name for genre in movie.genres.all()),
+                    str(movie.year),
+                ],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0007_profile"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_name', models.CharField(editable=False, max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'People',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieCredit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(blank=True, help_text='Character name', max_length=200)),
+                ('billing_order', models.PositiveSmallIntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.moviedata')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movies.person')),
+            ],
+            options={
+                'ordering': ['billing_order'],
+                'unique_together': {('movie', 'person')},
+            },
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='cast',
+            field=models.ManyToManyField(blank=True, related_name='movies', through='movies.MovieCredit', to='movies.person'),
+        ),
+    ]
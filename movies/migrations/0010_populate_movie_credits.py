@@ -0,0 +1,68 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def split_names(text):
+    names = (" ".join(name.split()) for name in (text or "").split(","))
+    return [name for name in names if name]
+
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+def populate_credits(apps, schema_editor):
+    """Parse Moviedata.actors into Person and MovieCredit rows, in batches"""
+    Moviedata = apps.get_model("movies", "Moviedata")
+    Person = apps.get_model("movies", "Person")
+    MovieCredit = apps.get_model("movies", "MovieCredit")
+
+    movies = Moviedata.objects.order_by("pk").values_list("pk", "actors")
+    last_pk = 0
+    while True:
+        batch = list(movies.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        casts = [(pk, split_names(actors)) for pk, actors in batch]
+        wanted = {}
+        for _, names in casts:
+            for name in names:
+                wanted.setdefault(normalize(name), name)
+        Person.objects.bulk_create(
+            [Person(name=name, normalized_name=key) for key, name in wanted.items()],
+            ignore_conflicts=True,
+        )
+        people = Person.objects.in_bulk(list(wanted), field_name="normalized_name")
+
+        credits = []
+        for movie_id, names in casts:
+            seen = set()
+            for order, name in enumerate(names):
+                person = people[normalize(name)]
+                if person.pk not in seen:
+                    seen.add(person.pk)
+                    credits.append(
+                        MovieCredit(
+                            movie_id=movie_id, person=person, billing_order=order
+                        )
+                    )
+        MovieCredit.objects.bulk_create(credits, ignore_conflicts=True)
+
+
+def remove_credits(apps, schema_editor):
+    apps.get_model("movies", "MovieCredit").objects.all().delete()
+    apps.get_model("movies", "Person").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0009_person_moviecredit"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_credits, remove_credits),
+    ]
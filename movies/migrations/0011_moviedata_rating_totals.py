@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:14
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rating_totals(apps, schema_editor):
+    Moviedata = apps.get_model('movies', 'Moviedata')
+    Review = apps.get_model('movies', 'Review')
+    totals = Review.objects.values('movie_id').annotate(total=Sum('rating'), count=Count('id'))
+    for row in totals.iterator():
+        Moviedata.objects.filter(pk=row['movie_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            average_rating=round(row['total'] / row['count'], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_populate_movie_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_totals, migrations.RunPython.noop),
+    ]
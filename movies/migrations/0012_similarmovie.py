@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_moviedata_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviedata',
+            name='similarity_stale',
+            field=models.BooleanField(db_index=True, default=True, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='movies.moviedata')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.moviedata')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'unique_together': {('movie', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_similarmovie'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='moviedata',
+            index=models.Index(fields=['-average_rating', '-rating_count'], name='movie_top_rated_idx'),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='movie',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.moviedata'),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recommendation',
+            unique_together={('user', 'rank')},
+        ),
+    ]
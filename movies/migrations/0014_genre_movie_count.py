@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_movie_counts(apps, schema_editor):
+    Genre = apps.get_model("movies", "Genre")
+    for genre in Genre.objects.annotate(count=Count("movies")).iterator():
+        Genre.objects.filter(pk=genre.pk).update(movie_count=genre.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0013_recommendation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="genre",
+            name="movie_count",
+            field=models.PositiveIntegerField(
+                db_index=True, default=0, editable=False
+            ),
+        ),
+        migrations.RunPython(populate_movie_counts, migrations.RunPython.noop),
+    ]
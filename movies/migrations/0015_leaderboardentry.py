@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_genre_movie_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('trending', 'Trending'), ('top_rated', 'Top rated')], max_length=20)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.moviedata')),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard entries',
+                'ordering': ['board', 'rank'],
+                'unique_together': {('board', 'rank')},
+            },
+        ),
+    ]
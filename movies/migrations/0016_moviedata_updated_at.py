@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0015_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviedata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0016_moviedata_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moviedata',
+            index=models.Index(fields=['release_date', 'id'], name='movie_release_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviedata',
+            index=models.Index(fields=['average_rating', 'id'], name='movie_rating_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviedata',
+            index=models.Index(fields=['title', 'id'], name='movie_title_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviedata',
+            index=models.Index(fields=['year', 'id'], name='movie_year_keyset_idx'),
+        ),
+    ]
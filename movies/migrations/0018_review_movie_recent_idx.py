@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0017_moviedata_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['movie', 'created_at', 'id'], name='review_movie_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_star_counts(apps, schema_editor):
+    Moviedata = apps.get_model('movies', 'Moviedata')
+    Review = apps.get_model('movies', 'Review')
+    counters = {
+        f'rating_{stars}_count': Count('id', filter=Q(rating=stars))
+        for stars in range(1, 6)
+    }
+    for row in Review.objects.values('movie_id').annotate(**counters).iterator():
+        Moviedata.objects.filter(pk=row['movie_id']).update(
+            **{name: row[name] for name in counters}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0018_review_movie_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='moviedata',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_star_counts, migrations.RunPython.noop),
+    ]
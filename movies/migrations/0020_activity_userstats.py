@@ -0,0 +1,147 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_activity_and_stats(apps, schema_editor):
+    Activity = apps.get_model('movies', 'Activity')
+    Review = apps.get_model('movies', 'Review')
+    UserGenreCount = apps.get_model('movies', 'UserGenreCount')
+    UserStats = apps.get_model('movies', 'UserStats')
+    Watchlist = apps.get_model('movies', 'Watchlist')
+
+    Activity.objects.bulk_create(
+        (
+            Activity(
+                user_id=review.user_id,
+                movie_id=review.movie_id,
+                kind='review',
+                rating=review.rating,
+                created_at=review.created_at,
+            )
+            for review in Review.objects.iterator()
+        ),
+        batch_size=2000,
+    )
+    Activity.objects.bulk_create(
+        (
+            Activity(
+                user_id=item.user_id,
+                movie_id=item.movie_id,
+                kind='watchlist',
+                created_at=item.added_on,
+            )
+            for item in Watchlist.objects.iterator()
+        ),
+        batch_size=2000,
+    )
+
+    favorites = {}
+    genre_counts = (
+        Review.objects.exclude(movie__genres=None)
+        .values('user_id', 'movie__genres')
+        .annotate(count=Count('id'))
+        .order_by('user_id', '-count', 'movie__genres')
+    )
+    for row in genre_counts.iterator():
+        favorites.setdefault(row['user_id'], row['movie__genres'])
+        UserGenreCount.objects.create(
+            user_id=row['user_id'],
+            genre_id=row['movie__genres'],
+            review_count=row['count'],
+        )
+    totals = Review.objects.values('user_id').annotate(
+        count=Count('id'), total=Sum('rating')
+    )
+    for row in totals.iterator():
+        UserStats.objects.create(
+            user_id=row['user_id'],
+            review_count=row['count'],
+            rating_sum=row['total'],
+            favorite_genre_id=favorites.get(row['user_id']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('movies', '0019_moviedata_star_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('review', 'Review'), ('watchlist', 'Watchlist')], max_length=20)),
+                ('rating', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Activities',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserGenreCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='review_user_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='movie',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.moviedata'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='usergenrecount',
+            name='genre',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.genre'),
+        ),
+        migrations.AddField(
+            model_name='usergenrecount',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='favorite_genre',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='movies.genre'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='activity_user_recent_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usergenrecount',
+            unique_together={('user', 'genre')},
+        ),
+        migrations.RunPython(backfill_activity_and_stats, migrations.RunPython.noop),
+    ]
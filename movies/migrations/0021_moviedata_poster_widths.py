@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0020_activity_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviedata',
+            name='poster_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
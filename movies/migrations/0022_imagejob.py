@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0021_moviedata_poster_widths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('avatar', 'Avatar thumbnail'), ('poster', 'Poster copies')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run_after'], name='image_job_due_idx')],
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+    ]
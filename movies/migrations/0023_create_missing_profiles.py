@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:50
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Saving a user no longer creates a missing profile, so every user needs one
+    Profile = apps.get_model('movies', 'Profile')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile.objects.bulk_create(
+        [Profile(user_id=pk) for pk in User.objects.filter(profile__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0022_imagejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
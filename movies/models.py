@@ -1,11 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Avg, Count, Q
-from django.db.models.signals import post_save
+from django.db.models import Avg, Case, Count, DecimalField, F, FloatField, Q, Sum, When
+from django.db.models.functions import Cast
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+from django.utils import timezone
 
 
 class Genre(models.Model):
@@ -14,6 +15,9 @@ class Genre(models.Model):
     name = models.CharField(
         max_length=100, unique=True, db_index=True
     )  # Added db_index for faster lookups
+    movie_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )  # Kept in step with Moviedata.genres by signals below
 
     class Meta:
         ordering = ["name"]  # Always order alphabetically
@@ -21,6 +25,30 @@ class Genre(models.Model):
     def __str__(self):
         return self.name.title()  # Ensure proper capitalization
 
+    @classmethod
+    def adjust_counts(cls, deltas):
+        """Apply ``{genre_id: change}`` to movie_count, one UPDATE per change"""
+        by_delta = {}
+        for genre_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(genre_id)
+        for delta, genre_ids in by_delta.items():
+            cls.objects.filter(pk__in=genre_ids).update(
+                movie_count=F("movie_count") + delta
+            )
+
+    @classmethod
+    def recount(cls, genre_ids=None):
+        """Recount movie_count from the genre links; returns the genres fixed"""
+        genres = cls.objects.annotate(actual=Count("movies"))
+        if genre_ids is not None:
+            genres = genres.filter(pk__in=genre_ids)
+        stale = [genre for genre in genres if genre.movie_count != genre.actual]
+        for genre in stale:
+            genre.movie_count = genre.actual
+        cls.objects.bulk_update(stale, ["movie_count"], batch_size=500)
+        return stale
+
 
 class Profile(models.Model):
     """Extended user profile information"""
@@ -29,20 +57,51 @@ class Profile(models.Model):
     avatar = models.ImageField(upload_to="profile_pics/", null=True, blank=True)
     bio = models.TextField(blank=True)
 
-    def save(self, *args, **kwargs):
-        if self.avatar:
-            img = Image.open(self.avatar)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-
-                thumb_io = BytesIO()
-                img.save(thumb_io, format=img.format)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance._field_values()
+        return instance
+
+    def _field_values(self):
+        deferred = self.get_deferred_fields()
+        values = {}
+        for field in self._meta.concrete_fields:
+            if not field.primary_key and field.attname not in deferred:
+                value = getattr(self, field.attname)
+                # Files compare by their stored name
+                values[field.name] = getattr(value, "name", value)
+        return values
+
+    def changed_fields(self):
+        """Fields set to something other than what was loaded or last saved"""
+        loaded = getattr(self, "_loaded", {})
+        return [
+            name
+            for name, value in self._field_values().items()
+            if name not in loaded or loaded[name] != value
+        ]
 
-                self.avatar.save(
-                    self.avatar.name, ContentFile(thumb_io.getvalue()), save=False
-                )
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        """Write only the changed fields, if any, and queue a new avatar for
+        the process_images worker to shrink"""
+        if not self._state.adding and "update_fields" not in kwargs:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs["update_fields"] = changed
+        update_fields = kwargs.get("update_fields")
+        avatar_changed = (
+            update_fields is None or "avatar" in update_fields
+        ) and "avatar" in self.changed_fields()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if avatar_changed and self.avatar:
+                ImageJob.enqueue("avatar", self.pk, self.avatar.name)
+        saved = self._field_values()
+        if update_fields is not None:
+            saved = {name: saved[name] for name in update_fields if name in saved}
+        self._loaded = {**getattr(self, "_loaded", {}), **saved}
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -54,19 +113,68 @@ class Profile(models.Model):
         return None
 
 
-# Signal to create/update profile when User is created/updated
+# Every user gets a profile when created. Saving a user doesn't touch it:
+# Profile.save() writes only changed fields, so views save it themselves
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:  # Fixtures load profiles as rows of their own
         Profile.objects.create(user=instance)
 
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, "profile"):
-        instance.profile.save()
-    else:
-        Profile.objects.create(user=instance)
+def split_names(text):
+    """Split a comma-separated list of names, collapsing stray whitespace"""
+    names = (" ".join(name.split()) for name in (text or "").split(","))
+    return [name for name in names if name]
+
+
+class Person(models.Model):
+    """An actor, shared by every movie crediting them"""
+
+    name = models.CharField(max_length=200)
+    normalized_name = models.CharField(
+        max_length=200, unique=True, editable=False
+    )  # Case-folded name used for exact, indexed lookups
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name_plural = "People"
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = self.normalize(self.name)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def normalize(name):
+        """The key a name is matched by here and in the fuzzy actor index"""
+        return " ".join(str(name).split()).casefold()
+
+    @classmethod
+    def resolve(cls, names):
+        """Map normalized name -> Person for ``names``, creating missing ones"""
+        wanted = {}
+        for name in names:
+            wanted.setdefault(cls.normalize(name), name)
+        people = cls.objects.in_bulk(list(wanted), field_name="normalized_name")
+        missing = [
+            cls(name=name, normalized_name=key)
+            for key, name in wanted.items()
+            if key not in people
+        ]
+        if missing:
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            people = cls.objects.in_bulk(list(wanted), field_name="normalized_name")
+        return people
+
+
+STARS = range(1, 6)
+
+
+def star_field(stars):
+    """Name of the Moviedata counter of ``stars``-star reviews"""
+    return f"rating_{stars}_count"
 
 
 class Moviedata(models.Model):
@@ -81,30 +189,151 @@ class Moviedata(models.Model):
         related_name="movies",  # Added for reverse lookups
         blank=True,  # Allow movies without genres
     )
-    average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    average_rating = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0
+    )  # Derived from rating_sum / rating_count
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    # Reviews per star rating, for the histogram; kept with the totals above
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
     poster_url = models.ImageField(
         upload_to="movie_posters/", default="default_poster.jpg"  # More specific path
     )
+    poster_widths = models.JSONField(
+        default=list, blank=True, editable=False
+    )  # Resized copies of the poster; see movies/posters.py
     actors = models.TextField(blank=True, help_text="Comma-separated list of actors")
+    cast = models.ManyToManyField(
+        Person,
+        through="MovieCredit",
+        related_name="movies",
+        blank=True,
+    )  # Kept in sync with `actors` on save
     director = models.CharField(max_length=200, blank=True, db_index=True)
     year = models.PositiveIntegerField(editable=False)  # Made non-editable
+    similarity_stale = models.BooleanField(
+        default=True, db_index=True, editable=False
+    )  # Set when reviews change; build_similarities refreshes these movies
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True
+    )  # Also bumped by review, genre and similarity writes; HTTP validators
 
     class Meta:
         ordering = ["-release_date"]  # Default ordering
         verbose_name_plural = "Movie Data"  # Better admin display
+        indexes = [
+            # Top-rated lists, such as the cold-start recommendations
+            models.Index(
+                fields=["-average_rating", "-rating_count"], name="movie_top_rated_idx"
+            ),
+            # Keyset pagination seeks on (sort field, id); see movies/pagination.py
+            models.Index(
+                fields=["release_date", "id"], name="movie_release_keyset_idx"
+            ),
+            models.Index(
+                fields=["average_rating", "id"], name="movie_rating_keyset_idx"
+            ),
+            models.Index(fields=["title", "id"], name="movie_title_keyset_idx"),
+            models.Index(fields=["year", "id"], name="movie_year_keyset_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.year})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded cast so save() only rewrites credits on change
+        instance._loaded_actors = instance.__dict__.get("actors")
+        # And the poster, so save() only queues a new one
+        instance._loaded_poster = instance.__dict__.get("poster_url")
+        # And the year, so only a move to another year refreshes the year lists
+        instance._loaded_year = instance.__dict__.get("year")
+        return instance
+
     def save(self, *args, **kwargs):
-        """Auto-set year from release_date"""
+        """Auto-set year from release_date, sync credits from actors and queue
+        a new poster for resizing"""
         if self.release_date:
             self.year = self.release_date.year
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        deferred = self.get_deferred_fields()
+        actors_changed = (
+            "actors" not in deferred
+            and (update_fields is None or "actors" in update_fields)
+            and self.actors != getattr(self, "_loaded_actors", None)
+        )
+        poster_changed = (
+            "poster_url" not in deferred
+            and (update_fields is None or "poster_url" in update_fields)
+            and self.poster_url.name != getattr(self, "_loaded_poster", None)
+        )
+        if poster_changed:
+            # Pages show the original until the process_images worker has
+            # made the new poster's copies
+            self.poster_widths = []
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "poster_widths"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if actors_changed:
+                self.sync_credits()
+            if poster_changed:
+                self.queue_poster()
+
+    def has_poster(self):
+        """Whether the movie has its own poster, not the default one"""
+        default = self._meta.get_field("poster_url").default
+        return bool(self.poster_url) and self.poster_url.name != default
+
+    def queue_poster(self):
+        """Queue the poster for the process_images worker to resize"""
+        if self.has_poster():
+            ImageJob.enqueue("poster", self.pk, self.poster_url.name)
+        self._loaded_poster = self.poster_url.name
+
+    def sync_credits(self):
+        """Bring the MovieCredit rows in line with the comma-separated actors.
+
+        Only people added to or dropped from the list gain or lose a credit;
+        the others keep theirs, with any role set in the admin.
+        """
+        names = split_names(self.actors)
+        people = Person.resolve(names)
+        billing = {}
+        for order, name in enumerate(names):
+            billing.setdefault(people[Person.normalize(name)].pk, order)
+        credits = {
+            credit.person_id: credit
+            for credit in MovieCredit.objects.filter(movie=self)  # Not prefetched
+        }
+        dropped = [
+            credit.pk
+            for person_id, credit in credits.items()
+            if person_id not in billing
+        ]
+        if dropped:
+            MovieCredit.objects.filter(pk__in=dropped).delete()
+        moved = []
+        for person_id, credit in credits.items():
+            if person_id in billing and credit.billing_order != billing[person_id]:
+                credit.billing_order = billing[person_id]
+                moved.append(credit)
+        MovieCredit.objects.bulk_update(moved, ["billing_order"])
+        MovieCredit.objects.bulk_create(
+            MovieCredit(movie=self, person_id=person_id, billing_order=order)
+            for person_id, order in billing.items()
+            if person_id not in credits
+        )
+        self._loaded_actors = self.actors
 
     def get_actors_list(self):
-        """Returns cleaned list of actors"""
-        return [actor.strip() for actor in self.actors.split(",") if actor.strip()]
+        """Cast names in billing order, from the actors field"""
+        return split_names(self.actors)
 
     def display_genres(self):
         """Formatted string of genres for admin/templates"""
@@ -112,26 +341,201 @@ class Moviedata(models.Model):
 
     display_genres.short_description = "Genres"
 
-    def update_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            self.average_rating = sum(review.rating for review in reviews) / len(
-                reviews
-            )
-        else:
-            self.average_rating = 0
-        self.save()
-
     @property
     def rating(self):
         """Public-facing rating (same as average_rating)"""
         return self.average_rating
 
+    @property
+    def rating_distribution(self):
+        """Number of reviews per star rating, 5 stars first"""
+        return {stars: getattr(self, star_field(stars)) for stars in reversed(STARS)}
+
+    @classmethod
+    def adjust_rating(cls, movie_id, added=None, removed=None):
+        """Apply a review write to the running totals in one UPDATE.
+
+        ``added`` and ``removed`` are the star ratings entering and leaving
+        the totals; an edited rating passes both. Both sides of every
+        assignment read the row's old values, so concurrent writers never
+        lose each other's deltas.
+        """
+        star_deltas = Counter({added: 1}) if added is not None else Counter()
+        if removed is not None:
+            star_deltas[removed] -= 1
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        new_sum = F("rating_sum") + sum_delta
+        new_count = F("rating_count") + count_delta
+        return cls.objects.filter(pk=movie_id).update(
+            similarity_stale=True,  # Its co-ratings changed
+            updated_at=timezone.now(),
+            rating_sum=new_sum,
+            rating_count=new_count,
+            average_rating=Case(
+                When(
+                    rating_count__gt=-count_delta,
+                    then=Cast(
+                        Cast(new_sum, FloatField()) / new_count,
+                        DecimalField(max_digits=3, decimal_places=2),
+                    ),
+                ),
+                default=0,
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            **{
+                star_field(stars): F(star_field(stars)) + delta
+                for stars, delta in star_deltas.items()
+                if delta
+            },
+        )
+
+    @classmethod
+    def recompute_ratings(cls, movie_ids=None):
+        """Recount totals from the reviews table; returns the movies fixed"""
+        movies = cls.objects.all()
+        if movie_ids is not None:
+            movies = movies.filter(pk__in=movie_ids)
+        counters = [star_field(stars) for stars in STARS]
+        star_counts = {
+            row["movie_id"]: [row[name] for name in counters]
+            for row in Review.objects.filter(movie__in=movies)
+            .values("movie_id")
+            .annotate(
+                **{
+                    star_field(stars): Count("id", filter=Q(rating=stars))
+                    for stars in STARS
+                }
+            )
+        }
+        stale = []
+        now = timezone.now()
+        movies = movies.only(
+            "id", "rating_sum", "rating_count", "average_rating", *counters
+        )
+        for movie in movies.iterator(chunk_size=2000):
+            counts = star_counts.get(movie.pk, [0] * len(counters))
+            rating_count = sum(counts)
+            rating_sum = sum(stars * count for stars, count in zip(STARS, counts))
+            average = Decimal(rating_sum) / rating_count if rating_count else Decimal(0)
+            # Databases round the stored average differently, so allow for it
+            if [getattr(movie, name) for name in counters] != counts or abs(
+                movie.average_rating - average
+            ) > Decimal("0.005"):
+                for name, count in zip(counters, counts):
+                    setattr(movie, name, count)
+                movie.rating_sum = rating_sum
+                movie.rating_count = rating_count
+                movie.average_rating = average.quantize(Decimal("0.01"), ROUND_HALF_UP)
+                movie.updated_at = now
+                stale.append(movie)
+        cls.objects.bulk_update(
+            stale,
+            ["rating_sum", "rating_count", "average_rating", *counters, "updated_at"],
+            batch_size=500,
+        )
+        return stale
+
+    @classmethod
+    def touch(cls, movie_ids):
+        """Mark movies as changed by writes that don't go through save()"""
+        return cls.objects.filter(pk__in=movie_ids).update(updated_at=timezone.now())
+
     def update_rating(self):
-        """Updates average_rating from reviews"""
-        result = self.reviews.aggregate(Avg("rating"))
-        self.average_rating = result["rating__avg"] or 0
-        self.save()
+        """Recount this movie's totals from its reviews"""
+        Moviedata.recompute_ratings([self.pk])
+        self.refresh_from_db(
+            fields=[
+                "rating_sum",
+                "rating_count",
+                "average_rating",
+                *(star_field(stars) for stars in STARS),
+            ]
+        )
+
+
+# Genre.movie_count bookkeeping. Removals and clears look up the links that
+# actually exist first, since remove() reports every id it was passed.
+@receiver(m2m_changed, sender=Moviedata.genres.through)
+def count_genre_links(sender, instance, action, reverse, pk_set, **kwargs):
+    links = Moviedata.genres.through.objects
+    if reverse:
+        links = links.filter(genre_id=instance.pk)
+        if action == "pre_remove":
+            instance._unlinked = links.filter(moviedata_id__in=pk_set).count()
+        elif action == "pre_clear":
+            instance._unlinked = links.count()
+        elif action == "post_add":
+            Genre.adjust_counts({instance.pk: len(pk_set)})
+        elif action in ("post_remove", "post_clear"):
+            Genre.adjust_counts({instance.pk: -instance.__dict__.pop("_unlinked", 0)})
+    else:
+        links = links.filter(moviedata_id=instance.pk)
+        if action == "pre_remove":
+            links = links.filter(genre_id__in=pk_set)
+        if action in ("pre_remove", "pre_clear"):
+            instance._unlinked = list(links.values_list("genre_id", flat=True))
+        elif action == "post_add":
+            Genre.adjust_counts(dict.fromkeys(pk_set, 1))
+        elif action in ("post_remove", "post_clear"):
+            unlinked = instance.__dict__.pop("_unlinked", [])
+            Genre.adjust_counts(dict.fromkeys(unlinked, -1))
+
+
+# Deleting a movie drops its links without sending m2m_changed
+@receiver(pre_delete, sender=Moviedata)
+def remember_movie_genres(sender, instance, **kwargs):
+    instance._deleted_genre_ids = list(
+        Moviedata.genres.through.objects.filter(moviedata_id=instance.pk).values_list(
+            "genre_id", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Moviedata)
+def uncount_movie_genres(sender, instance, **kwargs):
+    genre_ids = instance.__dict__.get("_deleted_genre_ids", [])
+    Genre.adjust_counts(dict.fromkeys(genre_ids, -1))
+
+
+# Genre names are part of every linked movie's page and API representation
+@receiver(m2m_changed, sender=Moviedata.genres.through)
+def touch_relinked_movies(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            Moviedata.touch([instance.pk])
+    elif action == "pre_clear":
+        # genre.movies.clear() doesn't report which movies it touches
+        Moviedata.touch(instance.movies.values("pk"))
+    elif action in ("post_add", "post_remove"):
+        Moviedata.touch(pk_set)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(pre_delete, sender=Genre)
+def touch_genre_movies(sender, instance, created=False, **kwargs):
+    if not created:
+        Moviedata.touch(instance.movies.values("pk"))
+
+
+class MovieCredit(models.Model):
+    """A person's credit on a movie, in billing order"""
+
+    movie = models.ForeignKey(
+        Moviedata, on_delete=models.CASCADE, related_name="credits"
+    )
+    person = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="credits"
+    )  # Indexed, so "movies with this actor" is a single index lookup
+    role = models.CharField(max_length=200, blank=True, help_text="Character name")
+    billing_order = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["billing_order"]
+        unique_together = ("movie", "person")
+
+    def __str__(self):
+        return f"{self.person.name} in {self.movie.title}"
 
 
 class Review(models.Model):
@@ -145,27 +549,69 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ("movie", "user")
+        indexes = [
+            # A movie's reviews, newest first, paged by (created_at, id)
+            models.Index(
+                fields=["movie", "created_at", "id"], name="review_movie_recent_idx"
+            ),
+            # A user's reviews, newest first, on their profile
+            models.Index(
+                fields=["user", "created_at", "id"], name="review_user_recent_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s review for {self.movie.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an edit only applies the difference
+        instance._loaded_rating = instance.__dict__.get("rating")
+        return instance
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # More efficient rating update
-        avg_rating = self.movie.reviews.aggregate(Avg("rating"))["rating__avg"] or 0
-        Moviedata.objects.filter(pk=self.movie.pk).update(average_rating=avg_rating)
-
-    def delete(self, *args, **kwargs):
-        movie_pk = self.movie.pk
-        super().delete(*args, **kwargs)
-        # Update rating after deletion
-        avg_rating = (
-            Review.objects.filter(movie_id=movie_pk).aggregate(Avg("rating"))[
-                "rating__avg"
-            ]
-            or 0
-        )
-        Moviedata.objects.filter(pk=movie_pk).update(average_rating=avg_rating)
+        self.rating = int(self.rating)
+        adding = self._state.adding
+        if not adding:
+            old_rating = getattr(self, "_loaded_rating", None)
+            if old_rating is None:
+                old_rating = (
+                    Review.objects.filter(pk=self.pk)
+                    .values_list("rating", flat=True)
+                    .first()
+                )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Moviedata.adjust_rating(self.movie_id, added=self.rating)
+                UserStats.adjust(self.user_id, self.movie_id, added=self.rating)
+            elif old_rating is not None and old_rating != self.rating:
+                Moviedata.adjust_rating(
+                    self.movie_id, added=self.rating, removed=old_rating
+                )
+                UserStats.adjust(
+                    self.user_id, self.movie_id, added=self.rating, removed=old_rating
+                )
+            else:
+                Moviedata.touch([self.movie_id])  # The comment is on its page
+        self._loaded_rating = self.rating
+
+
+def deletes_movie(origin, movie_id):
+    """Whether a delete started from ``origin`` deletes the movie too"""
+    if isinstance(origin, Moviedata):
+        return origin.pk == movie_id
+    return isinstance(origin, models.QuerySet) and origin.model is Moviedata
+
+
+# Runs for queryset and cascade deletes too, not just Review.delete()
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, origin=None, **kwargs):
+    # A deleted movie's totals go with its row
+    if not deletes_movie(origin, instance.movie_id):
+        Moviedata.adjust_rating(instance.movie_id, removed=instance.rating)
+    UserStats.adjust(instance.user_id, instance.movie_id, removed=instance.rating)
 
 
 class Watchlist(models.Model):
@@ -179,3 +625,281 @@ class Watchlist(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s watchlist: {self.movie.title}"
+
+
+class SimilarMovie(models.Model):
+    """One of a movie's precomputed nearest neighbours, best first"""
+
+    movie = models.ForeignKey(
+        Moviedata, on_delete=models.CASCADE, related_name="similar_entries"
+    )
+    similar = models.ForeignKey(Moviedata, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["rank"]
+        unique_together = ("movie", "rank")  # Also the index the detail page reads
+
+    def __str__(self):
+        return f"{self.similar.title} similar to {self.movie.title}"
+
+
+class LeaderboardEntry(models.Model):
+    """A movie's place on a precomputed home-page leaderboard"""
+
+    BOARD_CHOICES = [("trending", "Trending"), ("top_rated", "Top rated")]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    movie = models.ForeignKey(Moviedata, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["board", "rank"]
+        unique_together = ("board", "rank")
+        verbose_name_plural = "Leaderboard entries"
+
+    def __str__(self):
+        return f"#{self.rank + 1} {self.get_board_display()}: {self.movie.title}"
+
+
+class Recommendation(models.Model):
+    """A movie recommended to a user by the build_recommendations job"""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="recommendations"
+    )
+    movie = models.ForeignKey(Moviedata, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["rank"]
+        unique_together = ("user", "rank")  # Also the index profile() reads
+
+    def __str__(self):
+        return f"{self.movie.title} for {self.user.username}"
+
+
+# Drop a recommendation once the user reviews or bookmarks the movie
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Watchlist)
+def discard_seen_recommendation(sender, instance, created, **kwargs):
+    if created:
+        Recommendation.objects.filter(
+            user_id=instance.user_id, movie_id=instance.movie_id
+        ).delete()
+
+
+class Activity(models.Model):
+    """An entry in a user's activity feed, appended as it happens"""
+
+    KIND_CHOICES = [("review", "Review"), ("watchlist", "Watchlist")]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activities")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    movie = models.ForeignKey(Moviedata, on_delete=models.CASCADE, related_name="+")
+    rating = models.PositiveSmallIntegerField(null=True, blank=True)  # Reviews only
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # The profile feed: one user's newest entries, paged by (created_at, id)
+            models.Index(
+                fields=["user", "created_at", "id"], name="activity_user_recent_idx"
+            ),
+        ]
+        verbose_name_plural = "Activities"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.text}"
+
+    @property
+    def text(self):
+        if self.kind == "review":
+            return f"Reviewed {self.movie.title} with {self.rating}★"
+        return f"Added {self.movie.title} to watchlist"
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Watchlist)
+def record_activity(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if sender is Review:
+        activity = Activity(kind="review", rating=instance.rating)
+        activity.created_at = instance.created_at
+    else:
+        activity = Activity(kind="watchlist", created_at=instance.added_on)
+    activity.user_id = instance.user_id
+    activity.movie_id = instance.movie_id
+    activity.save()
+
+
+class UserGenreCount(models.Model):
+    """How many of a user's reviews are of movies in a genre"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name="+")
+    review_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "genre")
+
+
+class UserStats(models.Model):
+    """A user's profile figures, kept in step with their reviews"""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    favorite_genre = models.ForeignKey(
+        Genre, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )  # Most reviewed genre; ties go to the older genre
+
+    class Meta:
+        verbose_name_plural = "User stats"
+
+    def __str__(self):
+        return f"{self.user.username}'s stats"
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 1)
+
+    @classmethod
+    def for_user(cls, user):
+        """``user``'s stats, or empty ones if they haven't reviewed anything"""
+        stats = cls.objects.select_related("favorite_genre").filter(user=user).first()
+        return stats or cls(user=user)
+
+    @classmethod
+    def adjust(cls, user_id, movie_id, added=None, removed=None):
+        """Apply a review write, like ``Moviedata.adjust_rating``"""
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        # Only additions create rows: removals also run while a user is being
+        # deleted, after their rows are gone
+        if added is not None:
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+        cls.objects.filter(user_id=user_id).update(
+            review_count=F("review_count") + count_delta,
+            rating_sum=F("rating_sum") + sum_delta,
+        )
+        if not count_delta:
+            return
+        genre_ids = list(
+            Moviedata.genres.through.objects.filter(moviedata_id=movie_id).values_list(
+                "genre_id", flat=True
+            )
+        )
+        if not genre_ids:
+            return
+        if count_delta > 0:
+            UserGenreCount.objects.bulk_create(
+                [UserGenreCount(user_id=user_id, genre_id=pk) for pk in genre_ids],
+                ignore_conflicts=True,
+            )
+        UserGenreCount.objects.filter(user_id=user_id, genre_id__in=genre_ids).update(
+            review_count=F("review_count") + count_delta
+        )
+        favorite = (
+            UserGenreCount.objects.filter(user_id=user_id, review_count__gt=0)
+            .order_by("-review_count", "genre_id")
+            .values_list("genre_id", flat=True)
+            .first()
+        )
+        cls.objects.filter(user_id=user_id).update(favorite_genre_id=favorite)
+
+    @classmethod
+    def recompute(cls, user_ids=None):
+        """Rebuild stats from the reviews table; returns the number of users"""
+        reviews = Review.objects.all()
+        if user_ids is not None:
+            reviews = reviews.filter(user_id__in=user_ids)
+        totals = reviews.values("user_id").annotate(
+            count=Count("id"), total=Sum("rating")
+        )
+        genre_counts = (
+            reviews.exclude(movie__genres=None)
+            .values("user_id", "movie__genres")
+            .annotate(count=Count("id"))
+            # By id, as in adjust(); "movie__genres" alone would sort by name
+            .order_by("user_id", "-count", "movie__genres__id")
+        )
+        favorites = {}
+        counts = []
+        for row in genre_counts:
+            favorites.setdefault(row["user_id"], row["movie__genres"])
+            counts.append(
+                UserGenreCount(
+                    user_id=row["user_id"],
+                    genre_id=row["movie__genres"],
+                    review_count=row["count"],
+                )
+            )
+        stats = [
+            cls(
+                user_id=row["user_id"],
+                review_count=row["count"],
+                rating_sum=row["total"],
+                favorite_genre_id=favorites.get(row["user_id"]),
+            )
+            for row in totals
+        ]
+        with transaction.atomic():
+            for model in (cls, UserGenreCount):
+                existing = model.objects.all()
+                if user_ids is not None:
+                    existing = existing.filter(user_id__in=user_ids)
+                existing.delete()
+            UserGenreCount.objects.bulk_create(counts, batch_size=2000)
+            cls.objects.bulk_create(stats, batch_size=2000)
+        return len(stats)
+
+
+class ImageJob(models.Model):
+    """Queued work on an uploaded image, done by the process_images worker.
+
+    Saves only add a row here, keeping image decoding off the request path.
+    An object has at most one job, for its latest image.
+    """
+
+    KIND_CHOICES = [("avatar", "Avatar thumbnail"), ("poster", "Poster copies")]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()  # Profile or Moviedata pk
+    name = models.CharField(max_length=255)  # The stored image to process
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(
+        null=True, default=timezone.now
+    )  # Also the lease while a worker runs it; null once retries are exhausted
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("kind", "object_id")
+        indexes = [models.Index(fields=["run_after"], name="image_job_due_idx")]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.name}"
+
+    @classmethod
+    def enqueue(cls, kind, object_id, name):
+        cls.enqueue_many(kind, [(object_id, name)])
+
+    @classmethod
+    def enqueue_many(cls, kind, images):
+        """Queue ``(object_id, name)`` pairs, replacing the objects' old jobs"""
+        cls.objects.bulk_create(
+            [cls(kind=kind, object_id=pk, name=name) for pk, name in images],
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["name", "attempts", "run_after", "last_error"],
+        )
@@ -0,0 +1,283 @@
+"""Keyset ("cursor") pagination over the catalog's sort orders.
+
+A page is the next ``per_page`` rows after the last row of the previous
+page in ``(sort field, id)`` order, so every page is one index range scan
+however deep it is, and rows added or removed elsewhere don't shift it.
+Cursors are opaque URL-safe tokens recording the sort and that position.
+
+Totals come from ``cached_count()`` rather than a COUNT per page.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from .cache import single_flight, versioned_key
+
+# Supported sorts, with the id tie-breaker that makes every position unique
+SORTS = {
+    "-release_date": ("-release_date", "-pk"),
+    "release_date": ("release_date", "pk"),
+    "-average_rating": ("-average_rating", "-pk"),
+    "average_rating": ("average_rating", "pk"),
+    "title": ("title", "pk"),
+    "-title": ("-title", "-pk"),
+    "year": ("year", "pk"),
+    "-year": ("-year", "-pk"),
+}
+
+# Reviews and activity feeds
+NEWEST_FIRST = {"-created_at": ("-created_at", "-pk")}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_value(value):
+    # Full precision: DjangoJSONEncoder cuts datetimes to milliseconds, which
+    # would skip or repeat rows created within the same millisecond
+    if isinstance(value, date):  # Also datetimes
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(sort, backwards, values):
+    raw = json.dumps([sort, backwards, [_json_value(value) for value in values]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """``(backwards, values)`` from a cursor made for ``sort``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, backwards, values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if cursor_sort != sort or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return bool(backwards), values
+
+
+class KeysetPage:
+    """One page of rows, with cursors for its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _after(queryset, ordering, values):
+    """Rows strictly after ``values`` in ``ordering``"""
+    fields = [name.lstrip("-") for name in ordering]
+    opts = queryset.model._meta
+    try:
+        values = [
+            (
+                opts.pk.to_python(value)
+                if name == "pk"
+                else opts.get_field(name).to_python(value)
+            )
+            for name, value in zip(fields, values, strict=True)
+        ]
+    except (ValidationError, ValueError):
+        raise InvalidCursor(values)
+    condition = Q()
+    for i, name in enumerate(ordering):
+        lookup = "lt" if name.startswith("-") else "gt"
+        equal = {field: value for field, value in zip(fields[:i], values)}
+        condition |= Q(**equal, **{f"{fields[i]}__{lookup}": values[i]})
+    # The same bound on the first field alone lets the database seek the index
+    # instead of filtering an ordered scan
+    bound = "lte" if ordering[0].startswith("-") else "gte"
+    return queryset.filter(Q(**{f"{fields[0]}__{bound}": values[0]}), condition)
+
+
+def _reverse(ordering):
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def _position(row, ordering):
+    names = [name.lstrip("-") for name in ordering]
+    if isinstance(row, dict):  # A .values() row, which has "id" for "pk"
+        return [row["id" if name == "pk" else name] for name in names]
+    return [getattr(row, name) for name in names]
+
+
+def sort_columns(sorts=SORTS):
+    """The columns ``.values()`` rows need for keyset pagination in ``sorts``"""
+    names = {name.lstrip("-") for ordering in sorts.values() for name in ordering}
+    return sorted("id" if name == "pk" else name for name in names)
+
+
+def paginate(queryset, sort, cursor, per_page, sorts=SORTS):
+    """The page of ``queryset`` in ``sort`` order at ``cursor`` (None: first).
+
+    Raises ``InvalidCursor`` for tokens that weren't made for ``sort``.
+    """
+    ordering = sorts[sort]
+    backwards, values = decode_cursor(cursor, sort) if cursor else (False, None)
+    rows = queryset.order_by(*(_reverse(ordering) if backwards else ordering))
+    if values is not None:
+        rows = _after(rows, _reverse(ordering) if backwards else ordering, values)
+    rows = list(rows[: per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    # Following a cursor means there are rows on the side it came from
+    has_next = bool(rows) and (values is not None if backwards else more)
+    has_previous = bool(rows) and (more if backwards else values is not None)
+    next_cursor = previous_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(sort, False, _position(rows[-1], ordering))
+    if has_previous:
+        previous_cursor = encode_cursor(sort, True, _position(rows[0], ordering))
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def paginate_list(items, cursor, per_page, sort="list"):
+    """A page of an already ordered, cached list, e.g. relevance-ranked ids"""
+    backwards, values = decode_cursor(cursor, sort) if cursor else (False, [0])
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise InvalidCursor(cursor)
+    start = max(values[0] - per_page, 0) if backwards else max(values[0], 0)
+    end = start + per_page
+    return KeysetPage(
+        items[start:end],
+        encode_cursor(sort, False, [end]) if end < len(items) else None,
+        encode_cursor(sort, True, [start]) if start > 0 else None,
+    )
+
+
+def cached_count(queryset, tags=("catalog",)):
+    """``queryset.count()``, shared through the cache until ``tags`` change.
+
+    Totals shown next to paginated lists only need to be roughly right, so
+    they may lag writes that don't bump ``tags`` by the cache TTL.
+    """
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:  # Filters that can't match, e.g. pk__in=[]
+        return 0
+    return single_flight(
+        versioned_key("count", tags, sql),
+        queryset.count,
+        getattr(settings, "MOVIES_COUNT_CACHE_TTL", 300),
+    )
+
+
+def page_query(query_dict, cursor, param="cursor"):
+    """``query_dict`` as a query string, with ``cursor`` swapped in"""
+    params = query_dict.copy()
+    params.pop(param, None)
+    if cursor:
+        params[param] = cursor
+    return urlencode(sorted(params.lists()), doseq=True)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination for the API, sorted by ``?sort=`` (see ``SORTS``)"""
+
+    cursor_query_param = "cursor"
+    sort_query_param = "sort"
+    sorts = SORTS
+    default_sort = "-release_date"
+
+    def get_page_size(self):
+        return settings.REST_FRAMEWORK.get("PAGE_SIZE", 10)
+
+    def get_count(self, queryset):
+        return cached_count(queryset.order_by())
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        sort = request.query_params.get(self.sort_query_param)
+        if sort not in self.sorts:
+            sort = self.default_sort
+        try:
+            self.page = paginate(
+                queryset,
+                sort,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(),
+                self.sorts,
+            )
+        except InvalidCursor:
+            raise NotFound("Invalid cursor.")
+        self.count = self.get_count(queryset)
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri(self.request.path)
+        return f"{url}?{page_query(self.request.query_params, cursor)}"
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "next": self._link(self.page.next_cursor),
+                "previous": self._link(self.page.previous_cursor),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "description": "Approximate total"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class ReviewPagination(KeysetPagination):
+    """A movie's reviews, newest first"""
+
+    sorts = NEWEST_FIRST
+    default_sort = "-created_at"
+
+    def get_page_size(self):
+        return getattr(settings, "MOVIES_REVIEWS_PAGE_SIZE", 10)
+
+    def get_count(self, queryset):
+        # One movie's reviews are a short range of the (movie, created_at)
+        # index, so counting them exactly is cheap
+        return queryset.count()
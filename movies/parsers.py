@@ -0,0 +1,22 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .ingest import read_records
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON: one object per line, parsed into a list"""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            lines = codecs.getreader(encoding)(stream)
+            return list(read_records(lines))
+        except ValueError as exc:
+            raise ParseError(f"NDJSON parse error - {exc}")
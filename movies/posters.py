@@ -0,0 +1,124 @@
+"""Resized copies of movie posters for responsive images.
+
+Uploaded posters keep whatever size the source had, often 1000px wide, which
+is several times what a card needs. ``generate()`` writes fixed-width WebP
+and JPEG copies next to the original (``movie_posters/name.400w.webp``) and
+returns the widths it wrote; ``Moviedata.poster_widths`` records them so
+templates can build a ``srcset`` without asking storage what exists.
+"""
+
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import ExifTags, Image, ImageOps
+
+from .storage import save_derived
+
+logger = logging.getLogger(__name__)
+
+# Extension: (Pillow format, MIME type), preferred first
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+FALLBACK = "jpg"  # Understood by every browser; the ``<img src>``
+
+
+def _config():
+    return {
+        "widths": (222, 400, 800),
+        "quality": 80,
+        **getattr(settings, "MOVIES_POSTERS", {}),
+    }
+
+
+def derivative_name(name, width, ext):
+    """The storage name of ``name``'s ``width`` pixel copy in ``ext`` format"""
+    root, _ = os.path.splitext(name)
+    return f"{root}.{width}w.{ext}"
+
+
+def target_widths(source_width):
+    """The configured widths for a source, without upscaling it.
+
+    A source narrower than some configured width gets one copy at its own
+    width instead, so every poster has at least one derivative.
+    """
+    widths = []
+    for width in sorted(_config()["widths"]):
+        if width >= source_width:
+            widths.append(source_width)
+            break
+        widths.append(width)
+    return widths
+
+
+def _oriented_size(image):
+    """``image``'s size once its EXIF orientation is applied, without decoding it"""
+    if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+        return image.height, image.width
+    return image.size
+
+
+def _resize(data, width):
+    image = Image.open(BytesIO(data))
+    source_width, source_height = _oriented_size(image)
+    height = max(round(source_height * width / source_width), 1)
+    rotated = (source_width, source_height) != image.size
+    # JPEGs can be decoded straight to 1/2, 1/4 or 1/8 scale, which is much
+    # faster than decoding at full size and resizing; other formats ignore it
+    image.draft("RGB", (height, width) if rotated else (width, height))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def _encode(image, image_format):
+    quality = _config()["quality"]
+    output = BytesIO()
+    if image_format == "JPEG":
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(output, image_format, quality=quality, method=4)
+    return output.getvalue()
+
+
+def generate(name, storage=default_storage, force=False):
+    """Write every derivative of the stored image ``name``.
+
+    Returns the widths written, or an empty list if the original is missing
+    or isn't an image, in which case pages keep showing the original.
+    Content-addressed originals never change, so copies that already exist
+    are kept unless ``force`` is set, e.g. after changing the settings.
+    """
+    try:
+        with storage.open(name, "rb") as source:
+            data = source.read()
+        with Image.open(BytesIO(data)) as image:
+            widths = target_widths(_oriented_size(image)[0])
+        for width in widths:
+            paths = {ext: derivative_name(name, width, ext) for ext in FORMATS}
+            if not force and all(storage.exists(path) for path in paths.values()):
+                continue
+            image = _resize(data, width)
+            for ext, (image_format, _) in FORMATS.items():
+                content = ContentFile(_encode(image, image_format))
+                save_derived(storage, paths[ext], content)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Can't make poster copies of %s: %s", name, exc)
+        return []
+    return widths
+
+
+def srcset(name, widths, ext, storage=default_storage):
+    """A ``srcset`` attribute value listing ``name``'s ``ext`` copies"""
+    return ", ".join(
+        f"{storage.url(derivative_name(name, width, ext))} {width}w" for width in widths
+    )
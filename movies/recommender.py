@@ -0,0 +1,159 @@
+"""Personalized recommendations from implicit-feedback matrix factorization.
+
+Reviews and watchlist entries form a sparse user x movie matrix of
+interaction strengths. Alternating least squares (Hu, Koren & Volinsky,
+"Collaborative Filtering for Implicit Feedback Datasets") factorizes it into
+user and movie vectors, and each user's best unseen movies are stored as
+``Recommendation`` rows for ``profile()`` to read with one indexed query.
+Users without stored rows get ``popular_movies()`` instead.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+# Interaction strength of a watchlist entry; reviews count their star rating
+WATCHLIST_STRENGTH = 3.0
+
+# Upper bound on the dense score block ranked at once (float32 cells)
+MAX_BLOCK_CELLS = 2**24
+
+
+def _config(name, default):
+    return getattr(settings, "MOVIES_RECOMMENDER", {}).get(name, default)
+
+
+def interaction_matrix():
+    """``(user ids, movie ids, CSR strengths)`` from reviews and watchlists"""
+    from .models import Review, Watchlist
+
+    rows = list(Review.objects.values_list("user_id", "movie_id", "rating"))
+    rows += [
+        (user_id, movie_id, WATCHLIST_STRENGTH)
+        for user_id, movie_id in Watchlist.objects.values_list("user_id", "movie_id")
+    ]
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    user_ids, users = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+    movie_ids, movies = np.unique(data[:, 1].astype(np.int64), return_inverse=True)
+    # A reviewed movie on the watchlist too sums both (csr adds duplicates)
+    matrix = sparse.csr_matrix(
+        (data[:, 2], (users, movies)), shape=(len(user_ids), len(movie_ids))
+    )
+    return user_ids, movie_ids, matrix
+
+
+def _least_squares(interactions, fixed, alpha, regularization):
+    """Solve every row's factors given the other side's ``fixed`` factors"""
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    solved = np.zeros((interactions.shape[0], factors))
+    for row in range(interactions.shape[0]):
+        start, end = interactions.indptr[row], interactions.indptr[row + 1]
+        if start == end:
+            continue
+        columns = interactions.indices[start:end]
+        confidence = alpha * interactions.data[start:end]  # c - 1
+        observed = fixed[columns]
+        # (YtY + Yu^T (Cu - I) Yu + lambda I) x = Yu^T Cu p(u), with p(u) = 1
+        lhs = gram + (observed.T * confidence) @ observed
+        rhs = observed.T @ (confidence + 1)
+        solved[row] = np.linalg.solve(lhs, rhs)
+    return solved
+
+
+def factorize(matrix, factors=None, iterations=None, seed=0):
+    """User and movie factor matrices for ``matrix`` of interaction strengths"""
+    factors = factors or _config("factors", 32)
+    iterations = iterations or _config("iterations", 10)
+    alpha = _config("alpha", 10.0)
+    regularization = _config("regularization", 0.1)
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], factors))
+    movie_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors))
+    transposed = matrix.T.tocsr()
+    for _ in range(iterations):
+        user_factors = _least_squares(matrix, movie_factors, alpha, regularization)
+        movie_factors = _least_squares(transposed, user_factors, alpha, regularization)
+    return user_factors, movie_factors
+
+
+def top_unseen(user_factors, movie_factors, matrix, rows, n):
+    """``(movie columns, scores)`` of the best ``n`` unseen movies for ``rows``"""
+    scores = user_factors[rows] @ movie_factors.T
+    seen = matrix[rows].nonzero()
+    scores[seen] = -np.inf
+    n = min(n, scores.shape[1])
+    best = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def build(factors=None, iterations=None):
+    """Retrain and replace every stored list; returns the number of users"""
+    from .models import Recommendation
+
+    n = getattr(settings, "MOVIES_RECOMMENDATIONS", 12)
+    user_ids, movie_ids, matrix = interaction_matrix()
+    if not matrix.nnz:
+        Recommendation.objects.all().delete()
+        return 0
+    user_factors, movie_factors = factorize(matrix, factors, iterations)
+
+    with transaction.atomic():
+        Recommendation.objects.all().delete()
+        chunk = max(1, MAX_BLOCK_CELLS // len(movie_ids))
+        for start in range(0, len(user_ids), chunk):
+            rows = np.arange(start, min(start + chunk, len(user_ids)))
+            best, scores = top_unseen(user_factors, movie_factors, matrix, rows, n)
+            Recommendation.objects.bulk_create(
+                [
+                    Recommendation(
+                        user_id=int(user_ids[row]),
+                        movie_id=int(movie_ids[column]),
+                        rank=rank,
+                        score=float(score),
+                    )
+                    for row, columns, row_scores in zip(rows, best, scores)
+                    for rank, (column, score) in enumerate(
+                        (c, s) for c, s in zip(columns, row_scores) if np.isfinite(s)
+                    )
+                ],
+                batch_size=2000,
+            )
+    return len(user_ids)
+
+
+def popular_movies(exclude_ids=(), limit=6):
+    """Best-rated movies for users with no stored recommendations"""
+    from .models import Moviedata
+
+    min_reviews = _config("cold_start_min_reviews", 1)
+    movies = Moviedata.objects.filter(rating_count__gte=min_reviews).order_by(
+        "-average_rating", "-rating_count"
+    )
+    exclude_ids = set(exclude_ids)
+    # Cold-start users have seen few movies, so a small overfetch suffices
+    return [
+        movie
+        for movie in movies[: limit + len(exclude_ids)]
+        if movie.pk not in exclude_ids
+    ][:limit]
+
+
+def recommended_movies(user, limit=6):
+    """``user``'s stored recommendations, or popular movies for new users"""
+    from .models import Recommendation, Review, Watchlist
+
+    entries = Recommendation.objects.filter(user=user).select_related("movie")
+    movies = [entry.movie for entry in entries[:limit]]
+    if movies:
+        return movies
+    seen = set(Review.objects.filter(user=user).values_list("movie_id", flat=True))
+    seen.update(Watchlist.objects.filter(user=user).values_list("movie_id", flat=True))
+    return popular_movies(seen, limit)
@@ -0,0 +1,423 @@
+"""Ranked free-text movie search with pluggable drivers.
+
+Every driver indexes a movie's title, description, actors, director, genre
+names and year, and is kept in sync by the signal handlers in
+``movies.signals``. ``MOVIES_SEARCH_BACKEND`` selects the driver:
+
+* ``"sqlite"``: an FTS5 virtual table ranked with ``bm25()``
+* ``"postgresql"``: a GIN-indexed ``tsvector`` table ranked with ``ts_rank_cd``
+* ``"memory"``: an inverted index in each worker process, ranked with BM25. It
+  is built lazily on the first search and rebuilt after
+  ``MOVIES_SEARCH_INDEX_TTL`` seconds so that workers which did not see a
+  write catch up.
+* ``"auto"`` (default): the native engine of the configured database
+
+The tables used by the database drivers are created by migration 0008; run
+``manage.py rebuild_search_index`` after switching drivers.
+"""
+
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, When
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Term frequencies are multiplied by these weights so that a title hit ranks
+# above a hit buried in the synopsis.
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "actors": 1.5,
+    "director": 1.5,
+    "genres": 1.5,
+    "year": 1.0,
+    "description": 1.0,
+}
+
+
+def tokenize(text):
+    """Lowercase ``text`` and split it into word tokens"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def movie_document(movie):
+    """Field -> text mapping indexed for a movie (uses prefetched genres)"""
+    return {
+        "title": movie.title,
+        "description": movie.description,
+        "actors": movie.actors,
+        "director": movie.director,
+        "genres": " ".join(genre.name for genre in movie.genres.all()),
+        "year": movie.year,
+    }
+
+
+class InvertedIndex:
+    """BM25-ranked inverted index keyed by movie id"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {movie_id: weighted tf}
+        self._doc_terms = {}  # movie_id -> Counter, needed to unindex a movie
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._vocabulary = None  # Sorted terms for prefix lookups, built lazily
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, movie_id, fields):
+        """Index (or re-index) a movie from a field -> text mapping"""
+        terms = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text):
+                terms[token] += weight
+
+        with self._lock:
+            self.remove(movie_id)
+            for term, frequency in terms.items():
+                self._postings[term][movie_id] = frequency
+            length = sum(terms.values())
+            self._doc_terms[movie_id] = terms
+            self._doc_lengths[movie_id] = length
+            self._total_length += length
+            self._vocabulary = None
+
+    def remove(self, movie_id):
+        with self._lock:
+            terms = self._doc_terms.pop(movie_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(movie_id, None)
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(movie_id)
+            self._vocabulary = None
+
+    def _expand(self, token):
+        """All indexed terms starting with ``token``"""
+        vocabulary = self._vocabulary
+        if vocabulary is None:
+            vocabulary = self._vocabulary = sorted(self._postings)
+        terms = []
+        for term in vocabulary[bisect_left(vocabulary, token) :]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query, limit=None):
+        """Movie ids matching every query token, best BM25 score first.
+
+        The last token is treated as a prefix so results keep up with a user
+        who is still typing.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count or 1.0
+
+            scores = None
+            for position, token in enumerate(tokens):
+                if position == len(tokens) - 1:
+                    terms = self._expand(token)
+                else:
+                    terms = [token] if token in self._postings else []
+
+                token_scores = defaultdict(float)
+                for term in terms:
+                    postings = self._postings[term]
+                    df = len(postings)
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    for movie_id, tf in postings.items():
+                        length = self._doc_lengths[movie_id]
+                        norm = 1 - self.b + self.b * length / avg_length
+                        token_scores[movie_id] += (
+                            idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                        )
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # Every token has to match (AND semantics)
+                    scores = {
+                        movie_id: score + token_scores[movie_id]
+                        for movie_id, score in scores.items()
+                        if movie_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores, key=lambda movie_id: (-scores[movie_id], movie_id))
+        return ranked[:limit] if limit else ranked
+
+
+class SearchBackend:
+    """Interface shared by the search drivers.
+
+    ``search`` returns movie ids, most relevant first. The remaining methods
+    keep the driver's index in step with the ``Moviedata`` table.
+    """
+
+    def search(self, query, limit):
+        raise NotImplementedError
+
+    def index_movie(self, movie):
+        pass
+
+    def remove_movie(self, movie_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class MemoryBackend(SearchBackend):
+    """Per-process ``InvertedIndex``; works on any database"""
+
+    def __init__(self):
+        self._index = None
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()
+
+    def _is_stale(self):
+        ttl = getattr(settings, "MOVIES_SEARCH_INDEX_TTL", 300)
+        return self._index is None or (ttl and time.monotonic() - self._built_at > ttl)
+
+    def get_index(self):
+        """The index, (re)built when missing or older than the TTL"""
+        if self._is_stale():
+            with self._build_lock:
+                if self._is_stale():
+                    self.rebuild()
+        return self._index
+
+    def search(self, query, limit):
+        return self.get_index().search(query, limit)
+
+    def index_movie(self, movie):
+        # Writes never trigger a build; an index that doesn't exist yet will
+        # see the change when it is built.
+        if self._index is not None:
+            self._index.add(movie.pk, movie_document(movie))
+
+    def remove_movie(self, movie_id):
+        if self._index is not None:
+            self._index.remove(movie_id)
+
+    def rebuild(self):
+        index = InvertedIndex()
+        for movie in _indexable_movies().iterator(chunk_size=2000):
+            index.add(movie.pk, movie_document(movie))
+        self._index = index
+        self._built_at = time.monotonic()
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 virtual table whose rowid is the movie id"""
+
+    table = "movies_moviedata_fts"
+    columns = ("title", "description", "actors", "director", "genres", "year")
+
+    @staticmethod
+    def match_expression(query):
+        """The MATCH string for ``query``, or None if it has no words.
+
+        Tokens are quoted, so words such as OR and NEAR are searched for, not
+        read as operators. Quoted tokens are implicitly ANDed and the last
+        one is a prefix query.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"' for token in tokens) + "*"
+
+    def search(self, query, limit):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        weights = ", ".join(str(FIELD_WEIGHTS[column]) for column in self.columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}), rowid LIMIT %s",
+                [match, limit or -1],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_movie(self, movie):
+        document = movie_document(movie)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [movie.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(self.columns))})",
+                [movie.pk] + [str(document[column] or "") for column in self.columns],
+            )
+
+    def remove_movie(self, movie_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [movie_id])
+
+    def rebuild(self):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table}")
+            for movie in _indexable_movies().iterator(chunk_size=2000):
+                self.index_movie(movie)
+
+
+class PostgresBackend(SearchBackend):
+    """GIN-indexed ``tsvector`` side table, one row per movie"""
+
+    table = "movies_moviedata_search"
+    # tsvector weights: A ranks highest
+    column_weights = (
+        ("title", "A"),
+        ("actors", "B"),
+        ("director", "B"),
+        ("genres", "B"),
+        ("year", "C"),
+        ("description", "D"),
+    )
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = " & ".join(tokens[:-1] + [tokens[-1] + ":*"])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT movie_id FROM {self.table}, to_tsquery('simple', %s) query "
+                "WHERE document @@ query "
+                "ORDER BY ts_rank_cd(document, query) DESC, movie_id LIMIT %s",
+                [tsquery, limit or None],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_movie(self, movie):
+        document = movie_document(movie)
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', %s), '{weight}')"
+            for _, weight in self.column_weights
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (movie_id, document) "
+                f"VALUES (%s, {vector}) "
+                "ON CONFLICT (movie_id) DO UPDATE SET document = EXCLUDED.document",
+                [movie.pk]
+                + [str(document[column] or "") for column, _ in self.column_weights],
+            )
+
+    def remove_movie(self, movie_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE movie_id = %s", [movie_id])
+
+    def rebuild(self):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table}")
+            for movie in _indexable_movies().iterator(chunk_size=2000):
+                self.index_movie(movie)
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteFTS5Backend,
+    "postgresql": PostgresBackend,
+}
+
+_backend = None
+
+
+def _indexable_movies():
+    from .models import Moviedata
+
+    return Moviedata.objects.only(
+        "id", "title", "description", "actors", "director", "year"
+    ).prefetch_related("genres")
+
+
+def get_backend():
+    """The driver named by ``MOVIES_SEARCH_BACKEND``.
+
+    ``"auto"`` picks the database's native full-text engine and falls back to
+    the in-memory index on other databases.
+    """
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "MOVIES_SEARCH_BACKEND", "auto")
+        if name == "auto":
+            name = connection.vendor if connection.vendor in BACKENDS else "memory"
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def index_movie(movie):
+    get_backend().index_movie(movie)
+
+
+def remove_movie(movie_id):
+    get_backend().remove_movie(movie_id)
+
+
+def rebuild():
+    get_backend().rebuild()
+
+
+def search_movie_ids(query, limit=None):
+    """Movie ids matching ``query``, most relevant first.
+
+    When nothing matches, titles similar to a misspelled query are returned
+    instead.
+    """
+    from . import fuzzy
+
+    if limit is None:
+        limit = getattr(settings, "MOVIES_SEARCH_MAX_RESULTS", 1000)
+    ranked_ids = get_backend().search(query, limit)
+    if not ranked_ids:
+        ranked_ids = fuzzy.match_movie_ids("title", query)[:limit]
+    return ranked_ids
+
+
+def order_by_rank(queryset, ranked_ids):
+    """Order ``queryset`` by position in ``ranked_ids``"""
+    if not ranked_ids:
+        return queryset
+    return queryset.order_by(
+        Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def filter_queryset(queryset, query):
+    """Restrict ``queryset`` to movies matching ``query``, best match first.
+
+    This is the single entry point the views use for free-text search; a later
+    ``order_by()`` replaces the relevance ordering.
+    """
+    ranked_ids = search_movie_ids(query)
+    return order_by_rank(queryset.filter(pk__in=ranked_ids), ranked_ids)
@@ -1,9 +1,33 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import Moviedata, Review
 
 
-class MovieSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Only the fields named in the request's ``?fields=``, comma separated.
+
+    Unknown names are ignored; without the parameter every field is kept.
+    """
+
+    fields_query_param = "fields"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        requested = request and request.query_params.get(self.fields_query_param)
+        if requested:
+            wanted = {name.strip() for name in requested.split(",")}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class MovieSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    genres = serializers.SlugRelatedField(many=True, read_only=True, slug_field="name")
     poster_url = serializers.ImageField(max_length=None, use_url=True)
+    rating_distribution = serializers.DictField(
+        child=serializers.IntegerField(), read_only=True
+    )  # Reviews per star rating, from the counters on the movie
 
     class Meta:
         model = Moviedata
@@ -13,8 +37,9 @@ class MovieSerializer(serializers.ModelSerializer):
             "duration",
             "description",
             "release_date",
-            "genre",
+            "genres",
             "average_rating",
+            "rating_distribution",
             "poster_url",
             "actors",
             "director",
@@ -22,9 +47,110 @@ class MovieSerializer(serializers.ModelSerializer):
         ]
 
 
+class MovieListSerializer(MovieSerializer):
+    """The lean representation for lists: no description, cast or histogram.
+
+    ``serialize_rows()`` produces the same output from ``.values()`` rows,
+    which skips building a model instance per movie.
+    """
+
+    class Meta(MovieSerializer.Meta):
+        fields = [
+            "id",
+            "title",
+            "release_date",
+            "year",
+            "genres",
+            "average_rating",
+            "rating_count",
+            "poster_url",
+            "director",
+        ]
+        read_only_fields = fields
+
+    def value_columns(self):
+        """The ``.values()`` columns the selected fields are read from"""
+        return [field.source for name, field in self.fields.items() if name != "genres"]
+
+    def serialize_rows(self, rows):
+        """The representation of each ``.values(*value_columns())`` row"""
+        rows = list(rows)
+        genres = defaultdict(list)
+        if "genres" in self.fields:
+            # One query for the whole page, in the order prefetching gives
+            links = Moviedata.genres.through.objects.filter(
+                moviedata_id__in=[row["id"] for row in rows]
+            ).order_by("genre__name")
+            for movie_id, name in links.values_list("moviedata_id", "genre__name"):
+                genres[movie_id].append(name)
+        opts = Moviedata._meta
+        data = []
+        for row in rows:
+            item = {}
+            for name, field in self.fields.items():
+                if name == "genres":
+                    item[name] = genres[row["id"]]
+                    continue
+                value = row[field.source]
+                if value is None:
+                    item[name] = None
+                    continue
+                model_field = opts.get_field(field.source)
+                if hasattr(model_field, "attr_class"):
+                    # Files render from their name through storage
+                    value = model_field.attr_class(None, model_field, value)
+                item[name] = field.to_representation(value)
+            data.append(item)
+        return data
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = Review
         fields = ["id", "user", "rating", "comment", "created_at"]
+
+
+class ReviewImportSerializer(ReviewSerializer):
+    """A review row from a bulk import; ``user`` is a username"""
+
+    movie = serializers.IntegerField()
+    user = serializers.CharField(max_length=150)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ["movie", "user", "rating", "comment"]
+        # Uniqueness is resolved by the importer, not per row
+        validators = []
+
+
+class NameListField(serializers.ListField):
+    """A list of names, also accepted as a ``|`` or comma separated string"""
+
+    child = serializers.CharField(max_length=100)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [name.strip() for name in data.replace("|", ",").split(",")]
+            data = [name for name in data if name]
+        return super().to_internal_value(data)
+
+
+class MovieImportSerializer(serializers.ModelSerializer):
+    """A movie row from a catalog import; ``poster_url`` is a stored path"""
+
+    genres = NameListField(required=False, default=list)
+    poster_url = serializers.CharField(max_length=100, required=False)
+
+    class Meta:
+        model = Moviedata
+        fields = [
+            "title",
+            "duration",
+            "description",
+            "release_date",
+            "genres",
+            "poster_url",
+            "actors",
+            "director",
+        ]
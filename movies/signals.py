@@ -0,0 +1,154 @@
+# movies/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, cache, fuzzy, leaderboards, search
+from .ingest import movies_imported, reviews_imported
+from .models import Genre, Moviedata, Review
+
+
+def index_movie(movie):
+    """Refresh a movie in every in-process and database search index"""
+    search.index_movie(movie)
+    fuzzy.index_movie(movie)
+    autocomplete.index_movie(movie)
+
+
+def index_movies(movies):
+    # One transaction, so database-backed indexes commit once per batch
+    with transaction.atomic():
+        for movie in movies.prefetch_related("genres"):
+            index_movie(movie)
+
+
+@receiver(post_save, sender=Moviedata)
+def index_saved_movie(sender, instance, **kwargs):
+    index_movie(instance)
+
+
+@receiver(movies_imported)
+def index_imported_movies(sender, movie_ids, **kwargs):
+    index_movies(Moviedata.objects.filter(pk__in=movie_ids))
+
+
+@receiver(post_delete, sender=Moviedata)
+def unindex_deleted_movie(sender, instance, **kwargs):
+    search.remove_movie(instance.pk)
+    fuzzy.remove_movie(instance.pk)
+    autocomplete.remove_movie(instance.pk)
+
+
+@receiver(m2m_changed, sender=Moviedata.genres.through)
+def reindex_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # genre.movies.clear() doesn't report which movies it touched
+        instance._cleared_movie_ids = list(instance.movies.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        index_movie(instance)
+    else:
+        movie_ids = pk_set or getattr(instance, "_cleared_movie_ids", [])
+        index_movies(Moviedata.objects.filter(pk__in=movie_ids))
+
+
+# Reviews change ratings with .update(), so they send no post_save for movies
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def rerank_reviewed_movie(sender, instance, **kwargs):
+    movie_ids = [instance.movie_id]
+    transaction.on_commit(lambda: autocomplete.rerank_movies(movie_ids))
+
+
+@receiver(reviews_imported)
+def rerank_imported_reviews(sender, movie_ids, **kwargs):
+    autocomplete.rerank_movies(movie_ids)
+
+
+@receiver(post_save, sender=Genre)
+def reindex_genre_movies(sender, instance, created, **kwargs):
+    if not created:
+        index_movies(instance.movies.all())
+
+
+# Genre facets: counts change when links change or linked movies go away
+@receiver(m2m_changed, sender=Moviedata.genres.through)
+def invalidate_facets_on_link(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(cache.invalidate_genre_facets)
+        transaction.on_commit(leaderboards.invalidate)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_facets(sender, **kwargs):
+    transaction.on_commit(cache.invalidate_genre_facets)
+
+
+# Release years change when movies are added or deleted, or change year
+@receiver(post_save, sender=Moviedata)
+def invalidate_release_years(sender, instance, created, **kwargs):
+    if created or instance.year != getattr(instance, "_loaded_year", None):
+        transaction.on_commit(cache.invalidate_release_years)
+    instance._loaded_year = instance.year
+
+
+@receiver(post_delete, sender=Moviedata)
+def invalidate_snapshots_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(cache.invalidate_release_years)
+    # Deleting a movie lowers its genres' movie_count without m2m_changed
+    if getattr(instance, "_deleted_genre_ids", None):
+        transaction.on_commit(cache.invalidate_genre_facets)
+
+
+# Leaderboard cards show the movies' titles and posters
+@receiver(post_save, sender=Moviedata)
+@receiver(post_delete, sender=Moviedata)
+def invalidate_leaderboards(sender, **kwargs):
+    transaction.on_commit(leaderboards.invalidate)
+
+
+@receiver(movies_imported)
+def invalidate_snapshots_on_import(sender, **kwargs):
+    cache.invalidate_genre_facets()
+    cache.invalidate_release_years()
+
+
+# Cached pages and fragments
+@receiver(post_save, sender=Moviedata)
+@receiver(post_delete, sender=Moviedata)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(m2m_changed, sender=Moviedata.genres.through)
+@receiver(movies_imported)
+def bump_catalog(sender, action=None, **kwargs):
+    if action is None or action.startswith("post_"):
+        transaction.on_commit(lambda: cache.bump("catalog"))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_reviewed_movie(sender, instance, **kwargs):
+    # Only this movie's pages and cards, and the genre pages listing it
+    genres = Genre.objects.filter(movies=instance.movie_id).values_list(
+        "name", flat=True
+    )
+    tags = ["ratings", f"movie:{instance.movie_id}", *map(cache.genre_tag, genres)]
+    transaction.on_commit(lambda: cache.bump(*tags))
+
+
+@receiver(reviews_imported)
+def bump_imported_reviews(sender, movie_ids, **kwargs):
+    genres = (
+        Genre.objects.filter(movies__in=movie_ids)
+        .values_list("name", flat=True)
+        .distinct()
+    )
+    tags = [
+        "ratings",
+        *(f"movie:{movie_id}" for movie_id in movie_ids),
+        *map(cache.genre_tag, genres),
+    ]
+    transaction.on_commit(lambda: cache.bump(*tags))
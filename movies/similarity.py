@@ -0,0 +1,169 @@
+"""Item-item similarity behind the "similar movies" list on the detail page.
+
+Every movie is described by four sparse feature blocks: its user-centred
+review ratings, its genres, its credited actors and its director. Each block
+is L2-normalized and scaled by the square root of its weight in
+``MOVIES_SIMILARITY_WEIGHTS``, so the dot product of two stacked rows is the
+weighted sum of the per-block cosine similarities. The best
+``MOVIES_SIMILAR_MOVIES`` neighbours of each movie are stored as
+``SimilarMovie`` rows.
+
+Review writes flag their movie with ``similarity_stale`` (new movies start
+flagged), and an incremental build only recomputes those movies' lists.
+Lists of other movies that point at them are refreshed by the next full build.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .cache import bump
+
+DEFAULT_WEIGHTS = {"ratings": 0.5, "genres": 0.2, "actors": 0.2, "director": 0.1}
+
+# Upper bound on the dense similarity block scored at once (float32 cells)
+MAX_BLOCK_CELLS = 2**24
+
+
+def _incidence(rows, cols, values, shape):
+    return sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape
+    )
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def _codes(values):
+    """Dense integer codes for arbitrary hashable values"""
+    _, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    return codes
+
+
+def feature_matrix(movie_ids):
+    """Stacked, weighted feature rows for ``movie_ids`` (a sorted array)"""
+    from .models import MovieCredit, Moviedata, Review
+
+    weights = {**DEFAULT_WEIGHTS, **getattr(settings, "MOVIES_SIMILARITY_WEIGHTS", {})}
+    n = len(movie_ids)
+    blocks = []
+
+    def add_block(name, movie_col, feature_codes, values):
+        if not len(movie_col) or not weights.get(name):
+            return
+        rows = np.searchsorted(movie_ids, movie_col)
+        matrix = _incidence(
+            rows, feature_codes, values, (n, int(feature_codes.max()) + 1)
+        )
+        blocks.append(np.sqrt(weights[name]) * _normalize_rows(matrix))
+
+    reviews = np.array(
+        list(Review.objects.values_list("movie_id", "user_id", "rating")),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    if len(reviews):
+        users = _codes(reviews[:, 1])
+        # Centre on each user's mean so generous and harsh raters compare
+        totals = np.bincount(users, weights=reviews[:, 2])
+        means = totals / np.bincount(users)
+        add_block("ratings", reviews[:, 0], users, reviews[:, 2] - means[users])
+
+    links = np.array(
+        list(Moviedata.genres.through.objects.values_list("moviedata_id", "genre_id")),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    add_block("genres", links[:, 0], _codes(links[:, 1]), np.ones(len(links)))
+
+    credits = np.array(
+        list(MovieCredit.objects.values_list("movie_id", "person_id")),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    add_block("actors", credits[:, 0], _codes(credits[:, 1]), np.ones(len(credits)))
+
+    directed = list(
+        Moviedata.objects.exclude(director="").values_list("pk", "director")
+    )
+    if directed:
+        pks, names = zip(*directed)
+        add_block(
+            "director",
+            np.array(pks),
+            _codes([name.strip().casefold() for name in names]),
+            np.ones(len(pks)),
+        )
+
+    if not blocks:
+        return sparse.csr_matrix((n, 0), dtype=np.float32)
+    return sparse.hstack(blocks, format="csr", dtype=np.float32)
+
+
+def top_neighbors(features, rows, k):
+    """``(neighbour rows, scores)`` of the best ``k`` matches for ``rows``"""
+    scores = (features[rows] @ features.T).toarray()
+    scores[np.arange(len(rows)), rows] = -np.inf  # A movie isn't its own match
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        empty = np.empty((len(rows), 0))
+        return empty.astype(np.int64), empty
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def build(full=False, k=None):
+    """Recompute stored neighbours; returns the number of movies refreshed.
+
+    Without ``full`` only movies flagged ``similarity_stale`` are refreshed.
+    Flags are cleared before reading, so reviews written during a build flag
+    their movie again for the next one.
+    """
+    from .models import Moviedata, SimilarMovie
+
+    k = k or getattr(settings, "MOVIES_SIMILAR_MOVIES", 8)
+    movies = Moviedata.objects.all()
+    if not full:
+        movies = movies.filter(similarity_stale=True)
+    targets = np.array(sorted(movies.values_list("pk", flat=True)), dtype=np.int64)
+    if not len(targets):
+        return 0
+    Moviedata.objects.filter(pk__in=targets.tolist()).update(similarity_stale=False)
+
+    movie_ids = np.array(
+        sorted(Moviedata.objects.values_list("pk", flat=True)), dtype=np.int64
+    )
+    features = feature_matrix(movie_ids)
+    target_rows = np.searchsorted(movie_ids, targets)
+
+    chunk = max(1, MAX_BLOCK_CELLS // len(movie_ids))
+    for start in range(0, len(target_rows), chunk):
+        rows = target_rows[start : start + chunk]
+        neighbors, scores = top_neighbors(features, rows, k)
+        entries = [
+            SimilarMovie(
+                movie_id=int(movie_ids[row]),
+                similar_id=int(movie_ids[neighbor]),
+                rank=rank,
+                score=float(score),
+            )
+            for row, row_neighbors, row_scores in zip(rows, neighbors, scores)
+            for rank, (neighbor, score) in enumerate(
+                (n, s) for n, s in zip(row_neighbors, row_scores) if s > 0
+            )
+        ]
+        with transaction.atomic():
+            SimilarMovie.objects.filter(movie_id__in=movie_ids[rows].tolist()).delete()
+            SimilarMovie.objects.bulk_create(entries, batch_size=2000)
+    Moviedata.touch(targets.tolist())  # Their pages show the new lists
+    if full:
+        bump("catalog")
+    else:
+        bump(*(f"movie:{movie_id}" for movie_id in targets))
+    return len(targets)
@@ -0,0 +1,78 @@
+"""Media storage that names files after their contents.
+
+An upload is stored as ``<upload_to>/ab/cd/<sha256>.<ext>``, so saving the
+same image again, from another movie or profile or a re-save of the same
+one, reuses the stored file instead of adding a suffixed copy. Files derived
+from an original (see movies/posters.py) are named after it, so they are
+shared the same way. Nothing is deleted on save; ``gc_media`` removes files
+no model refers to any more.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}$")
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def save_derived(storage, name, content):
+    """Store a file made from another at exactly ``name``, replacing any old one.
+
+    Derived files are named after their original, not their own contents.
+    """
+    if isinstance(storage, ContentAddressedStorage):
+        return storage.save_exact(name, content)
+    if storage.exists(name):
+        storage.delete(name)  # Rather than getting a suffixed name
+    return storage.save(name, content)
+
+
+def is_hashed(name):
+    """Whether ``name`` is (or is derived from) a content-addressed file"""
+    directory, filename = posixpath.split(name)
+    stem = filename.split(".", 1)[0]  # Derived files add e.g. ".400w.webp"
+    return bool(HASHED_NAME.search(posixpath.join(directory, stem)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        # Two writers of one name write the same bytes, so overwriting is safe
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        """Where ``content``, uploaded as ``name``, is stored"""
+        digest = content_hash(content)
+        _, ext = os.path.splitext(name)
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest[2:4], digest + ext.lower()
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # gc_media spares files modified within --min-age, so the reused
+            # file counts as new; it may be about to be referenced again
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_exact(self, name, content):
+        """Store ``content`` at ``name`` as given, replacing any file there"""
+        return super().save(name, content)
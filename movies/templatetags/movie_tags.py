@@ -0,0 +1,65 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from movies import posters
+from movies.cache import render_movie_fragment
+from movies.pagination import page_query
+
+register = template.Library()
+
+CARD_TEMPLATES = {
+    "card": "movies/movie_card.html",
+    "result": "movies/movie_result_card.html",
+}
+
+
+@register.simple_tag
+def movie_card(movie, style="card"):
+    """A movie's poster card, served from the fragment cache"""
+    return mark_safe(render_movie_fragment(CARD_TEMPLATES[style], movie))
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, cursor, param="cursor"):
+    """The current URL at a pagination ``cursor``, keeping its other parameters"""
+    return "?" + page_query(context["request"].GET, cursor, param)
+
+
+@register.simple_tag
+def poster(movie, sizes="100vw", **attrs):
+    """A movie's poster, offering its resized copies to the browser.
+
+    ``sizes`` is how wide the poster is drawn, as in ``<img sizes>``; other
+    keyword arguments become ``<img>`` attributes, such as ``class``.
+    """
+    attrs.setdefault("alt", movie.title)
+    image = movie.poster_url
+    if not image:
+        # The same placeholder new movies get, from media storage
+        attrs["src"] = image.storage.url(image.field.default)
+    elif not movie.poster_widths:
+        attrs["src"] = image.url
+    else:
+        widths = movie.poster_widths
+        name = image.name
+        attrs["src"] = image.storage.url(
+            posters.derivative_name(name, widths[-1], posters.FALLBACK)
+        )
+        attrs["srcset"] = posters.srcset(name, widths, posters.FALLBACK, image.storage)
+        attrs["sizes"] = sizes
+        sources = format_html_join(
+            "",
+            '<source type="{}" srcset="{}" sizes="{}">',
+            (
+                (mime_type, posters.srcset(name, widths, ext, image.storage), sizes)
+                for ext, (_, mime_type) in posters.FORMATS.items()
+                if ext != posters.FALLBACK
+            ),
+        )
+        return format_html("<picture>{}{}</picture>", sources, _img(attrs))
+    return _img(attrs)
+
+
+def _img(attrs):
+    return format_html("<img{}>", format_html_join("", ' {}="{}"', attrs.items()))
@@ -1,3 +1,1454 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import (
+    autocomplete,
+    fuzzy,
+    jobs,
+    leaderboards,
+    posters,
+    recommender,
+    search,
+    similarity,
+)
+from .ingest import ingest_reviews
+from .cache import (
+    GENRE_FACETS_KEY,
+    LOCK_KEY,
+    RELEASE_YEARS_KEY,
+    expire,
+    genre_facets,
+    release_years,
+    render_movie_fragment,
+    single_flight,
+)
+from .models import (
+    Activity,
+    Genre,
+    ImageJob,
+    LeaderboardEntry,
+    MovieCredit,
+    Moviedata,
+    Person,
+    Profile,
+    Recommendation,
+    Review,
+    SimilarMovie,
+    UserGenreCount,
+    UserStats,
+    Watchlist,
+)
+from .pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+    paginate_list,
+)
+from .serializers import MovieListSerializer
+from .storage import ContentAddressedStorage
+
+PASSWORD = "correct-horse-battery"
+
+
+def make_movie(title="Movie", **fields):
+    fields.setdefault("release_date", date(2020, 1, 1))
+    fields.setdefault("description", "")
+    return Moviedata.objects.create(title=title, **fields)
+
+
+def is_fresh(key):
+    entry = cache.get(key)
+    return entry is not None and entry[1] > time.time()
+
+
+def profile_queries(queries):
+    return [query["sql"] for query in queries if "movies_profile" in query["sql"]]
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ProfileWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", "reader@example.com", PASSWORD)
+
+    def setUp(self):
+        Site.objects.clear_cache()  # Counted as a query on each login
+
+    def test_profile_created_once_with_user(self):
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+
+    def test_user_save_leaves_profile_alone(self):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(profile_queries(queries), [])
+
+    def test_unchanged_profile_save_writes_nothing(self):
+        profile = Profile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_profile_save_writes_changed_fields_only(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = "Mostly westerns"
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        updates = [sql for sql in profile_queries(queries) if sql.startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"avatar"', updates[0])
+        self.assertFalse(ImageJob.objects.exists())
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_login_query_count(self):
+        # The site, the user, allauth's email check, the session's key check,
+        # insert and update (each write in a savepoint) and the last_login
+        # update, about 11 depending on the Django and allauth versions.
+        # Nothing reads or writes the profile
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("account_login"), {"login": "reader", "password": PASSWORD}
+            )
+        self.assertRedirects(response, "/profile/", fetch_redirect_response=False)
+        self.assertEqual(profile_queries(queries), [])
+        self.assertLessEqual(len(queries), 14)
+
+
+class CreditSyncTests(TestCase):
+    def credits(self, movie):
+        return list(
+            MovieCredit.objects.filter(movie=movie).values_list(
+                "person__name", "billing_order", "role"
+            )
+        )
+
+    def test_cast_edits_keep_roles(self):
+        movie = make_movie(actors="Ann Lee, Bob Ray")
+        MovieCredit.objects.filter(person__name="Bob Ray").update(role="Villain")
+        movie.actors = "Cat Fox, Bob Ray"
+        movie.save()
+        self.assertEqual(
+            self.credits(movie), [("Cat Fox", 0, ""), ("Bob Ray", 1, "Villain")]
+        )
+        self.assertEqual(movie.get_actors_list(), ["Cat Fox", "Bob Ray"])
+
+
+class RatingTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = make_movie()
+        cls.users = [User.objects.create_user(f"critic{i}") for i in range(3)]
+
+    def totals(self):
+        movie = Moviedata.objects.get(pk=self.movie.pk)
+        return movie.rating_sum, movie.rating_count, movie.average_rating
+
+    def assertReconciled(self):
+        self.assertEqual(Moviedata.recompute_ratings([self.movie.pk]), [])
+
+    def review(self, user, rating):
+        return Review.objects.create(
+            movie=self.movie, user=user, rating=rating, comment="Fine"
+        )
+
+    def test_create(self):
+        self.review(self.users[0], 4)
+        self.review(self.users[1], 1)
+        self.assertEqual(self.totals(), (5, 2, Decimal("2.50")))
+        self.assertReconciled()
+
+    def test_rating_edit(self):
+        review = self.review(self.users[0], 4)
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.totals(), (2, 1, Decimal("2.00")))
+        self.assertReconciled()
+
+    def test_comment_edit(self):
+        review = self.review(self.users[0], 4)
+        review = Review.objects.get(pk=review.pk)
+        review.comment = "Better the second time"
+        review.save()
+        self.assertEqual(self.totals(), (4, 1, Decimal("4.00")))
+        self.assertReconciled()
+
+    def test_delete(self):
+        self.review(self.users[0], 4)
+        review = self.review(self.users[1], 5)
+        review.delete()
+        self.assertEqual(self.totals(), (4, 1, Decimal("4.00")))
+        Review.objects.all().delete()
+        self.assertEqual(self.totals(), (0, 0, Decimal("0.00")))
+        self.assertReconciled()
+
+    def test_movie_delete_skips_adjustments(self):
+        for user in self.users:
+            self.review(user, 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.movie.delete()
+        updates = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('UPDATE "movies_moviedata"')
+        ]
+        self.assertEqual(updates, [])
+
+
+class SnapshotInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = make_movie()
+        genre_facets()
+        release_years()
+
+    def test_edits_keep_snapshots(self):
+        self.movie.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        self.assertTrue(is_fresh(GENRE_FACETS_KEY))
+        self.assertTrue(is_fresh(RELEASE_YEARS_KEY))
+
+    def test_new_year_refreshes_release_years(self):
+        self.movie.release_date = date(1999, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        self.assertFalse(is_fresh(RELEASE_YEARS_KEY))
+        self.assertTrue(is_fresh(GENRE_FACETS_KEY))
+
+    def test_new_movie_refreshes_release_years(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_movie("Another")
+        self.assertFalse(is_fresh(RELEASE_YEARS_KEY))
+
+
+class GenreCountTests(TestCase):
+    def setUp(self):
+        self.drama, self.comedy, self.horror = (
+            Genre.objects.create(name=name) for name in ("Drama", "Comedy", "Horror")
+        )
+        self.movies = [make_movie(f"Movie {i}") for i in range(3)]
+
+    def assertCounts(self, drama, comedy, horror):
+        counts = dict(Genre.objects.values_list("name", "movie_count"))
+        self.assertEqual(counts, {"Drama": drama, "Comedy": comedy, "Horror": horror})
+        self.assertEqual(Genre.recount(), [])
+
+    def test_add(self):
+        movie = self.movies[0]
+        movie.genres.add(self.drama, self.comedy)
+        movie.genres.add(self.drama)  # Already linked
+        self.assertCounts(1, 1, 0)
+
+    def test_remove(self):
+        movie = self.movies[0]
+        movie.genres.add(self.drama, self.comedy)
+        movie.genres.remove(self.drama, self.horror)  # Horror isn't linked
+        self.assertCounts(0, 1, 0)
+
+    def test_clear(self):
+        movie = self.movies[0]
+        movie.genres.add(self.drama, self.comedy)
+        self.movies[1].genres.add(self.drama)
+        movie.genres.clear()
+        self.assertCounts(1, 0, 0)
+
+    def test_reverse_side(self):
+        first, second, third = self.movies
+        self.drama.movies.add(first, second)
+        self.assertCounts(2, 0, 0)
+        self.drama.movies.remove(first, third)  # The third isn't linked
+        self.assertCounts(1, 0, 0)
+        self.comedy.movies.add(first, second, third)
+        self.comedy.movies.clear()
+        self.assertCounts(1, 0, 0)
+        self.horror.movies.set([second, third])
+        self.assertCounts(1, 0, 2)
+
+    def test_movie_delete(self):
+        self.movies[0].genres.add(self.drama, self.comedy)
+        self.movies[1].genres.add(self.drama)
+        self.movies[0].delete()
+        self.assertCounts(1, 0, 0)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = make_movie()
+
+    def test_empty_board_is_ranked_on_read(self):
+        self.assertEqual(leaderboards.get("trending"), [self.movie])
+        self.assertEqual(leaderboards.get("top_rated"), [])
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_home_page_before_first_refresh(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["trending_movies"]), [self.movie])
+
+    def test_refresh_fills_boards(self):
+        leaderboards.get("trending")
+        leaderboards.refresh()
+        self.assertEqual(leaderboards.get("trending"), [self.movie])
+
+
+@override_settings(MOVIES_SINGLE_FLIGHT={"beta": 0})
+class SingleFlightTests(TestCase):
+    key = "tests:value"
+
+    def setUp(self):
+        cache.clear()
+        single_flight(self.key, lambda: "old", 60)
+
+    def test_expired_value_served_while_another_refreshes(self):
+        expire(self.key)
+        cache.add(LOCK_KEY.format(self.key), "other", 10)
+        self.assertEqual(single_flight(self.key, lambda: "new", 60), "old")
+
+    def test_expired_value_refreshed_by_one_reader(self):
+        expire(self.key)
+        self.assertEqual(single_flight(self.key, lambda: "new", 60), "new")
+        self.assertEqual(single_flight(self.key, lambda: "newer", 60), "new")
+
+    def test_lock_taken_over_by_another_is_kept(self):
+        lock_key = LOCK_KEY.format(self.key)
+
+        def slow():
+            # Our lock timed out and another process took it
+            cache.set(lock_key, "other", 10)
+            return "new"
+
+        expire(self.key)
+        single_flight(self.key, slow, 60)
+        self.assertEqual(cache.get(lock_key), "other")
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Several movies share each date, so pages split ties on the sort field
+        for i in range(7):
+            make_movie(f"Movie {i}", release_date=date(2020, 1, 1 + i // 3))
+        cls.ordered = list(Moviedata.objects.order_by("-release_date", "-pk"))
+
+    def walk(self, sort="-release_date", per_page=2):
+        pages, cursor = [], None
+        while True:
+            page = paginate(Moviedata.objects.all(), sort, cursor, per_page)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip(self):
+        values = [date(2020, 1, 2), Decimal("3.50"), 7]
+        cursor = encode_cursor("-release_date", True, values)
+        self.assertEqual(
+            decode_cursor(cursor, "-release_date"), (True, ["2020-01-02", "3.50", 7])
+        )
+
+    def test_forward_walk_splits_ties(self):
+        pages = self.walk()
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([movie for page in pages for movie in page], self.ordered)
+        self.assertFalse(pages[0].has_previous)
+
+    def test_previous_pages(self):
+        pages = self.walk()
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = paginate(
+                Moviedata.objects.all(), "-release_date", page.previous_cursor, 2
+            )
+            self.assertEqual(list(page), list(expected))
+            self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_tampered_cursors(self):
+        movies = Moviedata.objects.all()
+        for cursor in [
+            "not a cursor!",
+            encode_cursor("title", False, ["Movie 1", 1]),  # Another sort's
+            encode_cursor("-release_date", False, ["2020-01-02"]),
+            encode_cursor("-release_date", False, ["yesterday", 1]),
+            encode_cursor("-release_date", False, {"pk": 1}),
+        ]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginate(movies, "-release_date", cursor, 2)
+        with self.assertRaises(InvalidCursor):
+            paginate_list([1, 2, 3], encode_cursor("list", False, ["1"]), 2)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_genre_page_ignores_bad_cursor(self):
+        genre = Genre.objects.create(name="Drama")
+        genre.movies.set(self.ordered)
+        response = self.client.get(f"/genre/{genre.name}/", {"cursor": "junk"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["movies"]), self.ordered[:4])
+        self.assertEqual(list(response.context["available_years"]), [2020])
+
+
+class RatingDistributionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = make_movie()
+        cls.users = [User.objects.create_user(f"fan{i}") for i in range(3)]
+
+    def distribution(self):
+        return Moviedata.objects.get(pk=self.movie.pk).rating_distribution
+
+    def stars(self, **counts):
+        return {stars: counts.get(f"s{stars}", 0) for stars in range(5, 0, -1)}
+
+    def test_follows_review_writes(self):
+        first = Review.objects.create(
+            movie=self.movie, user=self.users[0], rating=5, comment=""
+        )
+        Review.objects.create(
+            movie=self.movie, user=self.users[1], rating=5, comment=""
+        )
+        Review.objects.create(
+            movie=self.movie, user=self.users[2], rating=2, comment=""
+        )
+        self.assertEqual(self.distribution(), self.stars(s5=2, s2=1))
+        first.rating = 3
+        first.save()
+        self.assertEqual(self.distribution(), self.stars(s5=1, s3=1, s2=1))
+        first.delete()
+        self.assertEqual(self.distribution(), self.stars(s5=1, s2=1))
+        self.assertEqual(Moviedata.recompute_ratings([self.movie.pk]), [])
+
+    def test_reconcile_repairs_drift(self):
+        Review.objects.create(
+            movie=self.movie, user=self.users[0], rating=4, comment=""
+        )
+        Moviedata.objects.filter(pk=self.movie.pk).update(
+            rating_4_count=0, rating_1_count=3
+        )
+        call_command("reconcile_ratings", stdout=io.StringIO())
+        self.assertEqual(self.distribution(), self.stars(s4=1))
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer")
+        drama, comedy = (Genre.objects.create(name=n) for n in ("Drama", "Comedy"))
+        cls.drama, cls.comedy = drama, comedy
+        cls.movies = [make_movie(f"Movie {i}") for i in range(3)]
+        cls.movies[0].genres.add(drama)
+        cls.movies[1].genres.add(drama, comedy)
+        cls.movies[2].genres.add(comedy)
+
+    def stats(self):
+        stats = UserStats.objects.get(user=self.user)
+        genre_counts = set(
+            UserGenreCount.objects.filter(
+                user=self.user, review_count__gt=0
+            ).values_list("genre_id", "review_count")
+        )
+        return (
+            stats.review_count,
+            stats.rating_sum,
+            stats.favorite_genre_id,
+            genre_counts,
+        )
+
+    def assertMatchesRecompute(self):
+        kept = self.stats()
+        UserStats.recompute([self.user.pk])
+        self.assertEqual(kept, self.stats())
+        return kept
+
+    def review(self, movie, rating):
+        return Review.objects.create(
+            movie=movie, user=self.user, rating=rating, comment=""
+        )
+
+    def test_review_writes_match_recompute(self):
+        first = self.review(self.movies[0], 4)
+        self.assertEqual(self.assertMatchesRecompute()[2], self.drama.pk)
+        self.review(self.movies[2], 2)
+        self.review(self.movies[1], 5)
+        first.rating = 1
+        first.save()
+        count, total, favorite, _ = self.assertMatchesRecompute()
+        self.assertEqual((count, total, favorite), (3, 8, self.drama.pk))
+        first.delete()  # Comedy now leads
+        count, total, favorite, _ = self.assertMatchesRecompute()
+        self.assertEqual((count, total, favorite), (2, 7, self.comedy.pk))
+
+    def test_review_and_watchlist_writes_append_activity(self):
+        self.review(self.movies[0], 4)
+        Watchlist.objects.create(user=self.user, movie=self.movies[1])
+        ingest_reviews(
+            [
+                {
+                    "movie": self.movies[2].pk,
+                    "user": "viewer",
+                    "rating": 3,
+                    "comment": "Good",
+                }
+            ]
+        )
+        self.assertEqual(
+            list(
+                Activity.objects.filter(user=self.user)
+                .order_by("created_at", "id")
+                .values_list("kind", "movie_id", "rating")
+            ),
+            [
+                ("review", self.movies[0].pk, 4),
+                ("watchlist", self.movies[1].pk, None),
+                ("review", self.movies[2].pk, 3),
+            ],
+        )
+        self.assertEqual(self.assertMatchesRecompute()[:2], (2, 7))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_same_content_shares_one_file(self):
+        first = self.storage.save("posters/a.JPG", ContentFile(b"image"))
+        second = self.storage.save("posters/b.jpg", ContentFile(b"image"))
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith(".jpg"))
+
+    def test_reuse_refreshes_modified_time(self):
+        name = self.storage.save("posters/a.jpg", ContentFile(b"image"))
+        os.utime(self.storage.path(name), (0, 0))  # An old orphan
+        self.storage.save("posters/b.jpg", ContentFile(b"image"))
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), 0)
+
+
+class InvertedIndexTests(TestCase):
+    def setUp(self):
+        self.index = search.InvertedIndex()
+        self.index.add(1, {"title": "Space Wars", "description": "A fleet at war"})
+        self.index.add(2, {"title": "Quiet Garden", "description": "Space to grow"})
+        self.index.add(3, {"title": "Garden Party", "description": "Friends meet"})
+
+    def test_title_hits_rank_first(self):
+        self.assertEqual(self.index.search("space"), [1, 2])
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.index.search("garden friends"), [3])
+        self.assertEqual(self.index.search("garden wars"), [])
+
+    def test_last_token_is_a_prefix(self):
+        self.assertCountEqual(self.index.search("gard"), [2, 3])
+        self.assertEqual(self.index.search("gard quiet"), [])
+
+    def test_reindex_and_remove(self):
+        self.index.add(1, {"title": "Calm Seas"})
+        self.assertEqual(self.index.search("wars"), [])
+        self.index.remove(2)
+        self.assertEqual(self.index.search("space"), [])
+        self.assertEqual(len(self.index), 2)
+
+
+@override_settings(MOVIES_SEARCH_BACKEND="memory", SECURE_SSL_REDIRECT=False)
+class MemorySearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        search._backend = None
+        self.addCleanup(setattr, search, "_backend", None)
+        self.about = make_movie("Harbour Lights", description="A storm at sea")
+        self.titled = make_movie("Storm Front", description="Rain")
+
+    def test_writes_update_the_built_index(self):
+        self.assertEqual(
+            search.search_movie_ids("storm"), [self.titled.pk, self.about.pk]
+        )
+        added = make_movie("Storm Chasers")
+        self.assertIn(added.pk, search.search_movie_ids("chasers"))
+        self.titled.title = "Weather Front"
+        self.titled.save()
+        self.assertEqual(search.search_movie_ids("storm"), [added.pk, self.about.pk])
+        added.delete()
+        self.assertEqual(search.search_movie_ids("chasers"), [])
+
+    def test_genre_links_are_indexed(self):
+        search.search_movie_ids("storm")
+        Genre.objects.create(name="Noir").movies.add(self.about)
+        self.assertEqual(search.search_movie_ids("noir"), [self.about.pk])
+
+    def test_search_page_orders_by_relevance(self):
+        response = self.client.get("/search/", {"q": "storm"})
+        self.assertEqual(list(response.context["movies"]), [self.titled, self.about])
+
+
+@override_settings(MOVIES_SEARCH_BACKEND="sqlite")
+class SQLiteSearchTests(TestCase):
+    def setUp(self):
+        search._backend = None
+        self.addCleanup(setattr, search, "_backend", None)
+        self.backend = search.get_backend()
+        self.titled = make_movie("Night Or Day", description="Two sisters")
+        self.about = make_movie("Sisters", description="Night shift at the docks")
+
+    def test_match_expression(self):
+        match = search.SQLiteFTS5Backend.match_expression
+        self.assertEqual(match('Night "OR" day-shift'), '"night" "or" "day" "shift"*')
+        self.assertEqual(match("caf\u00e9"), '"caf\u00e9"*')
+        self.assertIsNone(match(' "*" -- ()'))
+
+    def test_operators_are_searched_as_words(self):
+        self.assertEqual(self.backend.search("night or", 10), [self.titled.pk])
+        self.assertEqual(self.backend.search("NEAR(", 10), [])
+        self.assertEqual(self.backend.search("?!", 10), [])
+
+    def test_ranked_with_title_weight_and_prefix(self):
+        self.assertEqual(
+            self.backend.search("nig", 10), [self.titled.pk, self.about.pk]
+        )
+        self.assertEqual(self.backend.search("sisters", 1), [self.about.pk])
+
+    def test_writes_update_the_table(self):
+        self.titled.title = "Day"
+        self.titled.save()
+        self.assertEqual(self.backend.search("night", 10), [self.about.pk])
+        Genre.objects.create(name="Thriller").movies.add(self.titled)
+        self.assertEqual(self.backend.search("thriller", 10), [self.titled.pk])
+        self.about.delete()
+        self.assertEqual(self.backend.search("night", 10), [])
+
+
+class FuzzyLookupTests(TestCase):
+    def setUp(self):
+        fuzzy.catalog._indexes = None
+        self.addCleanup(setattr, fuzzy.catalog, "_indexes", None)
+        self.ajith = make_movie("Mankatha", actors="Ajith Kumar, Trisha")
+        self.ajay = make_movie("Singham", actors="Ajay Devgn", director="Rohit Shetty")
+
+    def test_typos_match(self):
+        name, score, movie_ids = fuzzy.lookup("actor", "ajth")[0]
+        self.assertEqual(name, "Ajith Kumar")
+        self.assertEqual(movie_ids, {self.ajith.pk})
+        self.assertEqual(fuzzy.lookup("director", "rohitt shety")[0][0], "Rohit Shetty")
+
+    def test_exact_names_rank_first(self):
+        make_movie("Billa", actors="Ajith")
+        names = [name for name, _, _ in fuzzy.lookup("actor", "ajith")]
+        self.assertEqual(names[:2], ["Ajith", "Ajith Kumar"])
+
+    def test_threshold(self):
+        self.assertEqual(fuzzy.lookup("actor", "xyzzy"), [])
+        self.assertEqual(fuzzy.lookup("actor", "ajth", threshold=0.9), [])
+        self.assertTrue(fuzzy.lookup("actor", "ajith kumar", threshold=0.9))
+        with self.settings(MOVIES_FUZZY_THRESHOLD=0.9):
+            self.assertEqual(fuzzy.lookup("actor", "ajth"), [])
+
+    @override_settings(MOVIES_FUZZY_MAX_MATCHES=2)
+    def test_matches_are_capped(self):
+        movies = [make_movie(f"Film {i}", director="Mani Ratnam") for i in range(3)]
+        self.assertEqual(
+            fuzzy.match_movie_ids("director", "mani ratnam"),
+            [movies[0].pk, movies[1].pk],
+        )
+        self.assertEqual(len(fuzzy.match_movie_ids("director", "mani", limit=3)), 3)
+
+    def test_writes_update_the_index(self):
+        fuzzy.lookup("actor", "ajith")
+        movie = make_movie("Viswasam", actors="Nayanthara")
+        self.assertEqual(fuzzy.lookup("actor", "nayantara")[0][2], {movie.pk})
+        self.ajith.delete()
+        self.assertEqual(fuzzy.lookup("actor", "ajith kumar"), [])
+
+
+class SuggestionIndexTests(TestCase):
+    def setUp(self):
+        self.index = autocomplete.SuggestionIndex(size=2)
+        for key, score in [("ajith kumar", 4), ("ajay devgn", 3), ("arya", 2)]:
+            self.index.set(key, key.title(), score, payload=score)
+
+    def labels(self, prefix):
+        return [label for label, _ in self.index.complete(prefix)]
+
+    def test_ranked_by_score_then_label(self):
+        self.assertEqual(self.labels("a"), ["Ajith Kumar", "Ajay Devgn"])
+        self.assertEqual(self.labels("KUM"), ["Ajith Kumar"])
+        self.index.set("ajay devgn", "Ajay Devgn", 4)
+        self.assertEqual(self.labels("aj"), ["Ajay Devgn", "Ajith Kumar"])
+        self.assertEqual(self.labels("?"), [])
+
+    def test_memo_follows_reranks(self):
+        self.assertEqual(self.labels("a"), ["Ajith Kumar", "Ajay Devgn"])
+        self.index.set("arya", "Arya", 5)
+        self.assertEqual(self.labels("a"), ["Arya", "Ajith Kumar"])
+        self.index.set("arya", "Arya", 1)
+        self.index.set("ajith kumar", "Ajith Kumar", 0)
+        self.assertEqual(self.labels("a"), ["Ajay Devgn", "Arya"])
+
+    def test_memo_follows_removals(self):
+        self.assertEqual(self.labels("a"), ["Ajith Kumar", "Ajay Devgn"])
+        self.index.discard("ajith kumar")
+        self.assertEqual(self.labels("a"), ["Ajay Devgn", "Arya"])
+        self.assertEqual(self.labels("kumar"), [])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.autocomplete = autocomplete.Autocomplete()
+        self.low = make_movie("Billa", actors="Ajith Kumar", average_rating=2)
+        self.high = make_movie("Mankatha", actors="Ajith Kumar", average_rating=4)
+        Genre.objects.create(name="Action").movies.add(self.low)
+
+    def test_suggestions_link_the_best_rated_movie(self):
+        suggestions = self.autocomplete.suggest("aji")
+        self.assertEqual(suggestions["actors"], [("Ajith Kumar", self.high.pk)])
+        self.assertEqual(
+            self.autocomplete.suggest("act")["genres"], [("Action", self.low.pk)]
+        )
+        self.autocomplete.rate_movies({self.low.pk: 5})
+        self.assertEqual(
+            self.autocomplete.suggest("aji")["actors"], [("Ajith Kumar", self.low.pk)]
+        )
+        self.autocomplete.remove_movie(self.low.pk)
+        self.assertEqual(self.autocomplete.suggest("act")["genres"], [])
+        self.assertEqual(self.autocomplete.suggest("b")["titles"], [])
+
+    def test_writes_during_a_build_are_replayed(self):
+        added = make_movie("Viswasam", actors="Nayanthara", average_rating=3)
+        build_labels = autocomplete.movie_labels
+
+        def labels_during_writes(movie):
+            if self.autocomplete._pending == []:
+                self.autocomplete.remove_movie(self.high.pk)
+                self.autocomplete.index_movie(added)
+            return build_labels(movie)
+
+        with mock.patch.object(autocomplete, "movie_labels", labels_during_writes):
+            self.autocomplete.rebuild()
+        self.assertEqual(self.autocomplete.suggest("m")["titles"], [])
+        self.assertEqual(
+            self.autocomplete.suggest("nay")["actors"], [("Nayanthara", added.pk)]
+        )
+        self.assertIsNone(self.autocomplete._pending)
+
+    def test_signals_keep_the_shared_index_in_sync(self):
+        self.addCleanup(setattr, autocomplete.autocomplete, "_indexes", None)
+        autocomplete.autocomplete.rebuild()
+        movie = make_movie("Vikram", director="Lokesh Kanagaraj")
+        self.assertEqual(
+            autocomplete.suggest("kanag")["directors"], [("Lokesh Kanagaraj", movie.pk)]
+        )
+        Moviedata.objects.filter(pk=self.low.pk).update(average_rating=5)
+        autocomplete.rerank_movies([self.low.pk])
+        self.assertEqual(
+            autocomplete.suggest("ajith")["actors"], [("Ajith Kumar", self.low.pk)]
+        )
+        movie.delete()
+        self.assertEqual(autocomplete.suggest("kanag")["directors"], [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ReviewImportTests(TestCase):
+    url = "/api/movies/reviews/bulk/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = make_movie()
+        cls.admin = User.objects.create_superuser("admin", password="x")
+        cls.critic = User.objects.create_user("critic")
+        Review.objects.create(movie=cls.movie, user=cls.admin, rating=2, comment="Meh")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def rows(self, admin_rating=5):
+        return [
+            {
+                "movie": self.movie.pk,
+                "user": "admin",
+                "rating": admin_rating,
+                "comment": "Again",
+            },
+            {"movie": self.movie.pk, "user": "critic", "rating": 4, "comment": "Good"},
+            {"movie": self.movie.pk, "user": "critic", "rating": 9, "comment": "Bad"},
+            {
+                "movie": self.movie.pk + 1,
+                "user": "critic",
+                "rating": 3,
+                "comment": "Lost",
+            },
+        ]
+
+    def totals(self):
+        self.movie.refresh_from_db()
+        return self.movie.rating_sum, self.movie.rating_count
+
+    def test_json_skips_existing_reviews(self):
+        Recommendation.objects.create(
+            user=self.critic, movie=self.movie, rank=1, score=1
+        )
+        response = self.client.post(
+            self.url, self.rows(), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(
+            (result["created"], result["updated"], result["skipped"]), (1, 0, 2)
+        )
+        self.assertEqual([error["row"] for error in result["errors"]], [2])
+        self.assertIn("rating", result["errors"][0]["errors"])
+        self.assertEqual(self.totals(), (6, 2))
+        self.assertEqual(Review.objects.get(user=self.admin).comment, "Meh")
+        self.assertFalse(Recommendation.objects.exists())
+        self.assertEqual(Activity.objects.filter(user=self.critic).count(), 1)
+
+    def test_ndjson_update(self):
+        body = "\n".join(json.dumps(row) for row in self.rows(admin_rating=1))
+        response = self.client.post(
+            f"{self.url}?update=1", body, content_type="application/x-ndjson"
+        )
+        result = response.json()
+        self.assertEqual(
+            (result["created"], result["updated"], result["skipped"]), (1, 1, 1)
+        )
+        self.assertEqual(self.totals(), (5, 2))
+        self.assertEqual(Review.objects.get(user=self.admin).comment, "Again")
+        self.assertEqual(Moviedata.recompute_ratings([self.movie.pk]), [])
+
+    def test_rejects_non_admins_and_non_lists(self):
+        response = self.client.post(
+            self.url, {"movie": 1}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(self.critic)
+        response = self.client.post(
+            self.url, self.rows(), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_import_reviews_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as feed:
+            json.dump(self.rows(), feed)
+        self.addCleanup(os.remove, feed.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command(
+            "import_reviews", feed.name, "--format=json", stdout=out, stderr=err
+        )
+        self.assertIn("1 created, 0 updated, 2 skipped, 1 invalid", out.getvalue())
+        self.assertIn("Row 2:", err.getvalue())
+        call_command(
+            "import_reviews",
+            feed.name,
+            "--format=json",
+            "--update",
+            stdout=out,
+            stderr=err,
+        )
+        self.assertIn("0 created, 2 updated, 1 skipped, 1 invalid", out.getvalue())
+        self.assertEqual(self.totals(), (9, 2))
+
+
+class MovieImportTests(TestCase):
+    def import_movies(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as feed:
+            feed.write(content)
+        self.addCleanup(os.remove, feed.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_movies", feed.name, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv(self):
+        drama = Genre.objects.create(name="Drama")
+        Person.resolve(["Trisha"])
+        out, err = self.import_movies(
+            "title,release_date,description,genres,actors,duration\n"
+            'Mankatha,2011-08-31,Heist,drama|Thriller,"Ajith Kumar, Trisha",02:40:00\n'
+            "Billa,not a date,Remake,Action,Ajith Kumar,\n"
+            'Vikram,2022-06-03,Agents,Thriller,"Kamal Haasan, Kamal Haasan",\n'
+            ",2020-01-01,Untitled,,,\n",
+            ".csv",
+            "--batch-size=2",
+        )
+        self.assertIn("2 movies imported, 2 invalid", out)
+        self.assertIn("Row 1: {'release_date'", err)
+        self.assertIn("Row 3: {'title'", err)
+
+        mankatha = Moviedata.objects.get(title="Mankatha")
+        self.assertEqual(mankatha.year, 2011)
+        self.assertEqual(str(mankatha.duration), "2:40:00")
+        self.assertEqual(
+            sorted(mankatha.genres.values_list("name", flat=True)),
+            ["Drama", "Thriller"],
+        )
+        self.assertEqual(Genre.objects.filter(name__iexact="drama").get(), drama)
+        self.assertEqual(
+            dict(Genre.objects.values_list("name", "movie_count")),
+            {"Drama": 1, "Thriller": 2},
+        )
+        self.assertEqual(
+            list(mankatha.credits.values_list("person__name", "billing_order")),
+            [("Ajith Kumar", 0), ("Trisha", 1)],
+        )
+        self.assertEqual(Person.objects.count(), 3)
+        vikram = Moviedata.objects.get(title="Vikram")
+        self.assertEqual(vikram.credits.count(), 1)
+
+    def test_ndjson(self):
+        rows = [
+            {
+                "title": "Jailer",
+                "release_date": "2023-08-10",
+                "description": "Warden",
+                "genres": ["Action"],
+                "director": "Nelson",
+            },
+            {"title": "Leo", "description": "No date"},
+        ]
+        out, err = self.import_movies(
+            "\n".join(json.dumps(row) for row in rows) + "\n\n", ".ndjson"
+        )
+        self.assertIn("1 movies imported, 1 invalid", out)
+        movie = Moviedata.objects.get()
+        self.assertEqual((movie.title, movie.director), ("Jailer", "Nelson"))
+        self.assertEqual(Genre.objects.get().movie_count, 1)
+
+
+class SimilarityBuildTests(TestCase):
+    def setUp(self):
+        self.drama = Genre.objects.create(name="Drama")
+        self.comedy = Genre.objects.create(name="Comedy")
+        self.first = make_movie("First", director="Mani Ratnam", actors="Ann Lee")
+        self.second = make_movie("Second", director="Mani Ratnam", actors="Bob Ray")
+        self.other = make_movie("Other", director="Priyadarshan")
+        self.drama.movies.add(self.first, self.second)
+        self.comedy.movies.add(self.other)
+
+    def similar(self, movie):
+        return list(
+            SimilarMovie.objects.filter(movie=movie).values_list("similar", flat=True)
+        )
+
+    def stale(self):
+        return set(
+            Moviedata.objects.filter(similarity_stale=True).values_list("pk", flat=True)
+        )
+
+    def test_full_build(self):
+        self.assertEqual(similarity.build(full=True), 3)
+        self.assertEqual(self.similar(self.first), [self.second.pk])
+        self.assertEqual(self.similar(self.second), [self.first.pk])
+        self.assertEqual(self.similar(self.other), [])
+        self.assertEqual(self.stale(), set())
+
+    def test_incremental_build_refreshes_stale_movies_only(self):
+        similarity.build(full=True)
+        self.assertEqual(similarity.build(), 0)
+        sequel = make_movie("Sequel", director="Mani Ratnam", actors="Ann Lee")
+        self.drama.movies.add(sequel)
+        self.assertEqual(self.stale(), {sequel.pk})
+        self.assertEqual(similarity.build(), 1)
+        self.assertEqual(self.similar(sequel), [self.first.pk, self.second.pk])
+        # Lists pointing elsewhere wait for the next full build
+        self.assertEqual(self.similar(self.first), [self.second.pk])
+        similarity.build(full=True, k=1)
+        self.assertEqual(self.similar(self.first), [sequel.pk])
+
+    def test_reviews_flag_their_movie(self):
+        similarity.build(full=True)
+        user = User.objects.create_user("critic")
+        Review.objects.create(movie=self.other, user=user, rating=4, comment="Fun")
+        self.assertEqual(self.stale(), {self.other.pk})
+        out = io.StringIO()
+        call_command("build_similarities", stdout=out)
+        self.assertIn("Refreshed 1 movie(s)", out.getvalue())
+        self.assertEqual(self.stale(), set())
+
+
+class RecommenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = [make_movie(title) for title in ("A1", "A2", "A3", "B1", "B2")]
+        a1, a2, a3, b1, b2 = cls.movies
+        cls.users = [User.objects.create_user(f"user{i}") for i in range(6)]
+        # Two groups of users with distinct tastes
+        for user in cls.users[:3]:
+            for movie in (a1, a2, a3):
+                Review.objects.create(movie=movie, user=user, rating=5, comment="Yes")
+        for user in cls.users[3:5]:
+            for movie in (b1, b2):
+                Review.objects.create(movie=movie, user=user, rating=5, comment="Yes")
+        # A newcomer who liked one movie of the first group
+        Review.objects.create(movie=a1, user=cls.users[5], rating=4, comment="Ok")
+        Watchlist.objects.create(movie=a2, user=cls.users[5])
+
+    def recommended(self, user):
+        return list(
+            Recommendation.objects.filter(user=user).values_list("movie", flat=True)
+        )
+
+    def test_factorization_scores_observed_cells_highest(self):
+        matrix = recommender.interaction_matrix()[2]
+        users, movies = recommender.factorize(matrix, factors=4, iterations=10)
+        scores = users @ movies.T
+        self.assertTrue((scores[matrix.nonzero()] > 0.5).all())
+        self.assertGreater(scores[0, 1], scores[0, 3])
+
+    @override_settings(MOVIES_RECOMMENDER={"factors": 4}, MOVIES_RECOMMENDATIONS=2)
+    def test_build_recommends_unseen_movies_of_the_same_taste(self):
+        out = io.StringIO()
+        call_command("build_recommendations", stdout=out)
+        self.assertIn("for 6 user(s)", out.getvalue())
+        a1, a2, a3, b1, b2 = self.movies
+        newcomer = self.users[5]
+        self.assertEqual(self.recommended(newcomer)[0], a3.pk)
+        self.assertNotIn(a1.pk, self.recommended(newcomer))
+        self.assertNotIn(a2.pk, self.recommended(newcomer))
+        others = self.recommended(self.users[3])
+        self.assertEqual(len(others), 2)
+        self.assertLessEqual(set(others), {a1.pk, a2.pk, a3.pk})
+        self.assertEqual(
+            list(
+                Recommendation.objects.filter(user=newcomer).values_list(
+                    "rank", flat=True
+                )
+            ),
+            [0, 1],
+        )
+
+    def test_users_without_recommendations_get_popular_movies(self):
+        stranger = User.objects.create_user("stranger")
+        Watchlist.objects.create(movie=self.movies[1], user=stranger)
+        # Best average first, then most reviewed; seen movies are left out
+        popular = recommender.recommended_movies(stranger, limit=2)
+        self.assertEqual(popular, [self.movies[2], self.movies[3]])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PageCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.genre = Genre.objects.create(name="Drama")
+        self.movie = make_movie("Nayakan")
+        self.genre.movies.add(self.movie)
+        self.critic = User.objects.create_user("critic")
+        self.detail_url = reverse("movies:movie_detail", args=[self.movie.pk])
+        self.genre_url = reverse("movies:genre", args=["Drama"])
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def card(self):
+        self.movie.refresh_from_db()
+        return render_movie_fragment("movies/movie_card.html", self.movie)
+
+    def test_review_save(self):
+        self.assertIn("(0 reviews)", self.get(self.detail_url))
+        self.assertIn("0.0", self.get(self.genre_url))
+        self.assertIn("0.0", self.card())
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                movie=self.movie, user=self.critic, rating=4, comment="Classic"
+            )
+        self.assertIn("(1 review)", self.get(self.detail_url))
+        self.assertIn("4.0", self.get(self.genre_url))
+        self.assertIn("4.0", self.card())
+
+    def test_bulk_import(self):
+        self.get(self.detail_url)
+        self.get(self.genre_url)
+        self.card()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_reviews(
+                [
+                    {
+                        "movie": self.movie.pk,
+                        "user": "critic",
+                        "rating": 2,
+                        "comment": "Slow",
+                    }
+                ]
+            )
+        self.assertIn("(1 review)", self.get(self.detail_url))
+        self.assertIn("2.0", self.get(self.genre_url))
+        self.assertIn("2.0", self.card())
+
+    def test_movie_and_genre_edits(self):
+        self.get(self.detail_url)
+        self.card()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = "Thalapathi"
+            self.movie.save()
+        self.assertIn("Thalapathi", self.get(self.genre_url))
+        self.assertIn("Thalapathi", self.card())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.name = "Crime"
+            self.genre.save()
+        self.assertIn("Crime", self.get(self.detail_url))
+        self.assertIn("Crime", self.card())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class MovieListConditionalTests(TestCase):
+    url = "/api/movies/"
+
+    def setUp(self):
+        cache.clear()
+        self.movies = [make_movie(f"Movie {i}") for i in range(3)]
+
+    def get(self, **headers):
+        return self.client.get(self.url, HTTP_ACCEPT="application/json", **headers)
+
+    def test_validators_answer_with_304(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        with self.assertNumQueries(1):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, {"year": 1999}, HTTP_ACCEPT="application/json"
+        )
+        self.assertNotIn("ETag", response)
+
+    def test_edits_and_deletions_change_the_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movies[0].delete()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movies[1].title = "Renamed"
+            self.movies[1].save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, MOVIES_REVIEWS_PAGE_SIZE=2)
+class ReviewPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = make_movie()
+        other = make_movie("Other")
+        reviews = [
+            Review.objects.create(
+                movie=cls.movie,
+                user=User.objects.create_user(f"critic{i}"),
+                rating=i + 1,
+                comment=f"Review {i}",
+            )
+            for i in range(5)
+        ]
+        Review.objects.create(
+            movie=other, user=reviews[0].user, rating=1, comment="Elsewhere"
+        )
+        # Two reviews written in the same instant are ordered by id
+        day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for review, hour in zip(reviews, [3, 1, 1, 2, 0]):
+            Review.objects.filter(pk=review.pk).update(
+                created_at=day.replace(hour=hour)
+            )
+        cls.expected = [reviews[i].pk for i in (0, 3, 2, 1, 4)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_api_pages(self):
+        url = f"/api/movies/{self.movie.pk}/reviews/"
+        pages = []
+        while url:
+            response = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            self.assertEqual(response["count"], 5)
+            pages.append([review["id"] for review in response["results"]])
+            url = response["next"]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual(response["results"][0]["user"], "critic4")
+
+        response = self.client.get(f"/api/movies/{self.movie.pk}/reviews/?cursor=x")
+        self.assertEqual(response.status_code, 404)
+
+    def test_html_pages(self):
+        url = reverse("movies:movie_detail", args=[self.movie.pk])
+        first = self.client.get(url).context["reviews"]
+        self.assertEqual([review.pk for review in first], self.expected[:2])
+        response = self.client.get(
+            reverse("movies:movie_reviews", args=[self.movie.pk]),
+            {"cursor": first.next_cursor},
+        )
+        self.assertEqual(
+            [review.pk for review in response.context["reviews"]], self.expected[2:4]
+        )
+        self.assertContains(response, "Show more reviews")
+        response = self.client.get(
+            reverse("movies:movie_reviews", args=[self.movie.pk]), {"cursor": "x"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+def image_file(size, image_format="PNG", **params):
+    output = io.BytesIO()
+    Image.new("RGB", size, "red").save(output, image_format, **params)
+    return ContentFile(output.getvalue())
+
+
+@override_settings(MOVIES_POSTERS={"widths": (222, 400)})
+class PosterTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def size(self, name):
+        with self.storage.open(name) as file, Image.open(file) as image:
+            return image.format, image.size
+
+    def test_names_and_widths(self):
+        self.assertEqual(
+            posters.derivative_name("movie_posters/a.b.png", 400, "webp"),
+            "movie_posters/a.b.400w.webp",
+        )
+        self.assertEqual(posters.target_widths(1000), [222, 400])
+        self.assertEqual(posters.target_widths(400), [222, 400])
+        self.assertEqual(posters.target_widths(300), [222, 300])
+        self.assertEqual(posters.target_widths(100), [100])
+
+    def test_generate(self):
+        name = self.storage.save("movie_posters/a.png", image_file((500, 750)))
+        self.assertEqual(posters.generate(name, self.storage), [222, 400])
+        self.assertEqual(
+            self.size(posters.derivative_name(name, 222, "webp")), ("WEBP", (222, 333))
+        )
+        copy = posters.derivative_name(name, 400, "jpg")
+        self.assertEqual(self.size(copy), ("JPEG", (400, 600)))
+        # Existing copies are kept unless forced
+        os.utime(self.storage.path(copy), (0, 0))
+        posters.generate(name, self.storage)
+        self.assertEqual(os.path.getmtime(self.storage.path(copy)), 0)
+        posters.generate(name, self.storage, force=True)
+        self.assertGreater(os.path.getmtime(self.storage.path(copy)), 0)
+
+    def test_generate_follows_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        content = image_file((300, 200), "JPEG", exif=exif)
+        name = self.storage.save("movie_posters/b.jpg", content)
+        self.assertEqual(posters.generate(name, self.storage), [200])
+        self.assertEqual(
+            self.size(posters.derivative_name(name, 200, "jpg")), ("JPEG", (200, 300))
+        )
+
+    def test_generate_skips_broken_files(self):
+        name = self.storage.save("movie_posters/c.png", ContentFile(b"not an image"))
+        with self.assertLogs("movies.posters", "WARNING"):
+            self.assertEqual(posters.generate(name, self.storage), [])
+        with self.assertLogs("movies.posters", "WARNING"):
+            self.assertEqual(
+                posters.generate("movie_posters/gone.png", self.storage), []
+            )
+
+    def test_srcset(self):
+        self.assertEqual(
+            posters.srcset("p/a.png", [222, 400], "webp", self.storage),
+            "/media/p/a.222w.webp 222w, /media/p/a.400w.webp 400w",
+        )
+
+    def test_poster_tag(self):
+        template = Template('{% load movie_tags %}{% poster movie class="x" %}')
+        movie = Moviedata(title="Blank", poster_url="")
+        self.assertEqual(
+            template.render(Context({"movie": movie})),
+            '<img class="x" alt="Blank" src="/media/default_poster.jpg">',
+        )
+        movie = Moviedata(
+            title="Resized", poster_url="p/a.png", poster_widths=[222, 400]
+        )
+        html = template.render(Context({"movie": movie}))
+        self.assertIn(
+            '<source type="image/webp" srcset="/media/p/a.222w.webp 222w', html
+        )
+        self.assertIn('src="/media/p/a.400w.jpg"', html)
+
+
+class ImageJobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def avatar_job(self, size=(600, 400), content=None):
+        user = User.objects.create_user(f"user{User.objects.count()}")
+        profile = user.profile
+        profile.avatar.save("a.png", content or image_file(size))
+        return profile, ImageJob.objects.get(kind="avatar", object_id=profile.pk)
+
+    def test_claims_lease_jobs(self):
+        first = self.avatar_job()[1]
+        second = self.avatar_job()[1]
+        [claimed] = jobs.claim(1)
+        self.assertEqual((claimed.pk, claimed.attempts), (first.pk, 1))
+        self.assertGreater(claimed.run_after, django_timezone.now())
+        self.assertEqual([job.pk for job in jobs.claim(5)], [second.pk])
+        self.assertEqual(jobs.claim(5), [])
+
+    @override_settings(MOVIES_IMAGE_JOBS={"retry_delay": 10, "max_attempts": 2})
+    def test_failures_are_retried_with_backoff(self):
+        job = self.avatar_job()[1]
+
+        def fail(job):
+            raise OSError("disk full")
+
+        with mock.patch.dict(jobs.HANDLERS, {"avatar": fail}):
+            with self.assertLogs("movies.jobs", "ERROR"):
+                self.assertEqual(jobs.work(), (0, 1))
+            job.refresh_from_db()
+            self.assertEqual(job.last_error, "OSError('disk full')")
+            delay = job.run_after - django_timezone.now()
+            self.assertAlmostEqual(delay.total_seconds(), 10, delta=5)
+            self.assertEqual(jobs.work(), (0, 0))  # Not due yet
+
+            ImageJob.objects.update(run_after=django_timezone.now())
+            with self.assertLogs("movies.jobs", "ERROR"):
+                self.assertEqual(jobs.work(), (0, 1))
+            job.refresh_from_db()
+            self.assertEqual((job.attempts, job.run_after), (2, None))
+            self.assertEqual(jobs.claim(5), [])
+
+    def test_shrink_avatar(self):
+        profile, job = self.avatar_job()
+        original = profile.avatar.name
+        self.assertEqual(jobs.work(), (1, 0))
+        profile.refresh_from_db()
+        self.assertNotEqual(profile.avatar.name, original)
+        with profile.avatar.open("rb") as file, Image.open(file) as image:
+            self.assertEqual(image.size, (300, 200))
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_replaced_images_are_left_alone(self):
+        profile, stale = self.avatar_job()
+        profile.avatar.save("b.png", image_file((500, 500)))
+        jobs.shrink_avatar(stale)
+        profile.refresh_from_db()
+        with profile.avatar.open("rb") as file, Image.open(file) as image:
+            self.assertEqual(image.size, (500, 500))
+
+    def test_process_images_command(self):
+        name = default_storage.save("movie_posters/p.png", image_file((500, 750)))
+        movie = make_movie(poster_url=name)
+        self.avatar_job(content=ContentFile(b"not an image"))
+        out = io.StringIO()
+        with self.assertLogs("movies.jobs", "ERROR"):
+            call_command("process_images", "--once", stdout=out)
+        self.assertIn("1 job(s) done, 1 failed", out.getvalue())
+        movie.refresh_from_db()
+        self.assertEqual(movie.poster_widths, [222, 400, 500])
+        self.assertTrue(
+            default_storage.exists(posters.derivative_name(name, 222, "webp"))
+        )
+        failed = ImageJob.objects.get()
+        self.assertEqual((failed.kind, failed.attempts), ("avatar", 1))
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    REST_FRAMEWORK={
+        "DEFAULT_PAGINATION_CLASS": "movies.pagination.KeysetPagination",
+        "PAGE_SIZE": 2,
+    },
+)
+class MovieListRowsTests(TestCase):
+    url = "/api/movies/"
+
+    @classmethod
+    def setUpTestData(cls):
+        drama = Genre.objects.create(name="Drama")
+        crime = Genre.objects.create(name="Crime")
+        cls.movies = [
+            make_movie(
+                "Nayakan",
+                release_date=date(1987, 10, 21),
+                director="Mani Ratnam",
+                poster_url="movie_posters/nayakan poster.jpg",
+            ),
+            make_movie("Roja", release_date=date(1992, 8, 15), poster_url=""),
+            make_movie("Iruvar", release_date=date(1997, 1, 14)),
+        ]
+        drama.movies.add(*cls.movies)
+        crime.movies.add(cls.movies[0])
+        user = User.objects.create_user("critic")
+        Review.objects.create(movie=cls.movies[0], user=user, rating=4, comment="Yes")
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **params):
+        response = self.client.get(self.url, params, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def next_cursor(self, data):
+        return parse_qs(urlsplit(data["next"]).query)["cursor"][0]
+
+    def test_rows_match_the_instance_serializer(self):
+        pages = [self.get(sort="title")]
+        pages.append(self.get(sort="title", cursor=self.next_cursor(pages[0])))
+        results = pages[0]["results"] + pages[1]["results"]
+        request = Request(APIRequestFactory().get(self.url))
+        movies = Moviedata.objects.prefetch_related("genres").order_by("title")
+        expected = MovieListSerializer(movies, many=True, context={"request": request})
+        self.assertEqual(results, json.loads(JSONRenderer().render(expected.data)))
+        nayakan = results[1]
+        self.assertEqual(nayakan["genres"], ["Crime", "Drama"])
+        self.assertEqual(
+            nayakan["poster_url"],
+            "http://testserver/media/movie_posters/nayakan%20poster.jpg",
+        )
+        self.assertIsNone(results[2]["poster_url"])
+
+    def test_sparse_fields(self):
+        data = self.get(fields="title,nonsense")
+        self.assertEqual(data["results"], [{"title": "Iruvar"}, {"title": "Roja"}])
+        # Keyset columns are read, but only the requested fields are shown
+        data = self.get(fields="genres", sort="-average_rating")
+        self.assertEqual(data["results"][0], {"genres": ["Crime", "Drama"]})
+        cursor = self.next_cursor(data)
+        data = self.get(fields="genres", sort="-average_rating", cursor=cursor)
+        self.assertEqual(data["results"], [{"genres": ["Drama"]}])
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(self.get(fields="nonsense")["results"], [{}, {}])
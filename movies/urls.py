@@ -8,7 +8,11 @@ urlpatterns = [
     path("genre/<str:genre_name>/", views.genre_view, name="genre"),
     path("movie/<int:movie_id>/", views.movie_detail_view, name="movie_detail"),
     path("movie/<int:movie_id>/add-review/", views.add_review, name="add_review"),
+    path(
+        "movie/<int:movie_id>/reviews/", views.movie_reviews_view, name="movie_reviews"
+    ),
     path("search/", views.search_view, name="search"),
+    path("search/autocomplete/", views.autocomplete_view, name="search_autocomplete"),
     path("profile/", views.profile, name="profile"),
     path("profile/edit/", views.edit_profile, name="edit_profile"),
     path("profile/sort/<str:sort_by>/", views.sort_watchlist, name="sort_watchlist"),
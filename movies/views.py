@@ -1,25 +1,91 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from rest_framework import viewsets
-from .serializers import MovieSerializer, ReviewSerializer
-from .models import Moviedata, Review, Genre, Watchlist
-from django.db.models import Q, Count, Avg
-from rest_framework.permissions import IsAuthenticated
+from .serializers import MovieListSerializer, MovieSerializer, ReviewSerializer
+from .cache import (
+    cache_anonymous_page,
+    genre_facets,
+    genre_release_years,
+    genre_tag,
+    normalized_query,
+    release_years,
+    single_flight,
+    versioned_key,
+)
+from .conditional import conditional_page, conditional_response
+from .ingest import ingest_reviews
+from .pagination import (
+    NEWEST_FIRST,
+    SORTS,
+    InvalidCursor,
+    ReviewPagination,
+    cached_count,
+    paginate,
+    paginate_list,
+    sort_columns,
+)
+from .parsers import NDJSONParser
+from .models import (
+    Activity,
+    Moviedata,
+    Review,
+    Genre,
+    Watchlist,
+    MovieCredit,
+    Person,
+    SimilarMovie,
+    UserStats,
+)
+from . import autocomplete, fuzzy, leaderboards, recommender, search
+from django.db.models import Prefetch
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+
+def filter_by_actor(queryset, actor):
+    """Movies crediting someone whose name is similar to ``actor``.
+
+    The trigram index resolves typos to known names, then the movies are
+    found through the indexed MovieCredit join.
+    """
+    matches = fuzzy.lookup(
+        "actor", actor, limit=getattr(settings, "MOVIES_FUZZY_MAX_MATCHES", 500)
+    )
+    names = [Person.normalize(name) for name, _, _ in matches]
+    credits = MovieCredit.objects.filter(person__normalized_name__in=names)
+    return queryset.filter(pk__in=credits.values("movie_id"))
+
+
+def movie_updated_at(movie_id):
+    return (
+        Moviedata.objects.filter(pk=movie_id)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
 
 
 class MovieViewSet(viewsets.ModelViewSet):
     queryset = Moviedata.objects.all()
     serializer_class = MovieSerializer
 
+    def get_serializer_class(self):
+        if self.action == "list":
+            return MovieListSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action != "list":  # Lists read .values() rows instead
+            queryset = queryset.prefetch_related("genres")
 
         # Get search parameters from query
         search_query = self.request.query_params.get("search", None)
@@ -30,12 +96,7 @@ class MovieViewSet(viewsets.ModelViewSet):
 
         # Apply filters
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-                | Q(description__icontains=search_query)
-                | Q(actors__icontains=search_query)
-                | Q(director__icontains=search_query)
-            )
+            queryset = search.filter_queryset(queryset, search_query)
         if genre:
             queryset = queryset.filter(
                 genres__name__iexact=genre
@@ -43,12 +104,56 @@ class MovieViewSet(viewsets.ModelViewSet):
         if year:
             queryset = queryset.filter(year=year)
         if actor:
-            queryset = queryset.filter(actors__icontains=actor)
+            queryset = filter_by_actor(queryset, actor)
         if director:
-            queryset = queryset.filter(director__icontains=director)
+            queryset = queryset.filter(
+                pk__in=fuzzy.match_movie_ids("director", director)
+            )
 
         return queryset
 
+    def conditional(self, request, last_modified, render, *variant):
+        # The browsable API shows the signed-in user, so only JSON is shared
+        if request.accepted_renderer.format != "json":
+            return render()
+        return conditional_response(request, last_modified, render, *variant)
+
+    def retrieve(self, request, *args, **kwargs):
+        render = super().retrieve
+        pk = kwargs["pk"]
+        return self.conditional(
+            request,
+            movie_updated_at(pk) if pk.isdigit() else None,
+            lambda: render(request, *args, **kwargs),
+        )
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        # Plus the columns keyset cursors are built from, even if not shown
+        rows = queryset.values(*{*serializer.value_columns(), *sort_columns()})
+        # The newest updated_at is one probe of its index. Deletions don't
+        # move it, but they bump "catalog" and so renew the cached count,
+        # which is the one the paginator reports
+        newest = (
+            queryset.order_by("-updated_at")
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        return self.conditional(
+            request,
+            newest,
+            lambda: self.list_rows(serializer, rows),
+            cached_count(rows.order_by()),
+        )
+
+    def list_rows(self, serializer, rows):
+        """The list, serialized from .values() rows rather than model instances"""
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serializer.serialize_rows(rows))
+        return self.get_paginated_response(serializer.serialize_rows(page))
+
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def add_review(self, request, pk=None):
         movie = self.get_object()
@@ -58,14 +163,33 @@ class MovieViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="reviews/bulk",
+        permission_classes=[IsAdminUser],
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def bulk_reviews(self, request):
+        """Import a JSON array or NDJSON stream of reviews for many movies"""
+        if not isinstance(request.data, list):
+            return Response({"detail": "Expected a list of reviews."}, status=400)
+        update = request.query_params.get("update") in ("1", "true")
+        result = ingest_reviews(request.data, update_existing=update)
+        return Response(result.as_dict(), status=200)
+
     @action(detail=True, methods=["get"])
     def reviews(self, request, pk=None):
         movie = self.get_object()
-        reviews = movie.reviews.all()
+        paginator = ReviewPagination()
+        reviews = paginator.paginate_queryset(
+            movie.reviews.select_related("user"), request, view=self
+        )
         serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
 
+@cache_anonymous_page(lambda request: ["catalog", "leaderboards"])
 def home_view(request):
     search_query = request.GET.get("q", "")
     genre_filter = request.GET.get("genre")
@@ -74,11 +198,7 @@ def home_view(request):
     movie_queryset = Moviedata.objects.all().prefetch_related("genres")
 
     if search_query:
-        movie_queryset = movie_queryset.filter(
-            Q(title__icontains=search_query)
-            | Q(director__icontains=search_query)
-            | Q(actors__icontains=search_query)
-        )
+        movie_queryset = search.filter_queryset(movie_queryset, search_query)
 
     if genre_filter:
         movie_queryset = movie_queryset.filter(genres__name__iexact=genre_filter)
@@ -86,12 +206,15 @@ def home_view(request):
     if year_filter and year_filter.isdigit():
         movie_queryset = movie_queryset.filter(year=int(year_filter))
 
-    trending_movies = movie_queryset.order_by("-release_date")[:8]
-    top_rated_movies = movie_queryset.order_by("-average_rating")[:8]
+    if search_query or genre_filter or year_filter:
+        trending_movies = movie_queryset.order_by("-release_date")[:8]
+        top_rated_movies = movie_queryset.order_by("-average_rating")[:8]
+    else:
+        # The unfiltered page reads the precomputed boards from the cache
+        trending_movies = leaderboards.get("trending")
+        top_rated_movies = leaderboards.get("top_rated")
 
-    available_years = (
-        Moviedata.objects.values_list("year", flat=True).distinct().order_by("-year")
-    )
+    available_years = release_years()
 
     return render(
         request,
@@ -107,9 +230,15 @@ def home_view(request):
     )
 
 
+@conditional_page(lambda request, movie_id: movie_updated_at(movie_id))
+@cache_anonymous_page(lambda request, movie_id: ["catalog", f"movie:{movie_id}"])
 def movie_detail_view(request, movie_id):
     movie = get_object_or_404(
-        Moviedata.objects.prefetch_related("genres", "reviews"), id=movie_id
+        Moviedata.objects.prefetch_related(
+            "genres",
+            Prefetch("credits", queryset=MovieCredit.objects.select_related("person")),
+        ),
+        id=movie_id,
     )
     has_reviewed = False
     if request.user.is_authenticated:
@@ -121,18 +250,50 @@ def movie_detail_view(request, movie_id):
             movie=movie, user=request.user
         ).exists()
 
+    # Precomputed by build_similarities; one (movie, rank) index range scan
+    similar_movies = [
+        entry.similar
+        for entry in SimilarMovie.objects.filter(movie=movie).select_related("similar")
+    ]
+
     return render(
         request,
         "movies/movie_detail.html",
         {
             "movie": movie,
-            "reviews": movie.reviews.all(),
+            "reviews": review_page(movie, None),
             "has_reviewed": has_reviewed,  # Pass this to template
             "movie_in_watchlist": movie_in_watchlist,
+            "similar_movies": similar_movies,
         },
     )
 
 
+def review_page(movie, cursor):
+    """A page of ``movie``'s reviews, newest first"""
+    return paginate(
+        movie.reviews.select_related("user"),
+        "-created_at",
+        cursor,
+        getattr(settings, "MOVIES_REVIEWS_PAGE_SIZE", 10),
+        NEWEST_FIRST,
+    )
+
+
+@conditional_page(lambda request, movie_id: movie_updated_at(movie_id))
+def movie_reviews_view(request, movie_id):
+    """The next page of a movie's reviews, as an HTML fragment"""
+    movie = get_object_or_404(Moviedata, id=movie_id)
+    try:
+        reviews = review_page(movie, request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Invalid cursor")
+    return render(
+        request, "movies/review_list.html", {"movie": movie, "reviews": reviews}
+    )
+
+
+@cache_anonymous_page(lambda request, genre_name: ["catalog", genre_tag(genre_name)])
 def genre_view(request, genre_name):
     genre = get_object_or_404(Genre, name__iexact=genre_name)
 
@@ -158,16 +319,20 @@ def genre_view(request, genre_name):
     if year_filter and year_filter.isdigit():
         movies = movies.filter(year=int(year_filter))
 
-    # Apply sorting
-    movies = movies.order_by(sort_by)
+    # Years of this genre's movies: cached until they change, and lazy, so
+    # pages that don't show them don't read the cache
+    available_years = SimpleLazyObject(lambda: genre_release_years(genre))
 
-    # Get available years for this genre
-    available_years = movies.values_list("year", flat=True).distinct().order_by("-year")
+    # Keyset pagination: each page is one index range scan, however deep
+    try:
+        page_obj = paginate(movies, sort_by, request.GET.get("cursor"), 4)
+    except InvalidCursor:
+        page_obj = paginate(movies, sort_by, None, 4)
 
-    # Pagination
-    paginator = Paginator(movies, 4)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    if year_filter and year_filter.isdigit():
+        total = cached_count(movies, ["catalog", genre_tag(genre.name)])
+    else:
+        total = genre.movie_count
 
     return render(
         request,
@@ -179,11 +344,8 @@ def genre_view(request, genre_name):
             "current_sort": sort_by,
             "available_years": available_years,
             "selected_year": year_filter,
-            "paginator": paginator,  # Added paginator to context
             "page_obj": page_obj,
-            "page_range": paginator.get_elided_page_range(
-                page_obj.number, on_each_side=1, on_ends=1
-            ),  # Better page range display
+            "total": total,
         },
     )
 
@@ -196,62 +358,88 @@ def search_view(request):
     min_rating = request.GET.get("min_rating", "")
     director = request.GET.get("director", "")
     actor = request.GET.get("actor", "")
-    sort = request.GET.get("sort", "-average_rating")  # Default sort by highest rated
+    # Default sort: most relevant first for text searches, else highest rated
+    sort = request.GET.get("sort", "relevance" if query else "-average_rating")
+    if sort not in SORTS:
+        sort = "relevance" if query else "-average_rating"
+    cursor = request.GET.get("cursor")
+    # Rating filters and sorts depend on reviews as well as the catalog
+    tags = ["catalog"]
+    if min_rating or sort.endswith("average_rating"):
+        tags.append("ratings")
+
+    def matching_movies():
+        # Start with base queryset
+        movies = Moviedata.objects.all()
 
-    # Start with base queryset
-    movies = Moviedata.objects.all().prefetch_related("genres")
+        # Apply filters
+        if query:
+            # Title, description, actors, director, genres and year all come
+            # from the search index, so no joins or LIKE scans are needed here.
+            # The ranked ids are cached per query, shared by every page and sort
+            ranked_ids = single_flight(
+                versioned_key("search", ["catalog"], query),
+                lambda: search.search_movie_ids(query),
+                settings.MOVIES_SEARCH_CACHE_TTL,
+            )
+            movies = search.order_by_rank(movies.filter(pk__in=ranked_ids), ranked_ids)
 
-    # Apply filters
-    if query:
-        movies = movies.filter(
-            Q(title__icontains=query)
-            | Q(description__icontains=query)
-            | Q(actors__icontains=query)
-            | Q(director__icontains=query)
-            | Q(genres__name__icontains=query)
-            | Q(year__icontains=query)  # Search in genres too
-        ).distinct()  # Add distinct to avoid duplicates
+        if genre:
+            movies = movies.filter(genres__name__iexact=genre)
 
-    if genre:
-        movies = movies.filter(genres__name__iexact=genre)
+        if year and year.isdigit():
+            movies = movies.filter(year=int(year))
 
-    if year and year.isdigit():
-        movies = movies.filter(year=int(year))
+        if min_rating:
+            try:
+                movies = movies.filter(average_rating__gte=float(min_rating))
+            except ValueError:
+                pass  # Ignore invalid rating input
 
-    if min_rating:
+        # Typo-tolerant: names are matched through the trigram index
+        if director:
+            movies = movies.filter(pk__in=fuzzy.match_movie_ids("director", director))
+
+        if actor:
+            movies = filter_by_actor(movies, actor)
+        return movies
+
+    if sort in SORTS:
+        movies = matching_movies().prefetch_related("genres")
         try:
-            movies = movies.filter(average_rating__gte=float(min_rating))
-        except ValueError:
-            pass  # Ignore invalid rating input
-
-    if director:
-        movies = movies.filter(director__icontains=director)
-
-    if actor:
-        movies = movies.filter(actors__icontains=actor)
-
-    # Apply sorting
-    valid_sorts = [
-        "title",
-        "-title",
-        "average_rating",
-        "-average_rating",
-        "year",
-        "-year",
-    ]
-    if sort in valid_sorts:
-        movies = movies.order_by(sort)
+            page = paginate(movies, sort, cursor, 24)
+        except InvalidCursor:
+            page = paginate(movies, sort, None, 24)
+        total = cached_count(movies.order_by(), tags)
+    else:
+        # Relevance isn't a column to seek on, so page through the ranked ids.
+        # Text matches are capped at MOVIES_SEARCH_MAX_RESULTS, keeping the
+        # cached list small.
+        params = request.GET.copy()
+        params.pop("cursor", None)
+        movie_ids = single_flight(
+            versioned_key("search-ranked", tags, normalized_query(params)),
+            lambda: list(matching_movies().values_list("pk", flat=True)),
+            settings.MOVIES_SEARCH_CACHE_TTL,
+        )
+        try:
+            page = paginate_list(movie_ids, cursor, 24, sort)
+        except InvalidCursor:
+            page = paginate_list(movie_ids, None, 24, sort)
+        found = Moviedata.objects.prefetch_related("genres").in_bulk(page.object_list)
+        page.object_list = [found[pk] for pk in page.object_list if pk in found]
+        total = len(movie_ids)
 
     # Get all genres for dropdown
-    all_genres = Genre.objects.annotate(movie_count=Count("movies")).filter(
-        movie_count__gt=0
-    )
+    all_genres = genre_facets()
 
     return render(
         request,
         "movies/search_results.html",
         {
-            "movies": movies,
+            "movies": page,
+            "page_obj": page,
+            "total": total,
             "query": query,
             "filters": {
                 "genre": genre,
@@ -267,6 +455,36 @@ def search_view(request):
     )
 
 
+def autocomplete_view(request):
+    """JSON suggestions for the search box, best rated first"""
+    prefix = request.GET.get("q", "").strip()
+    try:
+        limit = max(1, int(request.GET.get("limit", 5)))
+    except ValueError:
+        limit = 5
+
+    suggestions = autocomplete.suggest(prefix, limit) if prefix else {}
+
+    return JsonResponse(
+        {
+            "query": prefix,
+            "titles": [
+                {
+                    "title": title,
+                    "url": reverse("movies:movie_detail", args=[movie_id]),
+                }
+                for title, movie_id in suggestions.get("titles", [])
+            ],
+            "actors": [name for name, _ in suggestions.get("actors", [])],
+            "directors": [name for name, _ in suggestions.get("directors", [])],
+            "genres": [
+                {"name": name, "url": reverse("movies:genre", args=[name])}
+                for name, _ in suggestions.get("genres", [])
+            ],
+        }
+    )
+
+
 @login_required
 def add_review(request, movie_id):
     movie = get_object_or_404(Moviedata, id=movie_id)
@@ -321,70 +539,35 @@ def profile(request):
         .order_by(sort_field)
     )
 
-    # Get all reviews for stats calculation
-    all_reviews = Review.objects.filter(user=request.user).select_related("movie")
-
-    # Calculate stats
-    review_stats = all_reviews.aggregate(
-        avg_rating=Avg("rating"), total_reviews=Count("id")
-    )
-
-    # Get favorite genre
-    favorite_genre = (
-        Genre.objects.filter(movies__reviews__user=request.user)
-        .annotate(review_count=Count("id"))
-        .order_by("-review_count")
-        .first()
-    )
+    # Review count, average rating and favorite genre, kept up to date on write
+    stats = UserStats.for_user(request.user)
 
     # Paginate reviews
-    review_page = request.GET.get("reviews_page", 1)
-    paginator = Paginator(all_reviews.order_by("-created_at"), 3)
-    reviews = paginator.get_page(review_page)
-
-    # Get recommendations
-    recommended_movies = Moviedata.objects.exclude(
-        Q(watchlist__user=request.user) | Q(reviews__user=request.user)
-    ).order_by("-average_rating")[:6]
-
-    # Prepare all activities (combining watchlist additions and reviews)
-    all_activities = []
-
-    # Add watchlist activities
-    watchlist_activities = Watchlist.objects.filter(user=request.user).select_related(
-        "movie"
-    )
-
-    for item in watchlist_activities:
-        all_activities.append(
-            {
-                "type": "watchlist",
-                "text": f"Added {item.movie.title} to watchlist",
-                "timestamp": item.added_on,
-                "movie": item.movie,
-            }
+    try:
+        reviews = paginate(
+            Review.objects.filter(user=request.user).select_related("movie"),
+            "-created_at",
+            request.GET.get("reviews_cursor"),
+            3,
+            NEWEST_FIRST,
         )
+    except InvalidCursor:
+        raise Http404("Invalid cursor")
 
-    # Add review activities
-    review_activities = Review.objects.filter(user=request.user).select_related("movie")
-
-    for review in review_activities:
-        all_activities.append(
-            {
-                "type": "review",
-                "text": f"Reviewed {review.movie.title} with {review.rating}★",
-                "timestamp": review.created_at,
-                "movie": review.movie,
-            }
+    # Get recommendations
+    recommended_movies = recommender.recommended_movies(request.user)
+
+    # Activity feed: one indexed page of the user's append-only activity log
+    try:
+        recent_activities = paginate(
+            Activity.objects.filter(user=request.user).select_related("movie"),
+            "-created_at",
+            request.GET.get("activity_cursor"),
+            4,
+            NEWEST_FIRST,
         )
-
-    # Sort combined activities by timestamp (newest first)
-    all_activities.sort(key=lambda x: x["timestamp"], reverse=True)
-
-    # Paginate activities (4 per page)
-    activity_page = request.GET.get("activity_page", 1)
-    activities_paginator = Paginator(all_activities, 4)
-    recent_activities = activities_paginator.get_page(activity_page)
+    except InvalidCursor:
+        raise Http404("Invalid cursor")
 
     return render(
         request,
@@ -394,13 +577,11 @@ def profile(request):
             "watchlist": watchlist,
             "current_sort": sort_by,
             "reviews": reviews,
-            "avg_rating": (
-                round(review_stats["avg_rating"], 1)
-                if review_stats["avg_rating"]
-                else None
+            "avg_rating": stats.average_rating,
+            "total_reviews": stats.review_count,
+            "favorite_genre": (
+                stats.favorite_genre.name if stats.favorite_genre else None
             ),
-            "total_reviews": review_stats["total_reviews"],
-            "favorite_genre": favorite_genre.name if favorite_genre else None,
             "recommended_movies": recommended_movies,
             "recent_activities": recent_activities,
         },
@@ -434,28 +615,28 @@ def logout_view(request):
 def edit_profile(request):
     if request.method == "POST":
         # Update basic user info
-        request.user.first_name = request.POST.get("first_name", "")
-        request.user.last_name = request.POST.get("last_name", "")
-        request.user.save()
-
-        # Handle profile picture
-        if hasattr(request.user, "profile"):
-            profile = request.user.profile
-        else:
-            profile = profile(user=request.user)
-
+        user = request.user
+        names = {
+            "first_name": request.POST.get("first_name", ""),
+            "last_name": request.POST.get("last_name", ""),
+        }
+        changed = [
+            field for field, value in names.items() if getattr(user, field) != value
+        ]
+        if changed:
+            for field in changed:
+                setattr(user, field, names[field])
+            user.save(update_fields=changed)
+
+        # Handle profile picture. Replaced files stay in storage, where other
+        # profiles or movies may share them; gc_media removes unused ones
+        profile = user.profile
         if "avatar-clear" in request.POST:
-            # Remove the avatar
-            if profile.avatar:
-                profile.avatar.delete()
             profile.avatar = None
         elif "avatar" in request.FILES:
-            # Save new avatar
-            if profile.avatar:
-                profile.avatar.delete()  # Delete old avatar if exists
             profile.avatar = request.FILES["avatar"]
 
-        profile.save()
+        profile.save()  # A no-op unless something changed
 
         messages.success(request, "Profile updated successfully!")
         return redirect("movies:profile")
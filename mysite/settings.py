@@ -93,6 +93,22 @@ DATABASES = {
     ),
 }
 
+# Cache
+# Local memory is per worker process. Point CACHE_BACKEND at e.g.
+# django.core.cache.backends.filebased.FileBasedCache (with CACHE_LOCATION a
+# directory) to share cached data and its invalidation across gunicorn workers.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "moviedb"),
+        # Room for a card fragment per movie on large listing pages; the
+        # default (300) culls tag versions and search results mid-request
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 20000))},
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,12 +134,21 @@ USE_TZ = True
 # Static files (Heroku configuration)
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 STATIC_URL = "/static/"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 # Media files
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Uploads are named after their contents so identical images share one file
+# (see movies/storage.py); gc_media deletes files nothing refers to. Static
+# files are compressed and given hashed names by whitenoise at collectstatic.
+STORAGES = {
+    "default": {"BACKEND": "movies.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    },
+}
+
 # Security headers
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SECURE_SSL_REDIRECT = True
@@ -150,7 +175,7 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # REST Framework
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "movies.pagination.KeysetPagination",
     "PAGE_SIZE": 10,
 }
 
@@ -177,3 +202,87 @@ SOCIALACCOUNT_PROVIDERS = {
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Movie search
+# "auto" uses SQLite FTS5 or PostgreSQL tsvector depending on the database;
+# "memory" keeps an inverted index in each worker process
+MOVIES_SEARCH_BACKEND = os.environ.get("MOVIES_SEARCH_BACKEND", "auto")
+MOVIES_SEARCH_INDEX_TTL = 300  # Seconds before a worker rebuilds its index
+MOVIES_SEARCH_MAX_RESULTS = 1000
+# Minimum trigram similarity (0-1) for typo-tolerant title/actor/director lookups
+MOVIES_FUZZY_THRESHOLD = 0.3
+# Most movies (or, for actors, names) a typo-tolerant name filter matches
+MOVIES_FUZZY_MAX_MATCHES = 500
+# Upper bound on how stale cached genre lists and release years can be in other
+# worker processes when a per-process cache is used; changes invalidate the
+# local copy at once
+MOVIES_SNAPSHOT_CACHE_TTL = 300
+
+# Similar movies (see movies/similarity.py); refreshed by build_similarities
+MOVIES_SIMILAR_MOVIES = 8
+MOVIES_SIMILARITY_WEIGHTS = {
+    "ratings": 0.5,
+    "genres": 0.2,
+    "actors": 0.2,
+    "director": 0.1,
+}
+
+# Personalized recommendations (see movies/recommender.py); refreshed by
+# build_recommendations
+MOVIES_RECOMMENDATIONS = 12  # Stored per user; profile() shows the first 6
+MOVIES_RECOMMENDER = {
+    "factors": 32,
+    "iterations": 10,
+    "alpha": 10.0,  # Confidence gained per unit of interaction strength
+    "regularization": 0.1,
+    "cold_start_min_reviews": 1,
+}
+
+# Home page leaderboards (see movies/leaderboards.py); refreshed by
+# refresh_leaderboards
+MOVIES_LEADERBOARDS = {
+    "size": 8,
+    "half_life_days": 7,  # Trending activity loses half its weight per week
+    "window_half_lives": 4,  # Older activity is ignored
+    "activity_weights": {"review": 1.0, "watchlist": 0.5},
+    "prior_reviews": 5,  # Top rated: reviews at the site mean added to each movie
+    "cache_ttl": 600,
+}
+
+# Rendered page and movie card caches (see movies/cache.py), invalidated by
+# model signals. Reviews only invalidate their movie's pages and cards, so the
+# page TTL also bounds how long other listings show an old average rating.
+MOVIES_PAGE_CACHE_TTL = 60  # Anonymous home, genre and movie detail pages
+MOVIES_FRAGMENT_CACHE_TTL = 3600  # Movie cards, shared by all users
+
+# Cache stampede protection for expensive cached values (see
+# movies.cache.single_flight)
+MOVIES_SINGLE_FLIGHT = {
+    "stale_ttl": 60,  # Seconds an expired value is served while one refreshes
+    "lock_timeout": 10,  # Longest wait for another worker's recompute
+    "beta": 1.0,  # Eagerness of early refreshes; 0 disables them
+}
+MOVIES_SEARCH_CACHE_TTL = 60  # Ranked result ids for search pages
+# Totals shown next to paginated lists and in API responses (see
+# movies.pagination.cached_count)
+MOVIES_COUNT_CACHE_TTL = 300
+MOVIES_REVIEWS_PAGE_SIZE = 10  # Movie page and its "more reviews" requests
+
+# Conditional GET (see movies/conditional.py): seconds browsers and shared
+# caches may reuse a movie page or API response before revalidating it
+MOVIES_HTTP_MAX_AGE = 60
+
+# Resized poster copies (see movies/posters.py), made by the process_images
+# worker when a poster is saved; build_posters makes them for existing movies
+MOVIES_POSTERS = {
+    "widths": (222, 400, 800),  # Pixels; a narrower original is never upscaled
+    "quality": 80,  # WebP and JPEG encoder quality, 1-100
+}
+
+# Queued avatar and poster processing (see movies/jobs.py), run by the
+# process_images worker
+MOVIES_IMAGE_JOBS = {
+    "lease": 300,  # Seconds before a job a worker didn't finish is retried
+    "max_attempts": 5,
+    "retry_delay": 60,  # Seconds before the first retry, doubling after each
+}